@@ -0,0 +1,86 @@
+"""
+Memory taken by the node tree of a large synthetic page, compared with the
+same tree built from node classes that carry a per-instance __dict__.
+
+    python3 src/bench_memory.py [paragraphs]
+"""
+import sys
+import tracemalloc
+
+from htmlnode import HtmlNode, LeafNode, ParentNode
+from textnode import TextNode
+import parsing_inline
+from markdown_blocks import markdown_to_html_node
+
+
+# subclasses without __slots__ get a __dict__ again, like the nodes used to have
+class DictLeafNode(LeafNode):
+    pass
+
+class DictParentNode(ParentNode):
+    pass
+
+class DictTextNode(TextNode):
+    pass
+
+
+def synthetic_markdown(paragraphs: int) -> str:
+    blocks = ["# Synthetic page"]
+    for i in range(paragraphs):
+        blocks.append(
+            f"Paragraph {i} has **bold**, _italic_, `code`, a [link](/posts/{i}) "
+            f"and an ![image](/images/{i}.png) between plain words."
+        )
+        blocks.append(f"- item {i} with a [link](/a/{i})\n- second item\n- _third_ item")
+    return "\n\n".join(blocks)
+
+
+def to_slotted_nodes(node: HtmlNode) -> HtmlNode:
+    if isinstance(node, ParentNode):
+        return ParentNode(node.tag, [to_slotted_nodes(ch) for ch in node.children], node.props)
+    return LeafNode(node.tag, node.value, node.props)
+
+def to_dict_nodes(node: HtmlNode) -> HtmlNode:
+    if isinstance(node, ParentNode):
+        return DictParentNode(node.tag, [to_dict_nodes(ch) for ch in node.children], node.props)
+    return DictLeafNode(node.tag, node.value, node.props)
+
+
+def measure(build) -> tuple[object, int]:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def count_nodes(node: HtmlNode) -> int:
+    if isinstance(node, ParentNode):
+        return 1 + sum(count_nodes(ch) for ch in node.children)
+    return 1
+
+
+def main():
+    paragraphs = 5000 if len(sys.argv) <= 1 else int(sys.argv[1])
+    markdown = synthetic_markdown(paragraphs)
+
+    tree = markdown_to_html_node(markdown)
+    nodes = count_nodes(tree)
+    # measure a copy, so both numbers cover exactly the node objects and their lists
+    _, slotted_bytes = measure(lambda: to_slotted_nodes(tree))
+    _, dict_bytes = measure(lambda: to_dict_nodes(tree))
+
+    texts = parsing_inline.text_to_text_nodes(markdown)
+    _, text_bytes = measure(lambda: [TextNode(n.text, n.text_type, n.url) for n in texts])
+    _, dict_text_bytes = measure(lambda: [DictTextNode(n.text, n.text_type, n.url) for n in texts])
+
+    print(f"markdown:        {len(markdown) / 1e6:.2f} MB, {nodes} html nodes, {len(texts)} text nodes")
+    print(f"HtmlNode tree:   {slotted_bytes / 1e6:.2f} MB with __slots__, {dict_bytes / 1e6:.2f} MB with __dict__ "
+          f"({100 * (1 - slotted_bytes / dict_bytes):.0f}% less)")
+    print(f"TextNode list:   {text_bytes / 1e6:.2f} MB with __slots__, {dict_text_bytes / 1e6:.2f} MB with __dict__ "
+          f"({100 * (1 - text_bytes / dict_text_bytes):.0f}% less)")
+
+
+if __name__ == "__main__":
+    main()
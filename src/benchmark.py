@@ -0,0 +1,241 @@
+"""
+Benchmarks for the parse/render pipeline on synthetic sites.
+
+Every corpus shape is generated into a temporary site, then each stage is
+timed separately: inline parsing (text_to_text_nodes), block parsing
+(markdown_to_html_node), serialization (to_html), every page rendered
+into a MemoryStorage, which leaves out disk I/O, and a full build().
+Results are printed as a table and can be written as JSON to compare runs.
+
+    ./bench.sh --shapes prose,links --pages 200 --json bench.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+from contextlib import redirect_stdout
+from io import StringIO
+
+import main
+import parsing_inline
+from context import RenderContext
+from storage import MemoryStorage
+from testing import working_directory
+from template import Template
+from markdown_blocks import BlockType, markdown_to_blocks, block_to_blocktype, markdown_to_html_node
+
+WORDS = ("the", "ring", "of", "power", "hobbit", "shire", "elves", "went", "over", "mountain",
+         "river", "and", "a", "to", "council", "wizard", "grey", "white", "road", "goes")
+
+TEMPLATE = """<!doctype html>
+<html>
+  <head>
+    <title>{{ Title }}</title>
+    <link href="/index.css" rel="stylesheet" />
+  </head>
+  <body>
+    <article>{{ Content }}</article>
+  </body>
+</html>
+"""
+
+
+def words(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+def prose_block(rng: random.Random) -> str:
+    return f"{words(rng, 20)} **{words(rng, 2)}** {words(rng, 15)} _{words(rng, 2)}_ {words(rng, 25)}"
+
+def links_block(rng: random.Random) -> str:
+    parts = []
+    for i in range(8):
+        parts.append(f"{words(rng, 3)} [{words(rng, 2)}](/posts/{rng.randrange(10000)})")
+        if i % 4 == 0:
+            parts.append(f"![{words(rng, 2)}](/images/{rng.randrange(1000)}.png)")
+    return " ".join(parts)
+
+def list_block(rng: random.Random) -> str:
+    if rng.random() < 0.5:
+        return "\n".join(f"- {words(rng, 6)} `{rng.choice(WORDS)}`" for _ in range(10))
+    return "\n".join(f"{i + 1}. {words(rng, 6)} **{rng.choice(WORDS)}**" for i in range(10))
+
+def code_block(rng: random.Random) -> str:
+    lines = [f"    {rng.choice(WORDS)}_{i} = {rng.choice(WORDS)}({i}, **kwargs)" for i in range(15)]
+    return "```\n" + "\n".join(lines) + "\n```"
+
+SHAPES = {
+    # shape: (block generators with their weights, directory depth)
+    "prose": ([(prose_block, 8), (list_block, 1)], 1),
+    "links": ([(links_block, 8), (prose_block, 1)], 1),
+    "lists": ([(list_block, 8), (prose_block, 1)], 1),
+    "code": ([(code_block, 6), (prose_block, 2)], 1),
+    "deep": ([(prose_block, 4), (links_block, 1), (list_block, 1)], 8),
+}
+
+
+def synthetic_page(rng: random.Random, shape: str, size: int, n: int) -> str:
+    generators, _ = SHAPES[shape]
+    funcs = [g for g, _ in generators]
+    weights = [w for _, w in generators]
+    blocks = [f"# {shape} page {n}"]
+    total = len(blocks[0])
+    while total < size:
+        if rng.random() < 0.1:
+            block = f"## {words(rng, 4)}"
+        else:
+            block = rng.choices(funcs, weights)[0](rng)
+        blocks.append(block)
+        total += len(block) + 2
+    return "\n\n".join(blocks) + "\n"
+
+
+def generate_site(root: str, shape: str, pages: int, size: int, seed: int =0) -> list[str]:
+    """Write a complete site (content/, static/, template.html) below 'root'."""
+    rng = random.Random(seed)
+    _, depth = SHAPES[shape]
+    documents = []
+    for n in range(pages):
+        parts = [f"d{(n >> (2 * level)) % 4}" for level in range(depth - 1)]
+        path = os.path.join(root, "content", *parts, f"page{n}", "index.md")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        markdown = synthetic_page(rng, shape, size, n)
+        with open(path, "w") as f:
+            f.write(markdown)
+        documents.append(markdown)
+
+    os.makedirs(os.path.join(root, "static", "images"), exist_ok=True)
+    with open(os.path.join(root, "static", "index.css"), "w") as f:
+        f.write("body { margin: 0 }\n")
+    for i in range(20):
+        with open(os.path.join(root, "static", "images", f"{i}.png"), "wb") as f:
+            f.write(rng.randbytes(4096))
+    with open(os.path.join(root, "template.html"), "w") as f:
+        f.write(TEMPLATE)
+    return documents
+
+
+def measure(fn, repeat: int) -> tuple[float, int]:
+    """Best wall time over 'repeat' runs, and the traced peak memory of one extra run."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best == None else min(best, elapsed)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def bench_shape(shape: str, pages: int, size: int, repeat: int, jobs: int) -> list[dict]:
+    with tempfile.TemporaryDirectory() as root:
+        documents = generate_site(root, shape, pages, size)
+        nbytes = sum(len(d.encode()) for d in documents)
+
+        inline_texts = []
+        for d in documents:
+            for block in markdown_to_blocks(d):
+                if block_to_blocktype(block) == BlockType.PARAGRAPH:
+                    inline_texts.append(block)
+        inline_bytes = sum(len(t.encode()) for t in inline_texts)
+        trees = [markdown_to_html_node(d) for d in documents]
+        html_bytes = sum(len(t.to_html().encode()) for t in trees)
+
+        storage = MemoryStorage.load(root)
+        template_path = os.path.join(root, "template.html")
+        template = Template(storage.read(template_path), "/", template_path)
+
+        def memory():
+            out = os.path.join(root, "docs")
+            with redirect_stdout(StringIO()):
+                main.clear_directory(out, storage)
+                main.copy_tree(os.path.join(root, "static"), out, storage)
+                main.generate_pages_rec(os.path.join(root, "content"), template, out, RenderContext(storage=storage))
+
+        def build():
+            with working_directory(root), redirect_stdout(StringIO()):
+                main.build("/", jobs=jobs)
+
+        stages = [
+            ("inline", lambda: [parsing_inline.text_to_text_nodes(t) for t in inline_texts], inline_bytes),
+            ("parse", lambda: [markdown_to_html_node(d) for d in documents], nbytes),
+            ("to_html", lambda: [t.to_html() for t in trees], html_bytes),
+            ("memory", memory, nbytes),
+            ("build", build, nbytes),
+        ]
+
+        results = []
+        for stage, fn, stage_bytes in stages:
+            seconds, peak = measure(fn, repeat)
+            results.append({
+                "shape": shape,
+                "stage": stage,
+                "pages": pages,
+                "bytes": stage_bytes,
+                "seconds": seconds,
+                "mb_per_s": stage_bytes / 1e6 / seconds if seconds > 0 else None,
+                "pages_per_s": pages / seconds if seconds > 0 else None,
+                "peak_bytes": peak,
+            })
+        return results
+
+
+def git_revision() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="benchmark the parse/render pipeline on synthetic sites")
+    parser.add_argument("--shapes", default=",".join(SHAPES),
+                        help=f"comma separated corpus shapes out of {', '.join(SHAPES)}")
+    parser.add_argument("--pages", type=int, default=100, help="pages per corpus")
+    parser.add_argument("--page-size", type=int, default=20000, help="approximate bytes of markdown per page")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage, the best one is reported")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="--jobs passed to the full build")
+    parser.add_argument("--json", help="write the results to this file")
+    return parser.parse_args(argv)
+
+
+def run(argv: list[str]):
+    args = parse_args(argv)
+    shapes = args.shapes.split(",")
+    for shape in shapes:
+        if shape not in SHAPES:
+            raise Exception(f"unknown shape: '{shape}'")
+
+    results = []
+    print(f"{'shape':<8}{'stage':<10}{'seconds':>10}{'MB/s':>10}{'pages/s':>10}{'peak MB':>10}")
+    for shape in shapes:
+        for r in bench_shape(shape, args.pages, args.page_size, args.repeat, args.jobs):
+            results.append(r)
+            print(f"{r['shape']:<8}{r['stage']:<10}{r['seconds']:>10.4f}{r['mb_per_s'] or 0:>10.2f}"
+                  f"{r['pages_per_s'] or 0:>10.1f}{r['peak_bytes'] / 1e6:>10.2f}")
+
+    if args.json:
+        report = {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "args": vars(args),
+            "results": results,
+        }
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=1)
+        print(f"results written to '{args.json}'")
+
+
+if __name__ == "__main__":
+    run(sys.argv[1:])
@@ -0,0 +1,96 @@
+import hashlib
+from collections import OrderedDict
+from manifest import load_json, save_json
+
+# bump whenever the html produced for a block changes, persisted caches are dropped then
+RENDER_VERSION = 2
+
+
+def block_key(block: str, block_type) -> str:
+    h = hashlib.sha1(block_type.value.encode())
+    h.update(b"\0")
+    h.update(block.encode())
+    return h.hexdigest()
+
+
+class BlockCache:
+    """
+    LRU cache of rendered html fragments, keyed by block_key(). Bounded by
+    the total length of the cached fragments, least recently used go first.
+    With 'record_added', as in pool workers, puts are also kept for
+    take_added() to hand back to the parent.
+    """
+    label = "block cache"
+
+    def __init__(self, max_bytes: int =64 << 20, record_added: bool =False):
+        self.max_bytes = max_bytes
+        self.record_added = record_added
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # entries put since the last take_added(), handed back by pool workers
+        self.added = {}
+
+    def __repr__(self):
+        return f"BlockCache({len(self.entries)} entries, {self.size} bytes)"
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key: str) -> str:
+        html = self.entries.get(key)
+        if html == None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return html
+
+    def put(self, key: str, html: str):
+        self._insert(key, html)
+        if self.record_added:
+            self.added[key] = html
+
+    def _insert(self, key: str, html: str):
+        if len(html) > self.max_bytes:
+            return
+        old = self.entries.pop(key, None)
+        if old != None:
+            self.size -= len(old)
+        self.entries[key] = html
+        self.size += len(html)
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+
+    def update(self, entries: dict[str, str]):
+        for key, html in entries.items():
+            self.put(key, html)
+
+    def take_added(self) -> dict[str, str]:
+        added = self.added
+        self.added = {}
+        return added
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        rate = 100 * self.hits / total if total > 0 else 0
+        return (f"{self.label}: {self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate), "
+                f"{self.evictions} evictions, {len(self.entries)} entries")
+
+    @classmethod
+    def load(cls, path: str, max_bytes: int =64 << 20, record_added: bool =False) -> "BlockCache":
+        cache = cls(max_bytes, record_added)
+        data = load_json(path, {})
+        if data.get("version") != RENDER_VERSION:
+            return cache
+        for key, html in data["entries"]:
+            cache._insert(key, html)
+        return cache
+
+    def save(self, path: str):
+        # least recently used first, so loading restores the same order
+        save_json(path, {"version": RENDER_VERSION, "entries": list(self.entries.items())}, indent=None)
@@ -0,0 +1,75 @@
+import os
+from manifest import file_hash
+from sync import replace_with_link
+
+
+def walk_files(root: str) -> list[str]:
+    result = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            result.append(os.path.join(dirpath, name))
+    return result
+
+
+def diff_outputs(root: str, state: dict, live_root: str =None) -> dict[str, list[str]]:
+    """
+    Compare the files below 'root' with 'state', which maps each output
+    ('/blog/index.html') to the size, mtime and hash it had after the last
+    build and is updated in place. Only files whose size or mtime moved are
+    hashed. Returns the added, changed and removed outputs.
+
+    A file that was written again with the same bytes counts as unchanged and
+    gets its previous mtime back, so mtime based syncs skip it too, unless
+    it is a hardlink shared with another file. With
+    'live_root' ('root' being a staging directory), it is replaced by a
+    hardlink to the identical live file instead.
+    """
+    changes = {"added": [], "changed": [], "removed": []}
+    seen = set()
+    for path in walk_files(root):
+        key = "/" + os.path.relpath(path, root).replace(os.sep, "/")
+        seen.add(key)
+        st = os.stat(path)
+        entry = state.get(key)
+        if entry != None and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime_ns:
+            continue
+
+        digest = file_hash(path)
+        if entry == None:
+            changes["added"].append(key)
+        elif entry["hash"] != digest:
+            changes["changed"].append(key)
+        else:
+            st = restore(path, key, entry, live_root)
+        state[key] = {"size": st.st_size, "mtime": st.st_mtime_ns, "hash": digest}
+
+    for key in [key for key in state if key not in seen]:
+        del state[key]
+        changes["removed"].append(key)
+    for paths in changes.values():
+        paths.sort()
+    return changes
+
+
+def restore(path: str, key: str, entry: dict, live_root: str) -> os.stat_result:
+    """Make a rewritten but identical output look untouched again."""
+    if live_root != None:
+        live = os.path.join(live_root, key[1:])
+        try:
+            live_st = os.stat(live)
+            if live_st.st_size == entry["size"] and live_st.st_mtime_ns == entry["mtime"]:
+                replace_with_link(live, path)
+                return live_st
+        except OSError:
+            pass
+    st = os.stat(path)
+    if st.st_nlink > 1:
+        # a hardlink, of a --link-static file say, would move the mtime of its source too
+        return st
+    os.utime(path, ns=(st.st_atime_ns, entry["mtime"]))
+    return os.stat(path)
+
+
+def changes_summary(changes: dict[str, list[str]]) -> str:
+    return f"outputs: {len(changes['added'])} added, {len(changes['changed'])} changed, {len(changes['removed'])} removed"
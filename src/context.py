@@ -0,0 +1,155 @@
+from typing import Iterable, Iterator, TextIO
+from timing import Profiler, NullProfiler
+from block_cache import BlockCache
+from highlight import HighlightCache
+from dependencies import new_references, collect_references
+from images import annotate_images
+from markdown_blocks import markdown_to_html_chunks
+from minify import Minifier, MinifyStats
+from storage import Storage, LocalStorage
+from search import collect_terms
+
+
+class RenderContext:
+    """
+    Per-build state shared by every page render besides the template:
+    profiling hooks and caches. Pool workers rebuild their own context
+    from worker_spec() and hand back what they collected with worker_result().
+    """
+    def __init__(self, profiler: Profiler =None, block_cache: BlockCache =None, block_cache_path: str =None,
+                 images: dict[str, list[int]] =None, minify: MinifyStats =None, highlights: HighlightCache =None,
+                 highlights_path: str =None, storage: Storage =None, search: bool =False):
+        self.profiler = profiler if profiler != None else NullProfiler()
+        self.block_cache = block_cache
+        # where the block cache is persisted between builds, None keeps it in memory
+        self.block_cache_path = block_cache_path
+        # site path => [width, height] of the images to annotate, None leaves <img> alone
+        self.images = images
+        # pages are minified on their way out when set, and counted in it
+        self.minify = minify
+        # highlighted code blocks, and where they are persisted between builds
+        self.highlights = highlights
+        self.highlights_path = highlights_path
+        # where pages are read from and written to
+        self.storage = storage if storage != None else LocalStorage()
+        # src => links and images of the pages rendered, see page_references()
+        self.references = {}
+        # src => {term: weight} of the pages rendered, None when there is no search index
+        self.terms = {} if search else None
+
+    def __repr__(self):
+        return f"RenderContext({self.profiler}, {self.block_cache}, {self.block_cache_path}, {self.images != None}, {self.minify})"
+
+    def page_references(self, src: str) -> dict[str, list[str]]:
+        """Fresh record of what the page 'src' references, filled while it renders."""
+        refs = new_references()
+        self.references[src] = refs
+        return refs
+
+    def render_content(self, lines: Iterable[str], src: str) -> Iterator[str]:
+        """The html of the page 'src' with markdown 'lines', streamed through this context's hooks."""
+        chunks = markdown_to_html_chunks(lines, self.profiler, self.block_cache, self.highlights)
+        chunks = collect_references(chunks, self.page_references(src))
+        if self.terms != None:
+            self.terms[src] = {}
+            chunks = collect_terms(chunks, self.terms[src])
+        if self.images != None:
+            chunks = annotate_images(chunks, self.images)
+        return chunks
+
+    def write_page(self, template, out: TextIO, title: str, lines: Iterable[str], src: str):
+        """Render the page 'src' with 'template' into 'out'."""
+        minifier = None
+        if self.minify != None:
+            minifier = Minifier(out, self.minify)
+            out = self.profiler.timed_writer("minify", minifier)
+        template.write(out, {"Title": title, "Content": self.render_content(lines, src)})
+        if minifier != None:
+            minifier.close()
+
+    def worker_spec(self) -> dict:
+        return {
+            "profiling": not isinstance(self.profiler, NullProfiler),
+            "block_cache": None if self.block_cache == None else self.block_cache.max_bytes,
+            "block_cache_path": self.block_cache_path,
+            "images": self.images,
+            "minify": self.minify != None,
+            "highlights": None if self.highlights == None else self.highlights.max_bytes,
+            "highlights_path": self.highlights_path,
+            "search": self.terms != None,
+        }
+
+    @staticmethod
+    def from_spec(spec: dict) -> "RenderContext":
+        profiler = Profiler() if spec["profiling"] else NullProfiler()
+        cache = None
+        if spec["block_cache"] != None:
+            if spec["block_cache_path"] != None:
+                cache = BlockCache.load(spec["block_cache_path"], spec["block_cache"], record_added=True)
+            else:
+                cache = BlockCache(spec["block_cache"], record_added=True)
+        minify = MinifyStats() if spec.get("minify") else None
+        highlights = None
+        if spec.get("highlights") != None:
+            if spec.get("highlights_path") != None:
+                highlights = HighlightCache.load(spec["highlights_path"], spec["highlights"], record_added=True)
+            else:
+                highlights = HighlightCache(spec["highlights"], record_added=True)
+        return RenderContext(profiler, cache, spec["block_cache_path"], spec.get("images"), minify,
+                             highlights, spec.get("highlights_path"), search=spec.get("search", False))
+
+    def worker_result(self) -> dict:
+        """What a pool worker collected while rendering since the last call."""
+        result = {"records": self.profiler.records, "references": self.references,
+                  "blocks": {}, "hits": 0, "misses": 0}
+        self.profiler.records = []
+        self.references = {}
+        if self.terms != None:
+            result["terms"] = self.terms
+            self.terms = {}
+        if self.minify != None:
+            result["minify"] = self.minify.take()
+        if self.highlights != None:
+            added = self.highlights.take_added()
+            result["highlighted"] = added if self.highlights_path != None else {}
+            result["highlight_counts"] = [self.highlights.hits, self.highlights.misses]
+            self.highlights.hits, self.highlights.misses = 0, 0
+        if self.block_cache != None:
+            result["hits"], result["misses"] = self.block_cache.hits, self.block_cache.misses
+            self.block_cache.hits, self.block_cache.misses = 0, 0
+            added = self.block_cache.take_added()
+            # only worth sending back when the parent persists the cache
+            if self.block_cache_path != None:
+                result["blocks"] = added
+        return result
+
+    def merge(self, result: dict):
+        self.profiler.records.extend(result["records"])
+        self.references.update(result["references"])
+        if self.terms != None and "terms" in result:
+            self.terms.update(result["terms"])
+        if self.minify != None and "minify" in result:
+            self.minify.add(*result["minify"])
+        if self.highlights != None and "highlighted" in result:
+            self.highlights.update(result["highlighted"])
+            self.highlights.hits += result["highlight_counts"][0]
+            self.highlights.misses += result["highlight_counts"][1]
+        if self.block_cache != None:
+            self.block_cache.hits += result["hits"]
+            self.block_cache.misses += result["misses"]
+            self.block_cache.update(result["blocks"])
+
+    def finish(self):
+        if self.minify != None:
+            print(self.minify.summary())
+        if self.highlights != None:
+            # quiet for sites without highlighted code
+            if self.highlights.hits + self.highlights.misses > 0:
+                print(self.highlights.summary())
+            if self.highlights_path != None:
+                self.highlights.save(self.highlights_path)
+        if self.block_cache == None:
+            return
+        print(self.block_cache.summary())
+        if self.block_cache_path != None:
+            self.block_cache.save(self.block_cache_path)
@@ -0,0 +1,116 @@
+import re
+from typing import Iterable, Iterator
+from urllib.parse import urljoin, urlsplit
+from manifest import load_json, save_json
+
+# version 1 was the bare dict of pages, without the templates
+GRAPH_VERSION = 2
+# attributes of the <a> and <img> tags that LeafNode writes for links and images
+REFERENCE = re.compile(r'<(a|img) [^>]*?(?:href|src)="([^"]*)"')
+
+
+def new_references() -> dict[str, list[str]]:
+    return {"links": [], "images": []}
+
+
+def scan_references(html: str, refs: dict[str, list[str]]):
+    for m in REFERENCE.finditer(html):
+        refs["links" if m.group(1) == "a" else "images"].append(m.group(2))
+
+
+def collect_references(chunks: Iterable[str], refs: dict[str, list[str]]) -> Iterator[str]:
+    """Pass the html 'chunks' through, noting every link and image in 'refs'."""
+    for chunk in chunks:
+        scan_references(chunk, refs)
+        yield chunk
+
+
+def normalize_url(url: str, base: str ="/") -> str:
+    """
+    Site path a reference points to, relative ones resolved against 'base'.
+    '/blog/tom/', '/blog/tom' and '/blog/tom/index.html#x' are all '/blog/tom'.
+    None for references to other sites.
+    """
+    parts = urlsplit(urljoin(base, url))
+    if parts.scheme != "" or parts.netloc != "":
+        return None
+    path = parts.path
+    if path.endswith("/index.html"):
+        path = path[:-len("index.html")]
+    return path.rstrip("/") or "/"
+
+
+class DependencyGraph:
+    """
+    What every page read while it was rendered: the template, the basepath,
+    and the site paths of the links and images in its content. Answers which
+    pages have to be rendered again when one of those changes. The assets
+    the templates link to matter too when they are fingerprinted, a new
+    hash changes the link in every page.
+    """
+    def __init__(self, pages: dict =None, templates: dict =None):
+        # src => {"url", "template", "basepath", "links", "images"}
+        self.pages = pages if pages != None else {}
+        # template => {"references", "fingerprint"}
+        self.templates = templates if templates != None else {}
+        self._referenced_by = None
+
+    def __repr__(self):
+        return f"DependencyGraph({len(self.pages)} pages)"
+
+    def record(self, src: str, url: str, template: str, basepath: str, refs: dict[str, list[str]]):
+        """'url' is the page's own path below the basepath, links are resolved against it."""
+        entry = {"url": normalize_url(url), "template": template, "basepath": basepath}
+        for kind in ("links", "images"):
+            entry[kind] = sorted({u for u in (normalize_url(r, url) for r in refs[kind]) if u != None})
+        self.pages[src] = entry
+        self._referenced_by = None
+
+    def record_template(self, template: str, references: Iterable[str], fingerprint: bool):
+        self.templates[template] = {"references": sorted(references), "fingerprint": fingerprint}
+
+    def remove_missing(self, current: set[str]) -> int:
+        gone = [src for src in self.pages if src not in current]
+        for src in gone:
+            del self.pages[src]
+        self._referenced_by = None
+        return len(gone)
+
+    def using_template(self, template: str) -> list[str]:
+        return sorted(src for src, e in self.pages.items() if e["template"] == template)
+
+    def using_basepath(self, basepath: str) -> list[str]:
+        return sorted(src for src, e in self.pages.items() if e["basepath"] == basepath)
+
+    def referencing(self, url: str) -> list[str]:
+        """Pages linking to or showing the site path 'url'."""
+        if self._referenced_by == None:
+            self._referenced_by = {}
+            for src, e in self.pages.items():
+                for u in e["links"] + e["images"]:
+                    self._referenced_by.setdefault(u, set()).add(src)
+        return sorted(self._referenced_by.get(normalize_url(url), ()))
+
+    def using_asset(self, url: str) -> list[str]:
+        """Pages whose template links to the site path 'url' under a fingerprinted name."""
+        url = normalize_url(url)
+        templates = {t for t, e in self.templates.items()
+                     if e["fingerprint"] and url in {normalize_url(r) for r in e["references"]}}
+        return sorted(src for src, e in self.pages.items() if e["template"] in templates)
+
+    def page_at(self, url: str) -> str:
+        url = normalize_url(url)
+        for src, e in self.pages.items():
+            if e["url"] == url:
+                return src
+        return None
+
+    @staticmethod
+    def load(path: str) -> "DependencyGraph":
+        data = load_json(path, {})
+        if data.get("version") != GRAPH_VERSION:
+            return DependencyGraph(data)
+        return DependencyGraph(data["pages"], data["templates"])
+
+    def save(self, path: str):
+        save_json(path, {"version": GRAPH_VERSION, "pages": self.pages, "templates": self.templates})
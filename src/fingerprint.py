@@ -0,0 +1,74 @@
+import os
+import shutil
+from manifest import file_hash
+from sync import scan_files
+
+# assets that are only ever referenced from pages, a favicon.ico or robots.txt keeps its name
+FINGERPRINTED = (".css", ".js", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif", ".svg",
+                 ".woff", ".woff2", ".ttf", ".otf", ".mp4", ".webm")
+HASH_LENGTH = 10
+
+
+def fingerprinted_name(path: str, digest: str) -> str:
+    """'images/tom.png' => 'images/tom.0123456789.png'"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{digest[:HASH_LENGTH]}{ext}"
+
+
+def fingerprint_assets(static_dir: str, out_dir: str, state: dict, remove=None) -> tuple[dict[str, str], set[str]]:
+    """
+    Give every asset copied from 'static_dir' to 'out_dir' a second name
+    with its content hash in it, a hardlink to the same file. 'state' maps
+    each source to the size, mtime and hash it had last time and is updated
+    in place, only sources that changed are hashed again. Hashed names that
+    are no longer current are deleted through 'remove(path)'.
+
+    Returns the site paths of the assets mapped to their hashed ones, for
+    Template, and the site paths whose hashed name changed since last time.
+    """
+    remove = remove if remove != None else remove_file
+    assets = {}
+    changed = set()
+    seen = set()
+    for src, dst, st in scan_files(static_dir, out_dir):
+        if not src.endswith(FINGERPRINTED):
+            continue
+        seen.add(src)
+        url = "/" + os.path.relpath(src, static_dir).replace(os.sep, "/")
+        entry = state.get(src)
+        if entry == None or entry["size"] != st.st_size or entry["mtime"] != st.st_mtime_ns:
+            digest = file_hash(src)
+            if entry == None or entry["hash"] != digest:
+                changed.add(url)
+                if entry != None:
+                    remove(fingerprinted_name(dst, entry["hash"]))
+            entry = {"size": st.st_size, "mtime": st.st_mtime_ns, "hash": digest}
+            state[src] = entry
+
+        hashed = fingerprinted_name(dst, entry["hash"])
+        if not os.path.exists(hashed):
+            try:
+                os.link(dst, hashed)
+            except OSError:
+                shutil.copy2(dst, hashed)
+        assets[url] = fingerprinted_name(url, entry["hash"])
+
+    changed.update(drop_fingerprints(static_dir, out_dir, state, remove, seen))
+    return assets, changed
+
+
+def drop_fingerprints(static_dir: str, out_dir: str, state: dict, remove=None, keep: set[str] =frozenset()) -> set[str]:
+    """Delete the hashed names of the sources in 'state' but not in 'keep', returns their site paths."""
+    remove = remove if remove != None else remove_file
+    dropped = set()
+    for src in [src for src in state if src not in keep]:
+        entry = state.pop(src)
+        rel = os.path.relpath(src, static_dir)
+        dropped.add("/" + rel.replace(os.sep, "/"))
+        remove(fingerprinted_name(os.path.join(out_dir, rel), entry["hash"]))
+    return dropped
+
+
+def remove_file(path: str):
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,182 @@
+import re
+import html
+import hashlib
+from typing import Iterator
+from block_cache import BlockCache
+
+# bump whenever the html produced for a snippet changes, RENDER_VERSION in block_cache has to go up with it
+HIGHLIGHT_VERSION = 1
+# the first word of a fence's info string, "```python" => "python"
+LANGUAGE = re.compile(r"[\w+#.-]+")
+
+
+class Lexer:
+    """
+    Splits code into tokens with a list of (kind, pattern) rules, tried in
+    order at each position. Kinds are Pygments' short css classes, so its
+    stylesheets work on the output; None is plain text and a Lexer kind
+    splits the match further with that lexer.
+    """
+    def __init__(self, name: str, rules: list[tuple]):
+        self.name = name
+        self.kinds = {}
+        patterns = []
+        for i, (kind, pattern) in enumerate(rules):
+            self.kinds[f"t{i}"] = kind
+            patterns.append(f"(?P<t{i}>{pattern})")
+        self.pattern = re.compile("|".join(patterns))
+
+    def __repr__(self):
+        return f"Lexer({self.name})"
+
+    def tokens(self, code: str) -> Iterator[tuple[str, str]]:
+        pos = 0
+        for m in self.pattern.finditer(code):
+            if m.start() > pos:
+                yield None, code[pos:m.start()]
+            kind = self.kinds[m.lastgroup]
+            if isinstance(kind, Lexer):
+                yield from kind.tokens(m.group())
+            else:
+                yield kind, m.group()
+            pos = m.end()
+        if pos < len(code):
+            yield None, code[pos:]
+
+
+def words(*names: str) -> str:
+    return r"(?:" + "|".join(names) + r")\b"
+
+def commands(*names: str) -> str:
+    return r"(?<![^\s;|&(])(?:" + "|".join(names) + r")(?![\w./-])"
+
+
+PYTHON = Lexer("python", [
+    ("c1", r"#[^\n]*"),
+    ("s", r"(?i:[rbuf]{0,2})(?:\"\"\"[\s\S]*?\"\"\"|'''[\s\S]*?''')"),
+    ("s", r"(?i:[rbuf]{0,2})(?:\"(?:\\.|[^\"\\\n])*\"|'(?:\\.|[^'\\\n])*')"),
+    ("nd", r"@[\w.]+"),
+    ("nf", r"(?<=def )[A-Za-z_]\w*"),
+    ("nc", r"(?<=class )[A-Za-z_]\w*"),
+    ("kc", words("True", "False", "None")),
+    ("k", words("and", "as", "assert", "async", "await", "break", "class", "continue", "def", "del", "elif",
+                "else", "except", "finally", "for", "from", "global", "if", "import", "in", "is", "lambda",
+                "match", "case", "nonlocal", "not", "or", "pass", "raise", "return", "try", "while", "with",
+                "yield")),
+    ("nb", words("abs", "all", "any", "bool", "bytes", "dict", "enumerate", "filter", "float", "getattr",
+                 "hasattr", "int", "isinstance", "iter", "len", "list", "map", "max", "min", "next", "object",
+                 "open", "print", "range", "repr", "set", "setattr", "sorted", "str", "sum", "super", "tuple",
+                 "type", "zip", "Exception", "ValueError", "TypeError", "KeyError")),
+    ("bp", words("self", "cls")),
+    ("m", r"0[xXoObB][\da-fA-F_]+|\d[\d_]*(?:\.\d*)?(?:[eE][+-]?\d+)?j?|\.\d+(?:[eE][+-]?\d+)?"),
+    # identifiers whole, so no keyword is found inside one
+    (None, r"[A-Za-z_]\w*"),
+])
+
+SHELL = Lexer("shell", [
+    ("c1", r"(?<![^\s])#[^\n]*"),
+    ("s2", r"\"(?:\\.|[^\"\\])*\""),
+    ("s1", r"'[^']*'"),
+    ("nv", r"\$\{[^}\n]*\}|\$\w+|\$[@*#?$!-]"),
+    # keywords and builtins only where a command starts, not in arguments like --format=done
+    ("k", commands("if", "then", "else", "elif", "fi", "for", "while", "until", "do", "done", "case", "esac",
+                   "in", "function", "select", "return", "exit")),
+    ("nb", commands("echo", "cd", "export", "local", "source", "set", "unset", "read", "printf", "test", "alias",
+                    "eval", "exec", "shift", "trap")),
+    (None, r"[\w./-]+"),
+])
+
+JSON = Lexer("json", [
+    ("nt", r"\"(?:\\.|[^\"\\])*\"(?=\s*:)"),
+    ("s2", r"\"(?:\\.|[^\"\\])*\""),
+    ("m", r"-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?"),
+    ("kc", words("true", "false", "null")),
+])
+
+HTML_TAG = Lexer("tag", [
+    ("nt", r"</?[A-Za-z][\w:-]*|/?>"),
+    ("s", r"\"[^\"]*\"|'[^']*'"),
+    ("na", r"[^\s=>/\"']+"),
+])
+
+HTML = Lexer("html", [
+    ("c", r"<!--[\s\S]*?-->"),
+    ("cp", r"<![^>]*>"),
+    (HTML_TAG, r"</?[A-Za-z][^>]*>"),
+    ("ni", r"&#?\w+;"),
+])
+
+LEXERS = {
+    "python": PYTHON, "py": PYTHON,
+    "shell": SHELL, "sh": SHELL, "bash": SHELL, "zsh": SHELL, "console": SHELL,
+    "json": JSON,
+    "html": HTML, "htm": HTML, "xml": HTML,
+}
+
+
+class HighlightCache(BlockCache):
+    """Highlighted snippets by highlight_key(), kept between builds like the block cache."""
+    label = "highlight cache"
+
+
+def split_info_string(text: str) -> tuple[str, str]:
+    """
+    Split the language off a code block with its backticks removed:
+    "python\\nx = 1\\n" => ("python", "\\nx = 1\\n"). The language is None
+    when the first line does not name one.
+    """
+    first, newline, _ = text.partition("\n")
+    if newline == "" or first.strip() == "":
+        return None, text
+    lang = first.split()[0]
+    if not LANGUAGE.fullmatch(lang):
+        return None, text
+    return lang.lower(), text[len(first):]
+
+
+def highlight_key(lang: str, code: str) -> str:
+    h = hashlib.sha1(f"{lang}\0{HIGHLIGHT_VERSION}\0".encode())
+    h.update(code.encode())
+    return h.hexdigest()
+
+
+def highlight(code: str, lang: str, cache: BlockCache =None) -> str:
+    """
+    The escaped html of 'code' with its tokens wrapped in spans, None when
+    there is no lexer for 'lang'. Snippets found in 'cache' are not
+    tokenized again.
+    """
+    lexer = LEXERS.get(lang)
+    if lexer == None:
+        return None
+    if cache != None:
+        key = highlight_key(lexer.name, code)
+        result = cache.get(key)
+        if result != None:
+            return result
+    result = tokens_to_html(lexer.tokens(code))
+    if cache != None:
+        cache.put(key, result)
+    return result
+
+
+def tokens_to_html(tokens: Iterator[tuple[str, str]]) -> str:
+    out = []
+    kind, text = None, ""
+    # neighbours of the same kind share one span
+    for k, t in tokens:
+        if k != kind and text != "":
+            out.append(span(kind, text))
+            text = ""
+        kind = k
+        text += t
+    if text != "":
+        out.append(span(kind, text))
+    return "".join(out)
+
+
+def span(kind: str, text: str) -> str:
+    text = html.escape(text, quote=False)
+    if kind == None:
+        return text
+    return f'<span class="{kind}">{text}</span>'
@@ -1,53 +1,72 @@
 
 class HtmlNode:
+    # pages create tens of thousands of nodes, keep them free of a per-instance __dict__
+    __slots__ = ("tag", "value", "children", "props")
+
     def __init__(self, tag: str =None, value: str =None, children: list =None, props: dict =None):
         self.tag = tag
         self.value = value
         self.children = children
-        self.props = props
+        # no dict for nodes without attributes
+        self.props = props if props else None
 
     def __repr__(self):
         return f"HtmlNode({self.tag}, {self.value}, {self.children}, {self.props})"
 
     def to_html(self):
+        out = []
+        self.write_html(out)
+        return "".join(out)
+
+    def write_html(self, out: list[str]):
+        """Append the html of this node to 'out', one part at a time."""
         raise NotImplementedError
 
     def props_to_html(self):
-        if self.props == None or len(self.props) <= 0:
-            return ""
-        res = ''
+        out = []
+        self.write_props(out)
+        return "".join(out)
+
+    def write_props(self, out: list[str]):
+        if self.props == None:
+            return
         for k, v in self.props.items():
-            res += f' {k}="{v}"'
-        return res
+            out.append(f' {k}="{v}"')
 
 
 class LeafNode(HtmlNode):
+    __slots__ = ()
+
     def __init__(self, tag: str, value: str, props: dict =None):
         super().__init__(tag=tag, value=value, props=props)
 
-    def to_html(self):
+    def write_html(self, out: list[str]):
         if self.value == None:
             raise ValueError("no value")
         if self.tag == None:
-            return self.value
+            out.append(self.value)
+            return
 
-        res = f'<{self.tag}{self.props_to_html()}>{self.value}</{self.tag}>'
-        return res
+        out.append(f'<{self.tag}')
+        self.write_props(out)
+        out.append(f'>{self.value}</{self.tag}>')
 
 
 class ParentNode(HtmlNode):
+    __slots__ = ()
+
     def __init__(self, tag: str, children: list, props: dict =None):
         super().__init__(tag=tag, children=children, props=props)
 
-    def to_html(self):
+    def write_html(self, out: list[str]):
         if self.tag == None or self.tag == "":
             raise ValueError("no tag")
         if self.children == None or len(self.children) <= 0:
             raise ValueError("no children")
 
-        res = ''
-        res += f'<{self.tag}{self.props_to_html()}>'
+        out.append(f'<{self.tag}')
+        self.write_props(out)
+        out.append('>')
         for ch in self.children:
-            res += ch.to_html()
-        res += f'</{self.tag}>'
-        return res
+            ch.write_html(out)
+        out.append(f'</{self.tag}>')
@@ -0,0 +1,168 @@
+import os
+import re
+import struct
+from typing import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from manifest import file_hash, load_json, save_json
+from sync import scan_files
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp")
+# the start tag LeafNode writes for an image
+IMG_TAG = re.compile(r'<img ([^>]*?)src="([^"]*)"([^>]*)>')
+# bytes read from the start of a file, enough for every format but some JPEGs
+HEADER_SIZE = 64 << 10
+
+
+def image_size(path: str) -> tuple[int, int]:
+    """Width and height from the header of a PNG, GIF, JPEG or WebP file, None if not recognised."""
+    with open(path, "rb") as f:
+        head = f.read(HEADER_SIZE)
+        size = parse_size(head)
+        if size == None and head[:2] == b"\xff\xd8" and len(head) == HEADER_SIZE:
+            # the frame header can come after large EXIF or ICC segments
+            size = parse_size(head + f.read())
+    return size
+
+
+def parse_size(data: bytes) -> tuple[int, int]:
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and data[12:16] == b"IHDR":
+        return struct.unpack(">II", data[16:24])
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return struct.unpack("<HH", data[6:10])
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return parse_webp(data)
+    if data[:2] == b"\xff\xd8":
+        return parse_jpeg(data)
+    return None
+
+
+def parse_webp(data: bytes) -> tuple[int, int]:
+    chunk = data[12:16]
+    if chunk == b"VP8 " and data[23:26] == b"\x9d\x01\x2a":
+        w, h = struct.unpack("<HH", data[26:30])
+        return w & 0x3fff, h & 0x3fff
+    if chunk == b"VP8L" and data[20:21] == b"\x2f":
+        bits = int.from_bytes(data[21:25], "little")
+        return (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+    if chunk == b"VP8X":
+        return int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1
+    return None
+
+
+def parse_jpeg(data: bytes) -> tuple[int, int]:
+    pos = 2
+    while pos + 9 < len(data):
+        if data[pos] != 0xff:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xff:
+            # fill byte
+            pos += 1
+            continue
+        if marker in (0xd8, 0x01) or 0xd0 <= marker <= 0xd7:
+            pos += 2
+            continue
+        length = struct.unpack(">H", data[pos + 2:pos + 4])[0]
+        # start of frame, except DHT (c4), JPG (c8) and DAC (cc)
+        if 0xc0 <= marker <= 0xcf and marker not in (0xc4, 0xc8, 0xcc):
+            h, w = struct.unpack(">HH", data[pos + 5:pos + 9])
+            return w, h
+        pos += 2 + length
+    return None
+
+
+class ImageIndex:
+    """
+    Width and height of the images below a directory, kept between builds.
+    Sizes are cached by content hash, files by size and mtime, so only new
+    or changed files are read and only never seen content is parsed.
+    """
+    def __init__(self, files: dict =None, sizes: dict =None):
+        # src => {"size", "mtime", "hash"}
+        self.files = files if files != None else {}
+        # hash => [width, height], or None for files that could not be parsed
+        self.sizes = sizes if sizes != None else {}
+
+    def __repr__(self):
+        return f"ImageIndex({len(self.files)} files, {len(self.sizes)} sizes)"
+
+    def update(self, static_dir: str) -> tuple[dict[str, list[int]], set[str]]:
+        """
+        Scan 'static_dir', returns the site paths of its images mapped to
+        their [width, height], and the site paths whose size changed.
+        """
+        found = [(src, st) for src, _, st in scan_files(static_dir, "") if src.lower().endswith(IMAGE_EXTENSIONS)]
+        todo = []
+        for src, st in found:
+            entry = self.files.get(src)
+            if entry == None or entry["size"] != st.st_size or entry["mtime"] != st.st_mtime_ns:
+                todo.append((src, st))
+
+        def scan(item):
+            src, st = item
+            digest = file_hash(src)
+            if digest in self.sizes:
+                return src, st, digest, self.sizes[digest]
+            size = image_size(src)
+            return src, st, digest, list(size) if size != None else None
+
+        changed = set()
+        with ThreadPoolExecutor() as pool:
+            for src, st, digest, size in pool.map(scan, todo):
+                old = self.files.get(src)
+                if old == None or self.sizes.get(old["hash"]) != size:
+                    changed.add(site_path(src, static_dir))
+                self.files[src] = {"size": st.st_size, "mtime": st.st_mtime_ns, "hash": digest}
+                self.sizes[digest] = size
+
+        seen = {src for src, _ in found}
+        for src in [src for src in self.files if src not in seen]:
+            del self.files[src]
+            changed.add(site_path(src, static_dir))
+        # sizes of content no file has any more
+        used = {e["hash"] for e in self.files.values()}
+        self.sizes = {h: s for h, s in self.sizes.items() if h in used}
+
+        dims = {}
+        for src, entry in self.files.items():
+            size = self.sizes.get(entry["hash"])
+            if size != None:
+                dims[site_path(src, static_dir)] = size
+        return dims, changed
+
+    @staticmethod
+    def load(path: str) -> "ImageIndex":
+        data = load_json(path)
+        if data == None:
+            return ImageIndex()
+        return ImageIndex(data["files"], data["sizes"])
+
+    def save(self, path: str):
+        save_json(path, {"files": self.files, "sizes": self.sizes})
+
+
+def site_path(src: str, static_dir: str) -> str:
+    return "/" + os.path.relpath(src, static_dir).replace(os.sep, "/")
+
+
+def annotate_images(chunks: Iterable[str], dims: dict[str, list[int]]) -> Iterator[str]:
+    """
+    Add width and height to the images of a page's html 'chunks' whose size
+    is known, and lazy loading to every image after the first, which is
+    likely to be in view when the page opens.
+    """
+    count = 0
+
+    def annotate(m: re.Match) -> str:
+        nonlocal count
+        attrs = m.group(0)[:-1]
+        size = dims.get(m.group(2))
+        if size != None and " width=" not in attrs:
+            attrs += f' width="{size[0]}" height="{size[1]}"'
+        if count > 0 and " loading=" not in attrs:
+            attrs += ' loading="lazy" decoding="async"'
+        count += 1
+        return attrs + ">"
+
+    for chunk in chunks:
+        yield IMG_TAG.sub(annotate, chunk) if "<img " in chunk else chunk
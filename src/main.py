@@ -1,90 +1,489 @@
 import os
 import sys
-import shutil
-from markdown_blocks import markdown_to_html_node
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from manifest import Manifest, file_hash, load_json, save_json
+from template import Template
+from sync import sync_tree
+from timing import Profiler, NullProfiler
+from block_cache import BlockCache
+from highlight import HighlightCache
+from context import RenderContext
+from publish import staging_path, swap_in, link_forward, rebase
+from precompress import precompress_tree, drop_precompressed
+from pipeline import generate_pages_pipelined
+from dependencies import DependencyGraph
+from changes import diff_outputs, changes_summary
+from fingerprint import fingerprint_assets, drop_fingerprints
+from images import ImageIndex
+from minify import MinifyStats
+from storage import Storage, LocalStorage
+from search import SearchIndex, drop_search
+from shard import parse_shard, page_shard, shard_name, shard_path, merge_shards
+from metadata import MetadataIndex, read_page_header, read_metadata, page_url, write_sitemap, write_feed
 
 dir_path_public = "./docs/"
 dir_path_static = "./static/"
 dir_path_template = "./template.html"
 dir_path_content = "./content/"
+dir_path_cache = "./.cache/"
+
+
+def set_output_paths(public: str, cache: str):
+    """Where the site and the state kept between builds go, moved for one shard of a build."""
+    global dir_path_public, dir_path_cache, dir_path_manifest, dir_path_block_cache, dir_path_metadata, \
+        dir_path_dependencies, dir_path_outputs, dir_path_fingerprints, dir_path_images, dir_path_highlights, \
+        dir_path_search, dir_path_changes
+    dir_path_public = public
+    dir_path_cache = cache
+    dir_path_manifest = os.path.join(cache, "manifest.json")
+    dir_path_block_cache = os.path.join(cache, "blocks.json")
+    dir_path_metadata = os.path.join(cache, "metadata.sqlite")
+    dir_path_dependencies = os.path.join(cache, "dependencies.json")
+    dir_path_outputs = os.path.join(cache, "outputs.json")
+    dir_path_fingerprints = os.path.join(cache, "fingerprints.json")
+    dir_path_images = os.path.join(cache, "images.json")
+    dir_path_highlights = os.path.join(cache, "highlight.json")
+    dir_path_search = os.path.join(cache, "search")
+    # added, changed and removed outputs of the last build, for the deploy step
+    dir_path_changes = os.path.join(cache, "changes.json")
+
+set_output_paths(dir_path_public, dir_path_cache)
 
 def main():
 
-    basepath = "/" if len(sys.argv) <= 1 else sys.argv[1]
+    args = parse_args(sys.argv[1:])
+    if args.affected:
+        graph = DependencyGraph.load(dir_path_dependencies)
+        for path in args.affected:
+            for src in affected_pages(graph, path):
+                print(src)
+        return
+    if args.merge_shards != None:
+        pages = {src for src, _ in collect_pages(dir_path_content, dir_path_public)}
+        merged = merge_shards(args.merge_shards, dir_path_content, pages, dir_path_public, dir_path_cache)
+        merged.save(dir_path_manifest)
+        return
+    if args.shard != None:
+        index, count = args.shard
+        set_output_paths(shard_path(dir_path_public, index, count),
+                         os.path.join(dir_path_cache, shard_name(index, count)))
+    ctx = context_from_args(args)
+    precompress = args.precompress_min_size if args.precompress else None
+    build(args.basepath, incremental=args.incremental, jobs=args.jobs, ctx=ctx, link_static=args.link_static,
+          atomic=args.atomic, precompress=precompress, pipeline=args.pipeline, site_url=args.site_url,
+          fingerprint=args.fingerprint, image_attrs=args.image_attrs, shard=args.shard)
+    if args.profile:
+        print(ctx.profiler.report(args.profile_top))
+    if args.profile_json:
+        ctx.profiler.dump(args.profile_json)
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="generate the site from markdown content")
+    parser.add_argument("basepath", nargs="?", default="/")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only rebuild outputs whose inputs changed since the last build")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="number of processes rendering pages, 0 uses every core")
+    parser.add_argument("--pipeline", type=int, nargs="?", const=8, default=None, metavar="DEPTH",
+                        help="with -j 1, read, render and write pages on separate threads joined by "
+                             "queues of DEPTH pages (default 8)")
+    parser.add_argument("--atomic", action="store_true",
+                        help="build into a staging directory and swap it with the output when done")
+    parser.add_argument("--link-static", action="store_true",
+                        help="hardlink static files into the output instead of copying them")
+    parser.add_argument("--precompress", action="store_true",
+                        help="write .gz (and .zst, with the zstandard module) variants of text outputs")
+    parser.add_argument("--precompress-min-size", type=int, default=1024, metavar="BYTES",
+                        help="smallest output --precompress bothers with")
+    parser.add_argument("--fingerprint", action="store_true",
+                        help="also publish assets under a name with their content hash and link pages to "
+                             "that, so they can be cached forever")
+    parser.add_argument("--image-attrs", action="store_true",
+                        help="give images their width and height from the files in static/, "
+                             "and lazy-load every image of a page but the first")
+    parser.add_argument("--minify", action="store_true",
+                        help="collapse whitespace and drop comments in the html written, pre and code stay as they are")
+    parser.add_argument("--search", action="store_true",
+                        help="build a client side search index of the pages into search/ of the output")
+    parser.add_argument("--site-url", metavar="URL",
+                        help="scheme and host the site is served from, e.g. https://example.com, "
+                             "writes sitemap.xml and feed.xml")
+    parser.add_argument("--shard", type=parse_shard, metavar="I/N",
+                        help="render only the I-th of N slices of the pages, into docs.shard-I-of-N/, "
+                             "for builds spread over several machines")
+    parser.add_argument("--merge-shards", type=int, metavar="N",
+                        help="combine the outputs of the N shards into docs/, checking that no page "
+                             "is missing or rendered twice, without building")
+    parser.add_argument("--affected", action="append", metavar="PATH",
+                        help="list the pages the last build would render again if PATH changed, "
+                             "without building; may be repeated")
+    parser.add_argument("--profile", action="store_true",
+                        help="print the time spent per build stage and the slowest pages")
+    parser.add_argument("--profile-top", type=int, default=10, metavar="N",
+                        help="number of slowest pages listed by --profile")
+    parser.add_argument("--profile-json", metavar="PATH",
+                        help="write the --profile trace to PATH as JSON")
+    parser.add_argument("--block-cache-size", type=int, default=64, metavar="MB",
+                        help="memory for rendered blocks reused across pages, 0 disables the cache")
+    parser.add_argument("--persist-block-cache", action="store_true",
+                        help=f"keep the block cache in '{dir_path_block_cache}' between builds")
+    args = parser.parse_args(argv)
+    if args.profile_json:
+        args.profile = True
+    return args
+
+
+def context_from_args(args: argparse.Namespace) -> RenderContext:
+    profiler = Profiler() if args.profile else NullProfiler()
+    minify = MinifyStats() if args.minify else None
+    ctx = RenderContext(profiler, minify=minify, highlights=HighlightCache.load(dir_path_highlights),
+                        highlights_path=dir_path_highlights, search=args.search)
+    if args.block_cache_size <= 0:
+        return ctx
+    max_bytes = args.block_cache_size << 20
+    if args.persist_block_cache:
+        ctx.block_cache = BlockCache.load(dir_path_block_cache, max_bytes)
+        ctx.block_cache_path = dir_path_block_cache
+    else:
+        ctx.block_cache = BlockCache(max_bytes)
+    return ctx
+
+
+def build(basepath: str, incremental: bool =False, jobs: int =1, ctx: RenderContext =None,
+          link_static: bool =False, atomic: bool =False, precompress: int =None,
+          pipeline: int =None, site_url: str =None, fingerprint: bool =False,
+          image_attrs: bool =False, shard: tuple[int, int] =None) -> Manifest:
+    """
+    'precompress' is the minimum size of outputs to precompress, None skips that stage.
+    'pipeline' is the queue depth of a pipelined sequential render, see generate_pages().
+    'site_url' enables sitemap.xml and feed.xml, built from the metadata index.
+    'fingerprint' publishes assets under content hashed names too and links to those.
+    'image_attrs' adds sizes and lazy loading to the images of pages.
+    'shard' (index, count) renders only the pages of that shard, see page_shard().
+    """
+    ctx = ctx if ctx != None else RenderContext()
+    if shard != None and (ctx.terms != None or precompress != None):
+        # the search index and encodings.json cover every page, they would differ between shards
+        raise Exception("a shard cannot build the search index or precompress, do that on the merged site")
+    profiler = ctx.profiler
+    if incremental:
+        old = Manifest.load(dir_path_manifest)
+    else:
+        old = Manifest()
+
+    # with 'atomic' everything goes into a fresh staging directory, outputs that
+    # did not change are hardlinked over from the live one, which stays untouched
+    # until the finished build is swapped in. The manifest records live paths.
+    if atomic:
+        target = staging_path(dir_path_public)
+        clear_directory(target)
+        remove = lambda path: None
+    else:
+        target = dir_path_public
+        if not incremental:
+            clear_directory(dir_path_public)
+        remove = lambda path: remove_output(path, dir_path_public)
+
+    new = Manifest(basepath, file_hash(dir_path_template), shard=list(shard) if shard != None else None)
+    # options that change the html of every page count as a change of the template
+    for option, enabled in (("fingerprint", fingerprint), ("image-attrs", image_attrs), ("minify", ctx.minify != None)):
+        if enabled:
+            new.template += "+" + option
+    # pages that read an input other than their own source which changed since
+    # the last build, pages the graph knows nothing about are assumed to have read it
+    graph = DependencyGraph.load(dir_path_dependencies)
+    inputs_changed = old.basepath != new.basepath or old.template != new.template
+    stale = set()
+    if old.basepath != new.basepath:
+        stale.update(graph.using_basepath(old.basepath))
+    if old.template != new.template:
+        stale.update(graph.using_template(dir_path_template))
+
+    # static files are tracked by size and mtime, hashing gigabytes of assets every build is too slow
+    new.static = old.static
+    with profiler.task("static", dir_path_static, 0):
+        with profiler.stage("sync"):
+            stats = sync_tree(dir_path_static, target, new.static, link_static, remove,
+                              dir_path_public if atomic else None)
+    print(stats.summary())
+
+    fingerprints = load_json(dir_path_fingerprints, {})
+    with profiler.task("fingerprint", dir_path_static, 0):
+        with profiler.stage("fingerprint"):
+            if fingerprint:
+                assets, changed_assets = fingerprint_assets(dir_path_static, target, fingerprints, remove)
+            else:
+                assets, changed_assets = None, set()
+                drop_fingerprints(dir_path_static, target, fingerprints, remove)
+    template = Template.load(dir_path_template, basepath, assets)
+
+    changed_images = set()
+    if image_attrs:
+        images = ImageIndex.load(dir_path_images)
+        with profiler.task("images", dir_path_static, 0):
+            with profiler.stage("scan"):
+                ctx.images, changed_images = images.update(dir_path_static)
+
+    # with fingerprints a changed asset changes the links to it, with image attributes
+    # an image of a new size changes the pages showing it
+    for url in changed_assets | changed_images:
+        stale.update(graph.referencing(url))
+    if changed_assets & template.references:
+        stale.update(graph.using_template(dir_path_template))
+
+    # pages the search index has no terms of yet are rendered to collect them
+    search = SearchIndex(dir_path_search) if ctx.terms != None else None
+
+    # front matter of pages is only parsed again when their content changed
+    index = MetadataIndex(dir_path_metadata)
+    todo = []
+    urls = {}
+    # every shard keeps the metadata of all pages, the sitemap and feed come out the same in each
+    all_pages = set()
+    for src, dst in collect_pages(dir_path_content, target):
+        live = rebase(dst, target, dir_path_public)
+        url = page_url(live, dir_path_public, basepath)
+        urls[src] = url
+        with profiler.task("hash", src, os.path.getsize(src)):
+            with profiler.stage("hash"):
+                digest = file_hash(src)
+            if not index.is_current(src, digest, url):
+                with profiler.stage("metadata"):
+                    index.update(src, url, digest, read_metadata(src))
+        all_pages.add(src)
+        if shard != None and page_shard(os.path.relpath(src, dir_path_content), shard[1]) != shard[0]:
+            continue
+        new.pages[src] = {"hash": digest, "output": live}
+        unaffected = src not in stale and (not inputs_changed or src in graph.pages)
+        unaffected = unaffected and (search == None or src in search)
+        if unaffected and old.is_current("pages", src, digest):
+            if not atomic or link_forward(live, dst):
+                continue
+        todo.append((src, dst))
+    generate_pages(todo, template, jobs, ctx, pipeline)
+    ctx.finish()
+    for src, dst in todo:
+        graph.record(src, page_url(dst, target, "/"), dir_path_template, basepath, ctx.references.pop(src))
+    graph.record_template(dir_path_template, template.references, fingerprint)
+    graph.remove_missing(set(new.pages))
+    graph.save(dir_path_dependencies)
+
+    for dst in old.removed("pages", new):
+        remove(dst)
+
+    removed = index.remove_missing(all_pages)
+    print(f"metadata index: {index.updated} updated, {removed} removed, {len(index)} pages")
+    if site_url != None:
+        write_sitemap(index, os.path.join(target, "sitemap.xml"), site_url)
+        write_feed(index, os.path.join(target, "feed.xml"), site_url, basepath)
+    else:
+        # left by a build that had a site url
+        remove(os.path.join(target, "sitemap.xml"))
+        remove(os.path.join(target, "feed.xml"))
+    if search != None:
+        with profiler.task("search", dir_path_search, 0):
+            with profiler.stage("index"):
+                for src, _ in todo:
+                    search.update(src, urls[src], index.title_of(urls[src]), ctx.terms.pop(src))
+                search.remove_missing(set(new.pages))
+                search.save()
+                search.publish(os.path.join(target, "search"))
+        print(search.summary())
+    elif os.path.exists(dir_path_search):
+        drop_search(dir_path_search, os.path.join(target, "search"))
+    index.close()
+
+    if precompress != None:
+        with profiler.task("precompress", target, 0):
+            with profiler.stage("compress"):
+                compressed = precompress_tree(target, precompress, dir_path_public if atomic else None)
+        print(compressed.summary())
+    else:
+        drop_precompressed(target, remove)
+
+    outputs = load_json(dir_path_outputs, {})
+    with profiler.task("outputs", target, 0):
+        with profiler.stage("diff"):
+            changes = diff_outputs(target, outputs, dir_path_public if atomic else None)
+    print(changes_summary(changes))
+
+    if atomic:
+        swap_in(target, dir_path_public)
+    # saved only once the pages linking to the assets and images are written, a build
+    # failing before that sees the same changes again next time
+    save_json(dir_path_fingerprints, fingerprints)
+    if image_attrs:
+        images.save(dir_path_images)
+    new.save(dir_path_manifest)
+    save_json(dir_path_outputs, outputs)
+    save_json(dir_path_changes, changes)
+    return new
+
 
-    clear_directory(dir_path_public)
-    copy_tree(dir_path_static, dir_path_public)
+def affected_pages(graph: DependencyGraph, path: str) -> list[str]:
+    """Pages that have to be rendered again when the template, static file or page at 'path' changes."""
+    path = os.path.normpath(path)
+    if path == os.path.normpath(dir_path_template):
+        return graph.using_template(dir_path_template)
 
-    generate_pages_rec(dir_path_content, dir_path_template, dir_path_public, basepath)
+    rel = os.path.relpath(path, dir_path_static)
+    if not rel.startswith(".."):
+        url = "/" + rel.replace(os.sep, "/")
+        # with fingerprints the template's links to it change in every page
+        return sorted(set(graph.referencing(url)) | set(graph.using_asset(url)))
 
+    rel = os.path.relpath(path, dir_path_content)
+    if not rel.startswith("..") and rel.endswith(".md"):
+        # the page itself and everything linking to it
+        output = page_output_path(os.path.join(dir_path_public, rel))
+        pages = set(graph.referencing(page_url(output, dir_path_public, "/")))
+        pages.add(os.path.join(dir_path_content, rel))
+        return sorted(pages)
+    return []
 
 
-def clear_directory(path: str):
-    if not os.path.exists(path):
+def clear_directory(path: str, storage: Storage =None):
+    storage = storage if storage != None else LocalStorage()
+    if not storage.exists(path):
         return
 
-    if not os.path.isdir(path):
-        raise Exception(f"not a directory: '{e}'")
+    if not storage.stat(path).is_dir:
+        raise Exception(f"not a directory: '{path}'")
 
     print(f"delete '{path}'")
-    shutil.rmtree(path)
+    storage.remove_tree(path)
 
 
-def copy_tree(src_dir: str, dst_dir: str):
-    if not os.path.exists(src_dir):
-        raise Exception(f"path does not exist: '{src_dir}'")
+def remove_output(path: str, root: str):
+    """Delete a generated file and every directory it leaves empty, up to 'root'."""
+    if os.path.exists(path):
+        print(f"delete '{path}'")
+        os.remove(path)
+
+    root = os.path.abspath(root)
+    parent = os.path.dirname(os.path.abspath(path))
+    while parent != root and parent.startswith(root) and os.path.isdir(parent) and not os.listdir(parent):
+        os.rmdir(parent)
+        parent = os.path.dirname(parent)
+
 
-    if not os.path.exists(dst_dir):
-        print(f"create '{dst_dir}'")
-        os.mkdir(dst_dir)
+def copy_tree(src_dir: str, dst_dir: str, storage: Storage =None):
+    storage = storage if storage != None else LocalStorage()
+    for src, dst in collect_files(src_dir, dst_dir, storage):
+        storage.makedirs(os.path.dirname(dst))
+        storage.copy(src, dst)
 
-    for e in os.listdir(src_dir):
+def collect_files(src_dir: str, dst_dir: str, storage: Storage =None) -> list[tuple[str, str]]:
+    storage = storage if storage != None else LocalStorage()
+    if not storage.exists(src_dir):
+        raise Exception(f"path does not exist: '{src_dir}'")
+
+    result = []
+    for e in storage.list(src_dir):
         src = os.path.join(src_dir, e)
         dst = os.path.join(dst_dir, e)
-        if os.path.isfile(src):
-            print(f"copy '{src}' => '{dst}'")
-            shutil.copy(src, dst)
-        elif os.path.isdir(src):
-            copy_tree(src, dst)
-
-def extract_title(markdown: str) -> str:
-    for line in markdown.splitlines():
-        if line.startswith("# "):
-            return line[2:].strip()
-    raise Exception("no title found")
-
-def generate_pages_rec(content_path: str, template_path: str, dst_path: str, basepath: str):
-    for filename in os.listdir(content_path):
+        if storage.stat(src).is_dir:
+            result.extend(collect_files(src, dst, storage))
+        else:
+            result.append((src, dst))
+    return result
+
+def collect_pages(content_path: str, dst_path: str, storage: Storage =None) -> list[tuple[str, str]]:
+    result = []
+    for src, dst in collect_files(content_path, dst_path, storage):
+        if src.endswith(".md"):
+            result.append((src, page_output_path(dst)))
+    return result
+
+def page_output_path(path: str) -> str:
+    return path[:-len(".md")] + ".html"
+
+def generate_pages_rec(content_path: str, template: Template, dst_path: str, ctx: RenderContext =None):
+    ctx = ctx if ctx != None else RenderContext()
+    storage = ctx.storage
+    for filename in storage.list(content_path):
         src = os.path.join(content_path, filename)
         dst = os.path.join(dst_path, filename)
-        if filename.endswith(".md") and os.path.isfile(src):
-            dst = dst.rstrip(".md") + ".html"
-            generate_page(src, template_path, dst, basepath)
-        elif os.path.isdir(src):
-            os.mkdir(dst)
-            generate_pages_rec(src, template_path, dst, basepath)
-
-
-def generate_page(src_path: str, template_path: str, dst_path: str, basepath: str):
-    print(f"Generating page from {src_path} to {dst_path} using {template_path}")
-
-    with open(src_path, "r") as f:
-        markdown = f.read()
-
-    with open(template_path, "r") as f:
-        template = f.read()
-
-    title = extract_title(markdown)
-    content = markdown_to_html_node(markdown).to_html()
-    # content replacements
-    generated = template.replace("{{ Title }}", title)
-    generated = generated.replace("{{ Content }}", content)
-    # link replacements
-    generated = generated.replace('href="/', f'href="{basepath}')
-    generated = generated.replace('src="/', f'src="{basepath}')
-
-    with open(dst_path, "w") as f:
-        f.write(generated)
+        is_dir = storage.stat(src).is_dir
+        if filename.endswith(".md") and not is_dir:
+            dst = dst[:-len(".md")] + ".html"
+            generate_page(src, template, dst, ctx)
+        elif is_dir:
+            storage.makedirs(dst)
+            generate_pages_rec(src, template, dst, ctx)
+
+
+def generate_pages(pages: list[tuple[str, str]], template: Template, jobs: int =1, ctx: RenderContext =None,
+                   pipeline: int =None):
+    """
+    Render all (src, dst) pairs in 'pages', spread over 'jobs' processes.
+    Output directories are created up front, parents before children, so
+    the workers only ever write files.
+
+    A single job with 'pipeline' set overlaps reading and writing pages with
+    rendering instead, through queues of 'pipeline' pages.
+    """
+    ctx = ctx if ctx != None else RenderContext()
+    if jobs == 1 and pipeline != None and len(pages) > 0:
+        print(generate_pages_pipelined(pages, template, ctx, pipeline).summary())
+        return
+
+    for d in sorted({os.path.dirname(dst) for _, dst in pages}):
+        ctx.storage.makedirs(d)
+
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    # workers can only reach pages on disk
+    if jobs <= 1 or len(pages) <= 1 or not ctx.storage.shared:
+        for src, dst in pages:
+            generate_page(src, template, dst, ctx)
+        return
+
+    srcs = [src for src, _ in pages]
+    dsts = [dst for _, dst in pages]
+    chunksize = max(1, len(pages) // (jobs * 4))
+    # the template is handed to every worker once, not pickled per page
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(template, ctx.worker_spec())) as pool:
+        # map() yields in submission order, so the log reads like a sequential build
+        results = pool.map(_generate_page_worker, srcs, dsts, chunksize=chunksize)
+        for src, dst, result in zip(srcs, dsts, results):
+            print(f"Generating page from {src} to {dst} using {template.path}")
+            ctx.merge(result)
+
+
+_worker_template = None
+_worker_ctx = None
+
+def _init_worker(template: Template, ctx_spec: dict):
+    global _worker_template, _worker_ctx
+    _worker_template = template
+    _worker_ctx = RenderContext.from_spec(ctx_spec)
+
+def _generate_page_worker(src_path: str, dst_path: str) -> dict:
+    """Runs in a pool process, returns what the page added to the context."""
+    _generate_page(src_path, _worker_template, dst_path, _worker_ctx)
+    return _worker_ctx.worker_result()
+
+
+def generate_page(src_path: str, template: Template, dst_path: str, ctx: RenderContext =None):
+    print(f"Generating page from {src_path} to {dst_path} using {template.path}")
+    _generate_page(src_path, template, dst_path, ctx if ctx != None else RenderContext())
+
+
+def _generate_page(src_path: str, template: Template, dst_path: str, ctx: RenderContext):
+    profiler = ctx.profiler
+    storage = ctx.storage
+    # the markdown is streamed block by block from 'src' into 'dst',
+    # only the front matter and title are looked up in a first pass
+    with profiler.task("page", src_path, storage.stat(src_path).size):
+        with storage.open(src_path) as src, storage.open(dst_path, "w") as dst:
+            with profiler.stage("read"):
+                meta = read_page_header(src)
+            with profiler.stage("template"):
+                ctx.write_page(template, profiler.timed_writer("write", dst), meta["title"], src, src_path)
 
 
 
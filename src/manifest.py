@@ -0,0 +1,77 @@
+import os
+import json
+import hashlib
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_json(path: str, default=None):
+    """State saved by save_json(), 'default' when there is none yet."""
+    if not os.path.exists(path):
+        return default
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_json(path: str, data, indent: int =1):
+    """Replace 'path' with 'data' in one step, a build stopped halfway never leaves half a file."""
+    dirname = os.path.dirname(path)
+    if dirname != "":
+        os.makedirs(dirname, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=indent, sort_keys=True)
+    os.replace(tmp, path)
+
+
+class Manifest:
+    """
+    Content hashes of every build input, together with the output each
+    input produced. Persisted between builds to decide what needs to be redone.
+    """
+    def __init__(self, basepath: str =None, template: str =None, pages: dict =None, static: dict =None,
+                 shard: list[int] =None):
+        self.basepath = basepath
+        self.template = template
+        self.pages = pages if pages != None else {}
+        self.static = static if static != None else {}
+        # [index, count] of a build that only rendered its shard of the pages
+        self.shard = shard
+
+    def __repr__(self):
+        return f"Manifest({self.basepath}, {self.template}, {len(self.pages)} pages, {len(self.static)} static)"
+
+    @staticmethod
+    def load(path: str) -> "Manifest":
+        data = load_json(path)
+        if data == None:
+            return Manifest()
+        return Manifest(data.get("basepath"), data.get("template"), data.get("pages"), data.get("static"),
+                        data.get("shard"))
+
+    def save(self, path: str):
+        save_json(path, {
+            "basepath": self.basepath,
+            "template": self.template,
+            "pages": self.pages,
+            "static": self.static,
+            "shard": self.shard,
+        })
+
+    def is_current(self, section: str, src: str, digest: str) -> bool:
+        """True if 'src' had the same hash last time and its output still exists."""
+        entry = getattr(self, section).get(src)
+        if entry == None:
+            return False
+        return entry["hash"] == digest and os.path.exists(entry["output"])
+
+    def removed(self, section: str, current: "Manifest") -> list[str]:
+        """Outputs of entries in 'section' that are no longer part of 'current'."""
+        still_there = getattr(current, section)
+        return [e["output"] for src, e in getattr(self, section).items() if src not in still_there]
@@ -1,7 +1,12 @@
+import io
 from enum import Enum
+from typing import Iterable, Iterator
 from textnode import TextNode, TextType, text_node_to_html_node
 from htmlnode import HtmlNode, LeafNode, ParentNode
 import parsing_inline
+from timing import Profiler, NullProfiler
+from block_cache import BlockCache, block_key
+from highlight import split_info_string, highlight
 
 class BlockType(Enum):
     PARAGRAPH = "p"
@@ -13,12 +18,30 @@ class BlockType(Enum):
 
 
 def markdown_to_blocks(markdown: str) -> list[str]:
-    result = []
-    for s in markdown.split("\n\n"):
-        s = s.strip()
-        if s != '':
-            result.append(s)
-    return result
+    return list(iter_blocks(io.StringIO(markdown)))
+
+def iter_blocks(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Yield the blocks of a markdown document read line by line, e.g. from an
+    open file, so only one block is held in memory at a time.
+    Blocks are separated by empty lines, just like splitting on "\n\n".
+    """
+    block = []
+    for line in lines:
+        if line == "\n":
+            s = "".join(block).strip()
+            if s != '':
+                yield s
+            block = []
+            continue
+        block.append(line)
+    s = "".join(block).strip()
+    if s != '':
+        yield s
+
+def iter_typed_blocks(lines: Iterable[str]) -> Iterator[tuple[str, BlockType]]:
+    for block in iter_blocks(lines):
+        yield block, block_to_blocktype(block)
 
 def block_to_blocktype(block: str) -> BlockType:
     if block.startswith("#") and not block.startswith("#######"):
@@ -53,53 +76,82 @@ def block_is_ordered_list(lines: list[str]) -> bool:
             return False
     return True
 
+def extract_title(markdown: str | Iterable[str]) -> str:
+    lines = markdown.splitlines() if isinstance(markdown, str) else markdown
+    for line in lines:
+        if line.startswith("# "):
+            return line[2:].strip()
+    raise Exception("no title found")
+
 def markdown_to_html_node(markdown: str) -> HtmlNode:
     children = []
-
-    markdown_blocks = markdown_to_blocks(markdown)
-    for block in markdown_blocks:
-
-        bt = block_to_blocktype(block)
-        match (bt):
-
-            case BlockType.PARAGRAPH:
-                child_nodes = text_to_html_children(block)
-                node = ParentNode("p", child_nodes)
-                children.append(node)
-
-            case BlockType.HEADING:
-                text, header_level = strip_leading_chars(block, "#")
-                child_nodes = text_to_html_children(text)
-                node = ParentNode(f"h{header_level}", child_nodes)
-                children.append(node)
-
-            case BlockType.UNORDERED_LIST:
-                child_nodes = text_to_html_list_nodes(block)
-                node = ParentNode("ul", child_nodes)
-                children.append(node)
-
-            case BlockType.ORDERED_LIST:
-                child_nodes = text_to_html_list_nodes(block)
-                node = ParentNode("ol", child_nodes)
-                children.append(node)
-
-            case BlockType.QUOTE:
-                text = "\n".join(map(lambda x: x[x.find(" "):].strip(), block.splitlines()))
-                html_nodes = text_to_html_children(text)
-                node = ParentNode("blockquote", html_nodes)
-                children.append(node)
-
-            case BlockType.CODE:
-                text = block.strip("```")
-                child_node = LeafNode("code", text)
-                node = ParentNode("pre", [child_node])
-                children.append(node)
-
-            case _:
-                raise Exception(f"unhandled BlockType: '{bt}'")
-
+    for block, bt in iter_typed_blocks(io.StringIO(markdown)):
+        children.append(block_to_html_node(block, bt))
     return ParentNode("div", children)
 
+def markdown_to_html_chunks(lines: Iterable[str], profiler: Profiler =NullProfiler(),
+                            cache: BlockCache =None, highlights: BlockCache =None) -> Iterator[str]:
+    """
+    Streaming counterpart of markdown_to_html_node(...).to_html(): yields the
+    html one block at a time while 'lines' is being read.
+    Blocks found in 'cache' are not parsed again, code found in 'highlights'
+    is not highlighted again.
+    """
+    yield "<div>"
+    for block, bt in profiler.timed_iter("parse", iter_typed_blocks(profiler.timed_iter("read", lines))):
+        if cache != None:
+            key = block_key(block, bt)
+            html = cache.get(key)
+            if html != None:
+                yield html
+                continue
+        with profiler.stage("parse"):
+            node = block_to_html_node(block, bt, highlights)
+        with profiler.stage("to_html"):
+            html = node.to_html()
+        if cache != None:
+            cache.put(key, html)
+        yield html
+    yield "</div>"
+
+def block_to_html_node(block: str, bt: BlockType, highlights: BlockCache =None) -> HtmlNode:
+    match (bt):
+
+        case BlockType.PARAGRAPH:
+            child_nodes = text_to_html_children(block)
+            return ParentNode("p", child_nodes)
+
+        case BlockType.HEADING:
+            text, header_level = strip_leading_chars(block, "#")
+            child_nodes = text_to_html_children(text)
+            return ParentNode(f"h{header_level}", child_nodes)
+
+        case BlockType.UNORDERED_LIST:
+            child_nodes = text_to_html_list_nodes(block)
+            return ParentNode("ul", child_nodes)
+
+        case BlockType.ORDERED_LIST:
+            child_nodes = text_to_html_list_nodes(block)
+            return ParentNode("ol", child_nodes)
+
+        case BlockType.QUOTE:
+            text = "\n".join(map(lambda x: x[x.find(" "):].strip(), block.splitlines()))
+            html_nodes = text_to_html_children(text)
+            return ParentNode("blockquote", html_nodes)
+
+        case BlockType.CODE:
+            text = block.strip("```")
+            lang, code = split_info_string(text)
+            if lang == None:
+                return ParentNode("pre", [LeafNode("code", text)])
+            html = highlight(code, lang, highlights)
+            if html == None:
+                return ParentNode("pre", [LeafNode("code", code, {"class": f"language-{lang}"})])
+            return ParentNode("pre", [LeafNode("code", html, {"class": f"language-{lang}"})], {"class": "highlight"})
+
+        case _:
+            raise Exception(f"unhandled BlockType: '{bt}'")
+
 
 def text_to_html_children(text: str) -> list[HtmlNode]:
     text_nodes = parsing_inline.text_to_text_nodes(text)
@@ -0,0 +1,224 @@
+import os
+import json
+import sqlite3
+import datetime
+from typing import TextIO
+from xml.sax.saxutils import escape, quoteattr
+from markdown_blocks import extract_title
+
+FRONT_MATTER_FENCE = "---"
+# bump when the pages table changes, older indexes are rebuilt from scratch
+INDEX_VERSION = 1
+FEED_ENTRIES = 20
+
+
+def parse_front_matter(f: TextIO) -> dict:
+    """
+    Read a front matter block from the start of 'f':
+
+        ---
+        title: Hello
+        date: 2024-05-01
+        tags: [elves, rings]
+        ---
+
+    Leaves 'f' at the first line after it, or at the start if there is none.
+    Values are strings, except [a, b] lists.
+    """
+    if f.readline().rstrip("\r\n") != FRONT_MATTER_FENCE:
+        f.seek(0)
+        return {}
+
+    meta = {}
+    while True:
+        line = f.readline()
+        if line == "":
+            raise Exception("front matter is not closed with '---'")
+        line = line.rstrip("\r\n")
+        if line == FRONT_MATTER_FENCE:
+            return meta
+        if line.strip() == "" or line.lstrip().startswith("#"):
+            continue
+        key, sep, value = line.partition(":")
+        if sep == "":
+            raise Exception(f"invalid front matter line: '{line}'")
+        meta[key.strip().lower()] = parse_value(value.strip())
+
+
+def parse_value(value: str) -> str | list[str]:
+    if value.startswith("[") and value.endswith("]"):
+        return [parse_value(v.strip()) for v in value[1:-1].split(",") if v.strip() != ""]
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    return value
+
+
+def read_page_header(f: TextIO) -> dict:
+    """
+    Front matter of the page in 'f' with its "title" filled in from the
+    first heading if the front matter has none. 'f' is left at the start of
+    the markdown body, ready to be rendered.
+    """
+    meta = parse_front_matter(f)
+    body = f.tell()
+    if "title" not in meta:
+        meta["title"] = extract_title(f)
+    f.seek(body)
+    return meta
+
+
+def read_metadata(path: str) -> dict:
+    with open(path, "r") as f:
+        meta = read_page_header(f)
+    date = meta.get("date")
+    if date != None:
+        try:
+            datetime.date.fromisoformat(date[:10])
+        except ValueError:
+            raise Exception(f"invalid date '{date}' in '{path}', expected YYYY-MM-DD")
+    tags = meta.get("tags", [])
+    meta["tags"] = tags if isinstance(tags, list) else [t.strip() for t in tags.split(",") if t.strip() != ""]
+    return meta
+
+
+def page_url(output: str, root: str, basepath: str) -> str:
+    """Url path of an output file below 'root', 'blog/index.html' => '{basepath}blog/'."""
+    rel = os.path.relpath(output, root).replace(os.sep, "/")
+    if rel == "index.html":
+        rel = ""
+    elif rel.endswith("/index.html"):
+        rel = rel[:-len("index.html")]
+    return basepath + rel
+
+
+class MetadataIndex:
+    """
+    Title, date, tags, url and content hash of every page, kept in SQLite
+    between builds. Only pages whose hash or url changed are parsed again.
+    """
+    def __init__(self, path: str =":memory:"):
+        self.path = path
+        if path != ":memory:" and os.path.dirname(path) != "":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+            self.db.executescript("DROP TABLE IF EXISTS pages; DROP TABLE IF EXISTS tags;")
+        self.db.executescript(f"""
+            CREATE TABLE IF NOT EXISTS pages (
+                src TEXT PRIMARY KEY, url TEXT NOT NULL, hash TEXT NOT NULL,
+                title TEXT NOT NULL, date TEXT, meta TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS tags (
+                src TEXT NOT NULL REFERENCES pages(src) ON DELETE CASCADE, tag TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS tags_by_tag ON tags(tag);
+            CREATE INDEX IF NOT EXISTS pages_by_date ON pages(date);
+            PRAGMA user_version = {INDEX_VERSION};
+        """)
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.updated = 0
+
+    def __repr__(self):
+        return f"MetadataIndex('{self.path}', {len(self)} pages)"
+
+    def __len__(self):
+        return self.db.execute("SELECT count(*) FROM pages").fetchone()[0]
+
+    def is_current(self, src: str, digest: str, url: str) -> bool:
+        row = self.db.execute("SELECT hash, url FROM pages WHERE src = ?", (src,)).fetchone()
+        return row != None and row[0] == digest and row[1] == url
+
+    def update(self, src: str, url: str, digest: str, meta: dict):
+        self.db.execute("DELETE FROM pages WHERE src = ?", (src,))
+        self.db.execute("INSERT INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                        (src, url, digest, meta["title"], meta.get("date"), json.dumps(meta, sort_keys=True)))
+        self.db.executemany("INSERT INTO tags VALUES (?, ?)", [(src, tag) for tag in meta.get("tags", [])])
+        self.updated += 1
+
+    def remove_missing(self, current: set[str]) -> int:
+        gone = [src for (src,) in self.db.execute("SELECT src FROM pages") if src not in current]
+        self.db.executemany("DELETE FROM pages WHERE src = ?", [(src,) for src in gone])
+        return len(gone)
+
+    def pages(self, tag: str =None, limit: int =None) -> list[dict]:
+        """Pages by url, or newest first with 'tag' / 'limit' (undated pages are then left out)."""
+        if tag == None and limit == None:
+            query, args = "SELECT src, url, title, date, meta FROM pages ORDER BY url", ()
+        else:
+            query = "SELECT src, url, title, date, meta FROM pages WHERE date IS NOT NULL"
+            args = ()
+            if tag != None:
+                query += " AND src IN (SELECT src FROM tags WHERE tag = ?)"
+                args = (tag,)
+            query += " ORDER BY date DESC, url"
+            if limit != None:
+                query += f" LIMIT {int(limit)}"
+        return [{"src": src, "url": url, "title": title, "date": date, "meta": json.loads(meta)}
+                for src, url, title, date, meta in self.db.execute(query, args)]
+
+    def title_of(self, url: str) -> str:
+        row = self.db.execute("SELECT title FROM pages WHERE url = ?", (url,)).fetchone()
+        return row[0] if row != None else None
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+
+def to_timestamp(date: str) -> str:
+    """RFC 3339 time of a front matter date, midnight UTC for a bare day."""
+    if len(date) == 10:
+        return date + "T00:00:00Z"
+    return date
+
+
+def write_sitemap(index: MetadataIndex, path: str, site_url: str):
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+    for page in index.pages():
+        lines.append(f"<url><loc>{escape(site_url.rstrip('/') + page['url'])}</loc>"
+                     + (f"<lastmod>{escape(page['date'])}</lastmod>" if page["date"] != None else "")
+                     + "</url>")
+    lines.append("</urlset>")
+    write_text(path, "\n".join(lines) + "\n")
+
+
+def write_feed(index: MetadataIndex, path: str, site_url: str, basepath: str, title: str =None):
+    """Atom feed of the FEED_ENTRIES newest dated pages."""
+    site = site_url.rstrip("/")
+    entries = index.pages(limit=FEED_ENTRIES)
+    if title == None:
+        home = index.title_of(basepath)
+        title = home if home != None else site
+    updated = to_timestamp(entries[0]["date"]) if len(entries) > 0 else "1970-01-01T00:00:00Z"
+
+    lines = ['<?xml version="1.0" encoding="utf-8"?>',
+             '<feed xmlns="http://www.w3.org/2005/Atom">',
+             f"<title>{escape(title)}</title>",
+             f"<id>{escape(site + basepath)}</id>",
+             f"<link href={quoteattr(site + basepath)}/>",
+             f"<link rel=\"self\" href={quoteattr(site + basepath + os.path.basename(path))}/>",
+             f"<updated>{updated}</updated>",
+             f"<author><name>{escape(title)}</name></author>"]
+    for page in entries:
+        url = site + page["url"]
+        lines.append("<entry>")
+        lines.append(f"<title>{escape(page['title'])}</title>")
+        lines.append(f"<id>{escape(url)}</id>")
+        lines.append(f"<link href={quoteattr(url)}/>")
+        lines.append(f"<updated>{to_timestamp(page['date'])}</updated>")
+        for tag in page["meta"].get("tags", []):
+            lines.append(f"<category term={quoteattr(tag)}/>")
+        if "summary" in page["meta"]:
+            lines.append(f"<summary>{escape(page['meta']['summary'])}</summary>")
+        lines.append("</entry>")
+    lines.append("</feed>")
+    write_text(path, "\n".join(lines) + "\n")
+
+
+def write_text(path: str, text: str):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
@@ -0,0 +1,155 @@
+import re
+from typing import TextIO
+
+# elements whose text is kept byte for byte
+RAW_ELEMENTS = ("pre", "code", "textarea", "script", "style")
+TAG_NAME = re.compile(r"<(/?)(!?[a-zA-Z][a-zA-Z0-9-]*)")
+# html whitespace only, a non-breaking space is content
+WHITESPACE = re.compile(r"[ \t\r\n\f]+")
+# whitespace on either side of these renders as nothing, it is dropped rather than collapsed
+BLOCK_ELEMENTS = frozenset((
+    "html", "head", "body", "title", "meta", "link", "base", "div", "p", "ul", "ol", "li", "dl", "dt", "dd",
+    "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "article", "section", "header", "footer", "nav",
+    "main", "aside", "figure", "figcaption", "table", "thead", "tbody", "tfoot", "tr", "td", "th", "hr",
+    "br", "form", "fieldset", "!doctype",
+))
+CLOSING_TAG = {name: re.compile(f"</{name}[ \t\r\n\f>/]", re.IGNORECASE) for name in RAW_ELEMENTS}
+
+
+class MinifyStats:
+    def __init__(self):
+        self.pages = 0
+        self.bytes_in = 0
+        self.saved = 0
+
+    def __repr__(self):
+        return f"MinifyStats({self.pages} pages, {self.saved}/{self.bytes_in} bytes saved)"
+
+    def add(self, pages: int, bytes_in: int, saved: int):
+        self.pages += pages
+        self.bytes_in += bytes_in
+        self.saved += saved
+
+    def take(self) -> list[int]:
+        """Counts since the last call, handed back by pool workers."""
+        counts = [self.pages, self.bytes_in, self.saved]
+        self.pages, self.bytes_in, self.saved = 0, 0, 0
+        return counts
+
+    def summary(self) -> str:
+        rate = 100 * self.saved / self.bytes_in if self.bytes_in > 0 else 0
+        return f"minify: {self.pages} pages, {self.saved} of {self.bytes_in} bytes saved ({rate:.1f}%)"
+
+
+def collapse(m: re.Match) -> str:
+    return "\n" if "\n" in m.group(0) else " "
+
+
+class Minifier:
+    """
+    Writer that minifies the html written through it on the way to 'out':
+    runs of whitespace become one space or newline, or nothing next to a
+    block element, and comments are dropped, except in RAW_ELEMENTS and in
+    conditional comments. Works on whatever chunks it is given, a tag or
+    comment cut in two is held back until its end arrives. close() flushes
+    the rest and counts the page in 'stats'.
+    """
+    def __init__(self, out: TextIO, stats: MinifyStats =None):
+        self.out = out
+        self.stats = stats
+        self.pending = ""
+        # name of the raw element we are in, if any
+        self.raw = None
+        # whether the last thing written was a block element tag rather than text or
+        # an inline tag, the start of the page counts as one
+        self.after_block = True
+        self.bytes_in = 0
+        self.saved = 0
+
+    def write(self, s: str) -> int:
+        self.bytes_in += len(s.encode())
+        text = self.pending + s
+        self.pending = ""
+        parts = []
+        pos = 0
+        while pos < len(text):
+            if self.raw != None:
+                m = CLOSING_TAG[self.raw].search(text, pos)
+                end = m.start() if m != None else -1
+                if end == -1:
+                    # keep what could be the start of the closing tag
+                    keep = max(pos, len(text) - len(self.raw) - 3)
+                    parts.append(text[pos:keep])
+                    self.pending = text[keep:]
+                    break
+                parts.append(text[pos:end])
+                self.raw = None
+                pos = end
+            elif text.startswith("<!--", pos):
+                end = text.find("-->", pos + 4)
+                if end == -1:
+                    self.pending = text[pos:]
+                    break
+                comment = text[pos:end + 3]
+                if comment.startswith("<!--["):
+                    parts.append(comment)
+                else:
+                    self.saved += len(comment.encode())
+                pos = end + 3
+            elif text[pos] == "<":
+                end = text.find(">", pos)
+                if end == -1 or (len(text) - pos < 4 and "<!--".startswith(text[pos:])):
+                    self.pending = text[pos:]
+                    break
+                tag = text[pos:end + 1]
+                m = TAG_NAME.match(tag)
+                name = m.group(2).lower() if m != None else ""
+                if m != None and m.group(1) == "" and name in RAW_ELEMENTS and not tag.endswith("/>"):
+                    self.raw = name
+                self.after_block = name in BLOCK_ELEMENTS
+                parts.append(tag)
+                pos = end + 1
+            else:
+                end = text.find("<", pos)
+                if end == -1:
+                    # whitespace at the end may go on in the next chunk
+                    stripped = text[pos:].rstrip(" \t\r\n\f")
+                    self.pending = text[pos + len(stripped):]
+                    if stripped != "":
+                        parts.append(self.collapse(stripped))
+                        self.after_block = False
+                    break
+                segment = text[pos:end]
+                blank = segment.strip(" \t\r\n\f") == ""
+                m = TAG_NAME.match(text, end)
+                if blank and not self.after_block and (m.end() == len(text) if m != None else len(text) - end < 3):
+                    # the name of the next tag is not all here yet
+                    self.pending = text[pos:]
+                    break
+                before_block = m != None and m.group(2).lower() in BLOCK_ELEMENTS
+                if blank and (self.after_block or before_block):
+                    self.saved += len(segment)
+                else:
+                    parts.append(self.collapse(segment))
+                    if not blank:
+                        self.after_block = False
+                pos = end
+        self.out.write("".join(parts))
+        return len(s)
+
+    def collapse(self, text: str) -> str:
+        collapsed = WHITESPACE.sub(collapse, text)
+        self.saved += len(text) - len(collapsed)
+        return collapsed
+
+    def close(self):
+        rest = self.pending
+        self.pending = ""
+        if self.raw == None and rest.strip(" \t\r\n\f") == "":
+            if self.after_block:
+                self.saved += len(rest)
+                rest = ""
+            rest = self.collapse(rest)
+        self.out.write(rest)
+        if self.stats != None:
+            self.stats.add(1, self.bytes_in, self.saved)
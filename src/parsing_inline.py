@@ -1,6 +1,16 @@
 import re
 from textnode import TextNode, TextType
 
+IMAGE_PATTERN = re.compile(r"!\[([^\[\]]*)\]\(([^\(\)]*)\)")
+LINK_PATTERN = re.compile(r"(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)")
+# everything that can start an inline element; "![" has to be tried before "["
+INLINE_START_PATTERN = re.compile(r"!\[|\[|`|\*\*|_")
+INLINE_DELIMITERS = {
+    "`": TextType.CODE,
+    "**": TextType.BOLD,
+    "_": TextType.ITALIC,
+}
+
 
 def split_nodes_delimiter(old_nodes: list[TextNode], delimiter: str, text_type: TextType) -> list[TextNode]:
     result = []
@@ -87,21 +97,58 @@ def split_nodes_link(old_nodes: list[TextNode]) -> list[TextNode]:
 
 def extract_markdown_images(text: str) -> list[tuple[str,str]]:
     result = []
-    matches = re.findall(r"!\[([^\[\]]*)\]\(([^\(\)]*)\)", text)
+    matches = IMAGE_PATTERN.findall(text)
     result.extend(matches)
     return result
 
 def extract_markdown_links(text: str) -> list[tuple[str,str]]:
     result = []
-    matches = re.findall(r"(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)", text)
+    matches = LINK_PATTERN.findall(text)
     result.extend(matches)
     return result
 
 def text_to_text_nodes(text: str) -> list[TextNode]:
-    result = [TextNode(text, TextType.TEXT)]
-    result = split_nodes_image(result)
-    result = split_nodes_link(result)
-    result = split_nodes_delimiter(result, "`", TextType.CODE)
-    result = split_nodes_delimiter(result, "**", TextType.BOLD)
-    result = split_nodes_delimiter(result, "_", TextType.ITALIC)
+    """
+    Single left-to-right scan over 'text' that emits images, links, code,
+    bold and italic spans as it finds them. On text that running
+    split_nodes_image, split_nodes_link and split_nodes_delimiter in turn
+    accepts it gives the same nodes. Spans nested in other spans, which
+    those raise on (**bold `code` bold**), come out as the outer span with
+    the inner markup left in its text.
+    """
+    result = []
+    plain_start = 0
+    pos = 0
+    while True:
+        m = INLINE_START_PATTERN.search(text, pos)
+        if m == None:
+            break
+        start = m.start()
+        token = m.group()
+
+        if token == "![" or token == "[":
+            pattern = IMAGE_PATTERN if token == "![" else LINK_PATTERN
+            found = pattern.match(text, start)
+            if found == None:
+                # not an image/link after all, keep it as plain text
+                pos = m.end()
+                continue
+            if plain_start < start:
+                result.append(TextNode(text[plain_start:start], TextType.TEXT))
+            text_type = TextType.IMAGE if token == "![" else TextType.LINK
+            result.append(TextNode(found.group(1), text_type, found.group(2)))
+            pos = plain_start = found.end()
+            continue
+
+        end = text.find(token, m.end())
+        if end == -1:
+            raise Exception(f"no matching closing delimiter '{token}' in text '{text}'")
+        if plain_start < start:
+            result.append(TextNode(text[plain_start:start], TextType.TEXT))
+        if m.end() < end:
+            result.append(TextNode(text[m.end():end], INLINE_DELIMITERS[token]))
+        pos = plain_start = end + len(token)
+
+    if plain_start < len(text):
+        result.append(TextNode(text[plain_start:], TextType.TEXT))
     return result
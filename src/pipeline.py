@@ -0,0 +1,183 @@
+import io
+import os
+import time
+import queue
+import threading
+from template import Template
+from context import RenderContext
+from metadata import read_page_header
+
+# marks the end of the items in a queue
+DONE = None
+
+
+class StageQueue:
+    """Bounded queue that keeps track of how full it was and how long its ends waited."""
+    def __init__(self, maxsize: int):
+        self.queue = queue.Queue(maxsize)
+        self.maxsize = maxsize
+        self.puts = 0
+        self.depth_total = 0
+        self.depth_max = 0
+        # producer blocked because the queue was full / consumer blocked because it was empty
+        self.put_wait = 0.0
+        self.get_wait = 0.0
+
+    def __repr__(self):
+        return f"StageQueue({self.queue.qsize()}/{self.maxsize})"
+
+    def put(self, item):
+        start = time.perf_counter()
+        self.queue.put(item)
+        self.put_wait += time.perf_counter() - start
+        # depth right after the put, including the new item
+        depth = self.queue.qsize()
+        self.puts += 1
+        self.depth_total += depth
+        self.depth_max = max(self.depth_max, depth)
+
+    def close(self):
+        """Tell the consumer there is nothing more, not counted as an item."""
+        self.queue.put(DONE)
+
+    def get(self):
+        start = time.perf_counter()
+        item = self.queue.get()
+        self.get_wait += time.perf_counter() - start
+        return item
+
+    def mean_depth(self) -> float:
+        return self.depth_total / self.puts if self.puts > 0 else 0.0
+
+
+class PipelineStats:
+    def __init__(self, depth: int):
+        self.read_queue = StageQueue(depth)
+        self.write_queue = StageQueue(depth)
+        # stage => seconds spent working, not waiting on a queue
+        self.busy = {"read": 0.0, "render": 0.0, "write": 0.0}
+        self.pages = 0
+        self.seconds = 0.0
+
+    def __repr__(self):
+        return f"PipelineStats({self.pages} pages, {self.seconds:.3f} s)"
+
+    def utilisation(self) -> dict[str, float]:
+        if self.seconds == 0:
+            return {stage: 0.0 for stage in self.busy}
+        return {stage: busy / self.seconds for stage, busy in self.busy.items()}
+
+    def to_dict(self) -> dict:
+        return {
+            "pages": self.pages,
+            "seconds": self.seconds,
+            "utilisation": self.utilisation(),
+            "queues": {name: {"maxsize": q.maxsize, "mean_depth": q.mean_depth(), "max_depth": q.depth_max,
+                              "put_wait": q.put_wait, "get_wait": q.get_wait}
+                       for name, q in (("read", self.read_queue), ("write", self.write_queue))},
+        }
+
+    def summary(self) -> str:
+        busy = ", ".join(f"{stage} {100 * u:.0f}%" for stage, u in self.utilisation().items())
+        queues = ", ".join(f"{name} queue {q.mean_depth():.1f}/{q.maxsize} (max {q.depth_max})"
+                           for name, q in (("read", self.read_queue), ("write", self.write_queue)))
+        return f"pipeline: {self.pages} pages in {self.seconds:.3f} s, busy {busy}; {queues}"
+
+
+def generate_pages_pipelined(pages: list[tuple[str, str]], template: Template, ctx: RenderContext =None,
+                             depth: int =8) -> PipelineStats:
+    """
+    Render (src, dst) pairs like generate_pages(), with reading and writing
+    done by their own threads: one prefetches the markdown, the calling
+    thread renders, one writes the results. The stages are joined by queues
+    of 'depth' pages, so at most about 2 * depth + 3 pages are in memory.
+
+    Rendering stays on the calling thread, the profiler and the block cache
+    in 'ctx' are not shared with the other two.
+    """
+    ctx = ctx if ctx != None else RenderContext()
+    profiler = ctx.profiler
+    stats = PipelineStats(depth)
+    stop = threading.Event()
+    errors = []
+
+    def read():
+        try:
+            for src, dst in pages:
+                if stop.is_set():
+                    break
+                start = time.perf_counter()
+                markdown = ctx.storage.read(src)
+                stats.busy["read"] += time.perf_counter() - start
+                stats.read_queue.put((src, dst, markdown))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            stats.read_queue.close()
+
+    def write():
+        while True:
+            item = stats.write_queue.get()
+            if item == DONE:
+                return
+            if len(errors) > 0:
+                # keep draining so the render stage never blocks on a dead writer
+                continue
+            dst, html = item
+            start = time.perf_counter()
+            try:
+                ctx.storage.write(dst, html)
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            stats.busy["write"] += time.perf_counter() - start
+
+    for d in sorted({os.path.dirname(dst) for _, dst in pages}):
+        ctx.storage.makedirs(d)
+
+    start = time.perf_counter()
+    reader = threading.Thread(target=read, name="pipeline-read")
+    writer = threading.Thread(target=write, name="pipeline-write")
+    reader.start()
+    writer.start()
+    read_done = False
+    try:
+        while True:
+            item = stats.read_queue.get()
+            if item == DONE:
+                read_done = True
+                break
+            if len(errors) > 0:
+                continue
+            src, dst, markdown = item
+            print(f"Generating page from {src} to {dst} using {template.path}")
+            render_start = time.perf_counter()
+            try:
+                with profiler.task("page", src, len(markdown)):
+                    # split into lines exactly like iterating the file would
+                    lines = io.StringIO(markdown)
+                    with profiler.stage("read"):
+                        meta = read_page_header(lines)
+                    out = io.StringIO()
+                    with profiler.stage("template"):
+                        ctx.write_page(template, out, meta["title"], lines, src)
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+                continue
+            stats.busy["render"] += time.perf_counter() - render_start
+            stats.pages += 1
+            stats.write_queue.put((dst, out.getvalue()))
+    finally:
+        stop.set()
+        # unblock a reader waiting on a full queue
+        while not read_done:
+            read_done = stats.read_queue.get() == DONE
+        stats.write_queue.close()
+        reader.join()
+        writer.join()
+        stats.seconds = time.perf_counter() - start
+
+    if len(errors) > 0:
+        raise errors[0]
+    return stats
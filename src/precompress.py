@@ -0,0 +1,154 @@
+import os
+import gzip
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from manifest import load_json, save_json
+from publish import link_forward
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE = (".html", ".css", ".js", ".json", ".xml", ".svg", ".txt")
+ENCODINGS_FILE = "encodings.json"
+
+
+class PrecompressStats:
+    def __init__(self):
+        self.compressed = 0
+        self.unchanged = 0
+        self.removed = 0
+        # encoding => [bytes before, bytes after]
+        self.sizes = {}
+
+    def __repr__(self):
+        return f"PrecompressStats({self.compressed} compressed, {self.unchanged} unchanged, {self.removed} removed)"
+
+    def add(self, entry: dict, compressed: bool):
+        if compressed:
+            self.compressed += 1
+        else:
+            self.unchanged += 1
+        for name, variant in entry["encodings"].items():
+            sizes = self.sizes.setdefault(name, [0, 0])
+            sizes[0] += entry["size"]
+            sizes[1] += variant["size"]
+
+    def summary(self) -> str:
+        ratios = ", ".join(f"{name} {after}/{before} bytes" for name, (before, after) in sorted(self.sizes.items()))
+        return (f"precompressed {self.compressed} file(s) ({ratios or 'none'}), "
+                f"{self.unchanged} unchanged, {self.removed} stale variant(s) removed")
+
+
+def encoders() -> dict:
+    """Encoding name => (file suffix, compress function), zstd only when the codec is installed."""
+    result = {"gzip": (".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))}
+    if zstandard != None:
+        result["zstd"] = (".zst", lambda data: zstandard.ZstdCompressor(level=19).compress(data))
+    return result
+
+
+def etag(data: bytes) -> str:
+    return '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+
+
+def load_encodings(root: str) -> dict:
+    return load_json(os.path.join(root, ENCODINGS_FILE), {})
+
+
+def collect_compressible(root: str, min_size: int) -> list[str]:
+    result = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            if (name.endswith(COMPRESSIBLE) and name != ENCODINGS_FILE
+                    and os.path.getsize(path) >= min_size):
+                result.append(path)
+    return result
+
+
+def precompress_tree(root: str, min_size: int =1024, previous_root: str =None) -> PrecompressStats:
+    """
+    Write compressed siblings (index.html.gz, ...) of every compressible file
+    below 'root' of at least 'min_size' bytes, and an encodings.json mapping
+    each url path to its ETag and variants, so a server can answer
+    Accept-Encoding without compressing anything itself.
+
+    Variants of files whose content did not change since the last run are
+    kept. With 'previous_root', 'root' is a fresh staging directory and
+    those are hardlinked over from the live output instead.
+    """
+    previous = load_encodings(previous_root if previous_root != None else root)
+    codecs = encoders()
+    files = collect_compressible(root, min_size)
+
+    with ThreadPoolExecutor() as pool:
+        results = list(pool.map(lambda path: compress_file(path, root, codecs, previous, previous_root), files))
+
+    stats = PrecompressStats()
+    entries = {}
+    for key, entry, compressed in results:
+        if compressed:
+            print(f"compress '{os.path.join(root, key[1:])}' ({', '.join(entry['encodings'])})")
+        entries[key] = entry
+        stats.add(entry, compressed)
+
+    # variants written by an earlier run for files that are gone or now too small
+    if previous_root == None:
+        kept = {v["path"] for e in entries.values() for v in e["encodings"].values()}
+        for entry in previous.values():
+            for variant in entry["encodings"].values():
+                path = os.path.join(root, variant["path"])
+                if variant["path"] not in kept and os.path.exists(path):
+                    os.remove(path)
+                    stats.removed += 1
+
+    save_json(os.path.join(root, ENCODINGS_FILE), entries)
+    return stats
+
+
+def drop_precompressed(root: str, remove) -> int:
+    """Delete the variants and encodings.json of a build that no longer precompresses, returns the variants removed."""
+    entries = load_encodings(root)
+    removed = 0
+    for entry in entries.values():
+        for variant in entry["encodings"].values():
+            path = os.path.join(root, variant["path"])
+            if os.path.exists(path):
+                remove(path)
+                removed += 1
+    remove(os.path.join(root, ENCODINGS_FILE))
+    return removed
+
+
+def compress_file(path: str, root: str, codecs: dict, previous: dict, previous_root: str =None) -> tuple[str, dict, bool]:
+    """Returns the encodings.json key and entry of 'path' and whether anything was compressed."""
+    rel = os.path.relpath(path, root).replace(os.sep, "/")
+    key = "/" + rel
+    with open(path, "rb") as f:
+        data = f.read()
+    tag = etag(data)
+
+    old = previous.get(key)
+    if old != None and old["etag"] == tag and set(old["encodings"]) == set(codecs):
+        if all(reuse_variant(v["path"], root, previous_root) for v in old["encodings"].values()):
+            return key, old, False
+
+    entry = {"etag": tag, "size": len(data), "encodings": {}}
+    for name, (suffix, compress) in codecs.items():
+        packed = compress(data)
+        tmp = path + suffix + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(packed)
+        os.replace(tmp, path + suffix)
+        entry["encodings"][name] = {"path": rel + suffix, "size": len(packed), "etag": etag(packed)}
+    return key, entry, True
+
+
+def reuse_variant(rel: str, root: str, previous_root: str =None) -> bool:
+    path = os.path.join(root, rel)
+    if os.path.exists(path):
+        return True
+    return previous_root != None and link_forward(os.path.join(previous_root, rel), path)
@@ -0,0 +1,78 @@
+import os
+import shutil
+import ctypes
+import filecmp
+
+# renameat2() flags and the "current directory" fd, see rename(2)
+AT_FDCWD = -100
+RENAME_EXCHANGE = 2
+
+
+def staging_path(output: str) -> str:
+    return output.rstrip("/") + ".staging/"
+
+def previous_path(output: str) -> str:
+    return output.rstrip("/") + ".previous/"
+
+
+def exchange(a: str, b: str) -> bool:
+    """Atomically swap two paths with renameat2(RENAME_EXCHANGE), if the OS has it."""
+    try:
+        renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+    except (OSError, AttributeError):
+        return False
+    renameat2.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+    renameat2.restype = ctypes.c_int
+    return renameat2(AT_FDCWD, os.fsencode(a.rstrip("/")), AT_FDCWD, os.fsencode(b.rstrip("/")), RENAME_EXCHANGE) == 0
+
+
+def swap_in(staging: str, output: str):
+    """
+    Replace 'output' with the finished 'staging' directory. The replaced
+    generation is kept at previous_path(output) for the next build.
+    """
+    previous = previous_path(output)
+    if os.path.exists(previous):
+        shutil.rmtree(previous)
+
+    if not os.path.exists(output):
+        os.rename(staging.rstrip("/"), output.rstrip("/"))
+        return
+
+    if exchange(staging, output):
+        print(f"swap '{staging}' <=> '{output}'")
+        os.rename(staging.rstrip("/"), previous.rstrip("/"))
+        return
+
+    # no atomic exchange here, two renames keep the gap down to a moment
+    print(f"rename '{output}' => '{previous}', '{staging}' => '{output}'")
+    os.rename(output.rstrip("/"), previous.rstrip("/"))
+    os.rename(staging.rstrip("/"), output.rstrip("/"))
+
+
+def link_forward(live: str, staged: str) -> bool:
+    """Carry an unchanged output over from the live generation without rewriting it."""
+    if not os.path.exists(live):
+        return False
+    os.makedirs(os.path.dirname(staged), exist_ok=True)
+    try:
+        os.link(live, staged)
+    except OSError:
+        shutil.copy2(live, staged)
+    return True
+
+
+def replace_if_changed(tmp: str, dst: str) -> bool:
+    """
+    Move a freshly written 'tmp' over 'dst' unless 'dst' already has the same
+    bytes, in which case it is left alone, mtime and all. Returns whether 'dst' changed.
+    """
+    if os.path.isfile(dst) and filecmp.cmp(tmp, dst, shallow=False):
+        os.remove(tmp)
+        return False
+    os.replace(tmp, dst)
+    return True
+
+
+def rebase(path: str, old_root: str, new_root: str) -> str:
+    return os.path.join(new_root, os.path.relpath(path, old_root))
@@ -0,0 +1,267 @@
+"""
+Client side search index, collected from the html of pages while they render.
+
+The output directory 'search/' holds:
+
+    index.json          {"version", "prefix_length", "pages_per_file", "shards": [name, ...]}
+    terms/<name>.json   {term: [id gap, weight, id gap, weight, ...]} for the terms starting
+                        with the shard's prefix, ids ascending and stored as the difference
+                        to the previous one
+    pages/<n>.json      {id: [url, title]} for the ids n * pages_per_file and up
+
+A browser fetches index.json once, then only the shard of each typed word
+and the page files of the hits. The shard of a term is its first
+prefix_length characters when those are [a-z0-9], else "_" and their
+utf-8 in hex.
+"""
+import os
+import re
+import json
+import shutil
+from typing import Iterable, Iterator
+
+# bump whenever the terms or the files change, the index is built from scratch then
+SEARCH_VERSION = 1
+PREFIX_LENGTH = 2
+PAGES_PER_FILE = 1000
+TAG = re.compile(r"<[^>]*>")
+ENTITY = re.compile(r"&(amp|lt|gt|quot|#39);")
+ENTITIES = {"amp": "&", "lt": "<", "gt": ">", "quot": '"', "#39": "'"}
+WORD = re.compile(r"\w+")
+PLAIN_PREFIX = re.compile(r"[a-z0-9]+")
+# words in a heading count this many times
+HEADING_WEIGHT = 3
+MAX_TERM_LENGTH = 40
+STOP_WORDS = frozenset((
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "has", "have", "he", "her", "his",
+    "i", "if", "in", "into", "is", "it", "its", "me", "my", "not", "of", "on", "or", "our", "she", "so",
+    "that", "the", "their", "them", "then", "there", "these", "they", "this", "to", "was", "we", "were",
+    "what", "when", "which", "who", "will", "with", "you", "your",
+))
+
+
+def add_terms(text: str, terms: dict[str, int], weight: int =1):
+    for m in WORD.finditer(text):
+        term = m.group().casefold()
+        if len(term) < 2 or len(term) > MAX_TERM_LENGTH or term in STOP_WORDS:
+            continue
+        terms[term] = terms.get(term, 0) + weight
+
+
+def collect_terms(chunks: Iterable[str], terms: dict[str, int]) -> Iterator[str]:
+    """Pass the html 'chunks' of a page through, counting the words of their text in 'terms'."""
+    for chunk in chunks:
+        weight = HEADING_WEIGHT if re.match(r"<h[1-6]>", chunk) else 1
+        text = TAG.sub(" ", chunk)
+        add_terms(ENTITY.sub(lambda m: ENTITIES[m.group(1)], text), terms, weight)
+        yield chunk
+
+
+def shard_name(term: str) -> str:
+    prefix = term[:PREFIX_LENGTH]
+    if PLAIN_PREFIX.fullmatch(prefix):
+        return prefix
+    return "_" + prefix.encode().hex()
+
+
+def encode_postings(postings: dict[int, int]) -> list[int]:
+    result = []
+    previous = 0
+    for page_id in sorted(postings):
+        result.extend((page_id - previous, postings[page_id]))
+        previous = page_id
+    return result
+
+
+def decode_postings(encoded: list[int]) -> dict[int, int]:
+    postings = {}
+    page_id = 0
+    for i in range(0, len(encoded), 2):
+        page_id += encoded[i]
+        postings[page_id] = encoded[i + 1]
+    return postings
+
+
+class SearchIndex:
+    """
+    Terms of every page, kept in 'cache_dir' between builds in the form
+    they are published in. Only the shards holding terms of pages that
+    changed are read and written again.
+    """
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.state_path = os.path.join(cache_dir, "state.json")
+        self.files_dir = os.path.join(cache_dir, "files")
+        # src => {"id", "url", "title", "shards"}
+        self.pages = {}
+        self.next_id = 0
+        state = None
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r") as f:
+                state = json.load(f)
+        if state != None and state.get("version") == SEARCH_VERSION:
+            self.pages = state["pages"]
+            self.next_id = state["next_id"]
+        elif os.path.exists(self.files_dir):
+            shutil.rmtree(self.files_dir)
+        # shard => {id: {term: weight}} of the pages updated since the last save()
+        self.added = {}
+        # ids whose postings are replaced or dropped
+        self.changed = set()
+        self.dirty_shards = set()
+        self.dirty_page_files = set()
+        self.written = 0
+
+    def __repr__(self):
+        return f"SearchIndex('{self.cache_dir}', {len(self.pages)} pages)"
+
+    def __contains__(self, src: str) -> bool:
+        return src in self.pages
+
+    def update(self, src: str, url: str, title: str, terms: dict[str, int]):
+        entry = self.pages.get(src)
+        if entry == None:
+            entry = {"id": self.next_id, "url": url, "title": title, "shards": []}
+            self.next_id += 1
+            self.dirty_page_files.add(entry["id"] // PAGES_PER_FILE)
+        elif entry["url"] != url or entry["title"] != title:
+            entry["url"], entry["title"] = url, title
+            self.dirty_page_files.add(entry["id"] // PAGES_PER_FILE)
+        page_id = entry["id"]
+
+        by_shard = {}
+        for term, weight in terms.items():
+            by_shard.setdefault(shard_name(term), {})[term] = weight
+        for shard, shard_terms in by_shard.items():
+            self.added.setdefault(shard, {})[page_id] = shard_terms
+        self.changed.add(page_id)
+        self.dirty_shards.update(entry["shards"])
+        self.dirty_shards.update(by_shard)
+        entry["shards"] = sorted(by_shard)
+        self.pages[src] = entry
+
+    def remove_missing(self, current: set[str]) -> int:
+        gone = [src for src in self.pages if src not in current]
+        for src in gone:
+            entry = self.pages.pop(src)
+            self.changed.add(entry["id"])
+            self.dirty_shards.update(entry["shards"])
+            self.dirty_page_files.add(entry["id"] // PAGES_PER_FILE)
+        return len(gone)
+
+    def save(self):
+        """Rewrite the shards and page files that changed, then the state."""
+        terms_dir = os.path.join(self.files_dir, "terms")
+        pages_dir = os.path.join(self.files_dir, "pages")
+        os.makedirs(terms_dir, exist_ok=True)
+        os.makedirs(pages_dir, exist_ok=True)
+
+        for shard in sorted(self.dirty_shards):
+            path = os.path.join(terms_dir, shard + ".json")
+            before = {}
+            if os.path.exists(path):
+                with open(path, "r") as f:
+                    before = json.load(f)
+            index = {term: decode_postings(p) for term, p in before.items()}
+            for postings in index.values():
+                for page_id in self.changed & postings.keys():
+                    del postings[page_id]
+            for page_id, page_terms in self.added.get(shard, {}).items():
+                for term, weight in page_terms.items():
+                    index.setdefault(term, {})[page_id] = weight
+            index = {term: encode_postings(p) for term, p in sorted(index.items()) if len(p) > 0}
+            if index == before:
+                # a page rendered again with the same words
+                continue
+            if len(index) > 0:
+                write_json(path, index)
+            elif os.path.exists(path):
+                os.remove(path)
+            self.written += 1
+
+        files = {}
+        for entry in self.pages.values():
+            n = entry["id"] // PAGES_PER_FILE
+            if n in self.dirty_page_files:
+                files.setdefault(n, {})[entry["id"]] = [entry["url"], entry["title"]]
+        for n in sorted(self.dirty_page_files):
+            path = os.path.join(pages_dir, f"{n}.json")
+            if n in files:
+                write_json(path, dict(sorted(files[n].items())))
+            elif os.path.exists(path):
+                os.remove(path)
+
+        shards = sorted(name[:-len(".json")] for name in os.listdir(terms_dir))
+        write_json(os.path.join(self.files_dir, "index.json"), {
+            "version": SEARCH_VERSION, "prefix_length": PREFIX_LENGTH,
+            "pages_per_file": PAGES_PER_FILE, "shards": shards,
+        })
+        write_json(self.state_path, {"version": SEARCH_VERSION, "next_id": self.next_id, "pages": self.pages})
+        self.added = {}
+        self.changed = set()
+        self.dirty_shards = set()
+        self.dirty_page_files = set()
+
+    def publish(self, out_dir: str) -> int:
+        """
+        Make 'out_dir' hold the saved files, as hardlinks to the ones in the
+        cache; a file changes by being replaced, so the links never see a
+        later build. Returns the number of files linked.
+        """
+        linked = 0
+        wanted = set()
+        for dirpath, _, filenames in os.walk(self.files_dir):
+            rel = os.path.relpath(dirpath, self.files_dir)
+            os.makedirs(os.path.join(out_dir, rel), exist_ok=True)
+            for name in filenames:
+                src = os.path.join(dirpath, name)
+                dst = os.path.normpath(os.path.join(out_dir, rel, name))
+                wanted.add(dst)
+                if os.path.exists(dst) and same_file(src, dst):
+                    continue
+                tmp = dst + ".tmp"
+                try:
+                    os.link(src, tmp)
+                except OSError:
+                    shutil.copy2(src, tmp)
+                os.replace(tmp, dst)
+                linked += 1
+        # shards and page files that are gone
+        for sub in ("terms", "pages"):
+            for name in os.listdir(os.path.join(out_dir, sub)):
+                path = os.path.normpath(os.path.join(out_dir, sub, name))
+                if name.endswith(".json") and path not in wanted:
+                    os.remove(path)
+        return linked
+
+    def summary(self) -> str:
+        return f"search index: {len(self.pages)} pages, {self.written} shards written"
+
+
+def same_file(a: str, b: str) -> bool:
+    """Whether 'b' is a link to 'a', or a copy that kept its size and mtime."""
+    sa, sb = os.stat(a), os.stat(b)
+    if (sa.st_dev, sa.st_ino) == (sb.st_dev, sb.st_ino):
+        return True
+    return sa.st_size == sb.st_size and sa.st_mtime_ns == sb.st_mtime_ns
+
+
+def drop_search(cache_dir: str, out_dir: str):
+    """Remove the index of a build that no longer has one."""
+    for path in (cache_dir, out_dir):
+        if os.path.exists(path):
+            shutil.rmtree(path)
+
+
+def write_json(path: str, data) -> bool:
+    """Replace 'path' with 'data', unless it holds that already. Returns whether it was written."""
+    text = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            if f.read() == text:
+                return False
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+    return True
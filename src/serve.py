@@ -0,0 +1,209 @@
+"""
+Build the site, serve the output directory and, with --watch, keep the
+output up to date while content/, static/ and template.html are edited.
+
+    python3 src/serve.py --watch [basepath]
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import main
+from main import generate_page, page_output_path, remove_output
+from manifest import Manifest, file_hash
+from template import Template
+from sync import sync_files
+from block_cache import BlockCache
+from context import RenderContext
+
+
+def scan_tree(root: str) -> dict[str, tuple[int, int]]:
+    """(mtime, size) of every file below 'root', keyed like collect_files() does."""
+    result = {}
+    if not os.path.isdir(root):
+        return result
+    with os.scandir(root) as entries:
+        for e in entries:
+            path = os.path.join(root, e.name)
+            if e.is_file():
+                st = e.stat()
+                result[path] = (st.st_mtime_ns, st.st_size)
+            elif e.is_dir():
+                result.update(scan_tree(path))
+    return result
+
+def file_stat(path: str) -> tuple[int, int]:
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+def diff_snapshots(old: dict, new: dict) -> tuple[list[str], list[str]]:
+    changed = [path for path, stat in new.items() if old.get(path) != stat]
+    removed = [path for path in old if path not in new]
+    return changed, removed
+
+
+class Watcher:
+    """
+    Keeps the compiled template, the manifest and a stat snapshot of all
+    inputs in memory, and on every poll redoes only what changed. An input
+    only enters the snapshot once its output is written, one that failed
+    is tried again on the next poll.
+    """
+    def __init__(self, basepath: str, manifest: Manifest, ctx: RenderContext =None):
+        self.basepath = basepath
+        self.manifest = manifest
+        # the block cache stays warm between polls
+        self.ctx = ctx if ctx != None else RenderContext(block_cache=BlockCache())
+        self.template = Template.load(main.dir_path_template, basepath)
+        self.template_stat = file_stat(main.dir_path_template)
+        self.template_digest = manifest.template
+        # pages still to be rendered with the current template
+        self.stale = set()
+        self.content = scan_tree(main.dir_path_content)
+        self.static = scan_tree(main.dir_path_static)
+
+    def poll(self) -> int:
+        """Bring the output up to date, returns the number of outputs touched."""
+        updated = 0
+        errors = []
+        failed = set()
+
+        template_stat = file_stat(main.dir_path_template)
+        if template_stat != self.template_stat:
+            digest = file_hash(main.dir_path_template)
+            if digest != self.template_digest:
+                self.template = Template.load(main.dir_path_template, self.basepath)
+                self.template_digest = digest
+                self.stale = set(self.manifest.pages)
+            self.template_stat = template_stat
+
+        content = scan_tree(main.dir_path_content)
+        changed, removed = diff_snapshots(self.content, content)
+        for src in changed:
+            try:
+                if src.endswith(".md"):
+                    updated += self.update_page(src)
+                self.content[src] = content[src]
+            except Exception as e:
+                errors.append(f"'{src}': {e}")
+                failed.add(src)
+        for src in removed:
+            updated += self.remove("pages", src)
+            del self.content[src]
+        # the rest of the pages, changed ones got the new template above
+        for src in sorted(self.stale - failed):
+            entry = self.manifest.pages.get(src)
+            try:
+                if entry != None:
+                    generate_page(src, self.template, entry["output"], self.ctx)
+                    updated += 1
+                self.stale.discard(src)
+            except Exception as e:
+                errors.append(f"'{src}': {e}")
+        if len(self.stale) == 0:
+            # recorded only once every page has the new template
+            self.manifest.template = self.template_digest
+
+        static = scan_tree(main.dir_path_static)
+        changed, removed = diff_snapshots(self.static, static)
+        for src in changed:
+            try:
+                updated += self.update_static(src)
+                self.static[src] = static[src]
+            except Exception as e:
+                errors.append(f"'{src}': {e}")
+        for src in removed:
+            updated += self.remove("static", src)
+            del self.static[src]
+
+        if updated > 0:
+            self.manifest.save(main.dir_path_manifest)
+        if len(errors) > 0:
+            raise Exception(f"{len(errors)} input(s) failed, {updated} output(s) updated:\n" + "\n".join(errors))
+        return updated
+
+    def update_page(self, src: str) -> int:
+        digest = file_hash(src)
+        if self.manifest.is_current("pages", src, digest):
+            # touched, but not changed
+            return 0
+        dst = page_output_path(output_path(src, main.dir_path_content))
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        generate_page(src, self.template, dst, self.ctx)
+        self.manifest.pages[src] = {"hash": digest, "output": dst}
+        self.stale.discard(src)
+        return 1
+
+    def update_static(self, src: str) -> int:
+        dst = output_path(src, main.dir_path_static)
+        stats = sync_files([(src, dst, os.stat(src))], self.manifest.static)
+        return stats.transferred()
+
+    def remove(self, section: str, src: str) -> int:
+        entry = getattr(self.manifest, section).pop(src, None)
+        if entry == None:
+            return 0
+        remove_output(entry["output"], main.dir_path_public)
+        return 1
+
+
+def output_path(src: str, src_root: str) -> str:
+    return os.path.join(main.dir_path_public, os.path.relpath(src, src_root))
+
+
+def serve(port: int) -> ThreadingHTTPServer:
+    handler = partial(SimpleHTTPRequestHandler, directory=main.dir_path_public)
+    server = ThreadingHTTPServer(("", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"serving '{main.dir_path_public}' on http://localhost:{port}/")
+    return server
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="build the site and serve it")
+    parser.add_argument("basepath", nargs="?", default="/")
+    parser.add_argument("--port", type=int, default=8888)
+    parser.add_argument("--watch", action="store_true",
+                        help="rebuild changed pages and static files while serving")
+    parser.add_argument("--interval", type=float, default=0.05,
+                        help="seconds between two polls of the inputs")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="number of processes rendering pages for the first build")
+    return parser.parse_args(argv)
+
+
+def run(argv: list[str]):
+    args = parse_args(argv)
+    ctx = RenderContext(block_cache=BlockCache())
+    manifest = main.build(args.basepath, incremental=True, jobs=args.jobs, ctx=ctx)
+    watcher = Watcher(args.basepath, manifest, ctx) if args.watch else None
+    server = serve(args.port)
+    last_error = None
+    try:
+        while True:
+            time.sleep(args.interval if watcher != None else 3600)
+            if watcher == None:
+                continue
+            start = time.perf_counter()
+            try:
+                updated = watcher.poll()
+            except Exception as e:
+                # a broken page must not take the server down, it is retried on every
+                # poll until it renders, reported again only when the error changes
+                if str(e) != last_error:
+                    print(f"error: {e}")
+                last_error = str(e)
+                continue
+            last_error = None
+            if updated > 0:
+                print(f"updated {updated} output(s) in {(time.perf_counter() - start) * 1e3:.1f} ms")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    run(sys.argv[1:])
@@ -0,0 +1,132 @@
+import os
+import shutil
+import hashlib
+import argparse
+import filecmp
+from manifest import Manifest, file_hash
+from changes import walk_files
+from publish import staging_path, swap_in, link_forward, rebase
+
+
+def parse_shard(text: str) -> tuple[int, int]:
+    """'2/4' => (2, 4), the second of four shards."""
+    index, sep, count = text.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a shard: '{text}', expected I/N like 1/4")
+    if sep == "" or count < 1 or not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"not a shard: '{text}', expected I/N with 1 <= I <= N")
+    return index, count
+
+
+def page_shard(rel: str, count: int) -> int:
+    """
+    Shard 1..count rendering the page at 'rel', its path below the content
+    directory. The same on every machine and Python run, unlike hash().
+    """
+    digest = hashlib.sha256(rel.replace(os.sep, "/").encode()).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+
+def shard_name(index: int, count: int) -> str:
+    return f"shard-{index}-of-{count}"
+
+
+def shard_path(output: str, index: int, count: int) -> str:
+    """Output tree of one shard next to the merged one: './docs/' => './docs.shard-1-of-4/'."""
+    return output.rstrip("/") + f".{shard_name(index, count)}/"
+
+
+def merge_shards(count: int, content_dir: str, pages: set[str], output: str, cache_dir: str) -> Manifest:
+    """
+    Combine the output trees of shards 1..'count' into 'output', given the
+    sources of all 'pages' below 'content_dir'. Every page has to come from
+    exactly the shard it belongs to, rendered from its current content, and
+    the other files, the same in every shard (static files, sitemap), have
+    to be identical. Anything missing, stale, duplicated or in conflict
+    fails the merge before 'output' is touched.
+
+    Returns the manifest of the merged build, with outputs below 'output'.
+    """
+    errors = []
+    manifests = []
+    for index in range(1, count + 1):
+        path = os.path.join(cache_dir, shard_name(index, count), "manifest.json")
+        if not os.path.exists(path):
+            raise Exception(f"shard {index}/{count} has not been built: no '{path}'")
+        manifest = Manifest.load(path)
+        if manifest.shard != [index, count]:
+            errors.append(f"'{path}' is the manifest of shard {manifest.shard}, not of {index}/{count}")
+        manifests.append(manifest)
+
+    first = manifests[0]
+    for index, manifest in enumerate(manifests, 1):
+        if (manifest.basepath, manifest.template) != (first.basepath, first.template):
+            errors.append(f"shard {index}/{count} was built with other options or another template than shard 1")
+
+    # page outputs, relative to their tree => shard
+    page_outputs = {}
+    owner = {}
+    for index, manifest in enumerate(manifests, 1):
+        tree = shard_path(output, index, count)
+        for src, entry in manifest.pages.items():
+            expected = page_shard(os.path.relpath(src, content_dir), count)
+            if expected != index:
+                errors.append(f"'{src}' was rendered by shard {index}/{count}, it belongs to shard {expected}")
+            if src in owner:
+                errors.append(f"'{src}' was rendered by shards {owner[src]} and {index}")
+            if src not in pages:
+                errors.append(f"'{src}' was rendered by shard {index}/{count} but is no longer in the content")
+            elif entry["hash"] != file_hash(src):
+                errors.append(f"'{src}' changed since shard {index}/{count} rendered it")
+            owner[src] = index
+            page_outputs[os.path.relpath(entry["output"], tree)] = index
+    for src in sorted(pages - owner.keys()):
+        errors.append(f"'{src}' was not rendered by any shard, it belongs to shard "
+                      f"{page_shard(os.path.relpath(src, content_dir), count)}")
+
+    # relative path => file to take it from
+    files = {}
+    found_in = {}
+    for index in range(1, count + 1):
+        tree = shard_path(output, index, count)
+        for path in walk_files(tree):
+            rel = os.path.relpath(path, tree)
+            if rel in page_outputs and page_outputs[rel] != index:
+                errors.append(f"'{path}' is the output of a page of shard {page_outputs[rel]}")
+                continue
+            found_in.setdefault(rel, []).append(index)
+            if rel not in files:
+                files[rel] = path
+            elif not filecmp.cmp(files[rel], path, shallow=False):
+                errors.append(f"'{path}' differs from '{files[rel]}'")
+    for rel, shards in sorted(found_in.items()):
+        if rel in page_outputs:
+            continue
+        if len(shards) != count:
+            errors.append(f"'{rel}' is only in the output of shard(s) {', '.join(map(str, shards))}")
+    for rel, index in sorted(page_outputs.items()):
+        if rel not in files:
+            errors.append(f"'{os.path.join(shard_path(output, index, count), rel)}' is missing")
+
+    if len(errors) > 0:
+        raise Exception(f"cannot merge {count} shards, {len(errors)} problem(s):\n" + "\n".join(errors))
+
+    staging = staging_path(output)
+    if os.path.exists(staging):
+        shutil.rmtree(staging)
+    os.makedirs(staging)
+    for rel, path in sorted(files.items()):
+        link_forward(path, os.path.join(staging, rel))
+    swap_in(staging, output)
+    print(f"merged {count} shards: {len(pages)} pages, {len(files)} files")
+
+    merged = Manifest(first.basepath, first.template)
+    for src, entry in first.static.items():
+        merged.static[src] = dict(entry, output=rebase(entry["output"], shard_path(output, 1, count), output))
+    for index, manifest in enumerate(manifests, 1):
+        tree = shard_path(output, index, count)
+        for src, entry in manifest.pages.items():
+            merged.pages[src] = {"hash": entry["hash"], "output": rebase(entry["output"], tree, output)}
+    return merged
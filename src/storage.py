@@ -0,0 +1,247 @@
+import io
+import os
+import time
+import shutil
+from typing import TextIO
+from publish import replace_if_changed
+
+
+class FileStat:
+    __slots__ = ("size", "mtime_ns", "is_dir")
+
+    def __init__(self, size: int, mtime_ns: int, is_dir: bool =False):
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.is_dir = is_dir
+
+    def __repr__(self):
+        return f"FileStat({self.size}, {self.mtime_ns}, {self.is_dir})"
+
+
+class Storage:
+    """
+    Where pages are read from and written to. Paths are plain strings like
+    './content/index.md'; a missing path raises FileNotFoundError, as with
+    open() and os.stat().
+    """
+    # whether other processes see the same files, pool workers need it
+    shared = False
+
+    def read(self, path: str) -> str:
+        with self.open(path) as f:
+            return f.read()
+
+    def write(self, path: str, text: str):
+        with self.open(path, "w") as f:
+            f.write(text)
+
+    def open(self, path: str, mode: str ="r") -> TextIO:
+        """
+        Stream a file as text. One opened with mode "w" replaces 'path' when
+        it is closed, and not at all if the block writing it raised.
+        """
+        raise NotImplementedError
+
+    def list(self, path: str) -> list[str]:
+        """Sorted names of the entries of the directory 'path'."""
+        raise NotImplementedError
+
+    def stat(self, path: str) -> FileStat:
+        raise NotImplementedError
+
+    def exists(self, path: str) -> bool:
+        try:
+            self.stat(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def copy(self, src: str, dst: str):
+        raise NotImplementedError
+
+    def makedirs(self, path: str):
+        raise NotImplementedError
+
+    def remove_tree(self, path: str):
+        raise NotImplementedError
+
+
+class LocalStorage(Storage):
+    """The local disk."""
+    shared = True
+
+    def __repr__(self):
+        return "LocalStorage()"
+
+    def open(self, path: str, mode: str ="r") -> TextIO:
+        if mode == "r":
+            return open(path, "r")
+        if mode == "w":
+            return ReplacingFile(path)
+        raise Exception(f"unsupported mode: '{mode}'")
+
+    def list(self, path: str) -> list[str]:
+        return sorted(os.listdir(path))
+
+    def stat(self, path: str) -> FileStat:
+        st = os.stat(path)
+        return FileStat(st.st_size, st.st_mtime_ns, os.path.isdir(path))
+
+    def copy(self, src: str, dst: str):
+        shutil.copy2(src, dst)
+
+    def makedirs(self, path: str):
+        os.makedirs(path, exist_ok=True)
+
+    def remove_tree(self, path: str):
+        shutil.rmtree(path)
+
+
+class ReplacingFile:
+    """
+    Text written to 'path' through a file next to it, renamed over 'path'
+    when closed: readers never see half a file, and a file hardlinked to an
+    older generation is replaced instead of overwritten. Identical contents
+    leave 'path' untouched.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.file = open(self.tmp_path, "w")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type == None:
+            self.close()
+            return
+        self.file.close()
+        os.remove(self.tmp_path)
+
+    def write(self, s: str) -> int:
+        return self.file.write(s)
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.file.close()
+        replace_if_changed(self.tmp_path, self.path)
+
+
+class MemoryStorage(Storage):
+    """
+    Files kept in a dict, for builds that should not touch the disk, e.g.
+    to time rendering without I/O. Writing a file creates its directories.
+    """
+    def __init__(self):
+        # normalized path => bytes
+        self.files = {}
+        self.dirs = {"."}
+        self.mtimes = {}
+        # directory => names of the files and directories in it, so list() need not scan everything
+        self.children = {".": set()}
+
+    def __repr__(self):
+        return f"MemoryStorage({len(self.files)} files, {len(self.dirs)} directories)"
+
+    @staticmethod
+    def load(root: str, prefix: str =None) -> "MemoryStorage":
+        """Everything below the directory 'root' on disk, at the same paths or below 'prefix'."""
+        storage = MemoryStorage()
+        prefix = prefix if prefix != None else root
+        for dirpath, _, filenames in os.walk(root):
+            base = os.path.join(prefix, os.path.relpath(dirpath, root))
+            storage.makedirs(base)
+            for name in filenames:
+                with open(os.path.join(dirpath, name), "rb") as f:
+                    storage.put(os.path.join(base, name), f.read())
+        return storage
+
+    def put(self, path: str, data: bytes):
+        path = os.path.normpath(path)
+        if path in self.dirs:
+            raise IsADirectoryError(path)
+        self.makedirs(os.path.dirname(path))
+        self.files[path] = data
+        self.mtimes[path] = time.time_ns()
+        self.children[parent_dir(path)].add(os.path.basename(path))
+
+    def get(self, path: str) -> bytes:
+        data = self.files.get(os.path.normpath(path))
+        if data == None:
+            raise FileNotFoundError(path)
+        return data
+
+    def open(self, path: str, mode: str ="r") -> TextIO:
+        if mode == "r":
+            return io.StringIO(self.get(path).decode())
+        if mode == "w":
+            return MemoryFile(self, path)
+        raise Exception(f"unsupported mode: '{mode}'")
+
+    def list(self, path: str) -> list[str]:
+        path = os.path.normpath(path)
+        if path not in self.dirs:
+            raise FileNotFoundError(path)
+        return sorted(self.children[path])
+
+    def stat(self, path: str) -> FileStat:
+        path = os.path.normpath(path)
+        if path in self.dirs:
+            return FileStat(0, 0, True)
+        if path not in self.files:
+            raise FileNotFoundError(path)
+        return FileStat(len(self.files[path]), self.mtimes[path])
+
+    def copy(self, src: str, dst: str):
+        self.put(dst, self.get(src))
+
+    def makedirs(self, path: str):
+        path = os.path.normpath(path)
+        while path not in self.dirs and path not in ("", os.sep):
+            if path in self.files:
+                raise FileExistsError(path)
+            self.dirs.add(path)
+            self.children.setdefault(path, set())
+            self.children.setdefault(parent_dir(path), set()).add(os.path.basename(path))
+            path = os.path.dirname(path)
+
+    def remove_tree(self, path: str):
+        path = os.path.normpath(path)
+        if path not in self.dirs:
+            raise FileNotFoundError(path)
+        below = lambda p: p == path or p.startswith(path + os.sep)
+        for p in [p for p in self.files if below(p)]:
+            del self.files[p]
+            del self.mtimes[p]
+        for d in [d for d in self.dirs if below(d)]:
+            self.dirs.remove(d)
+            del self.children[d]
+        self.children.get(parent_dir(path), set()).discard(os.path.basename(path))
+
+
+def parent_dir(path: str) -> str:
+    """Directory of a normalized path, "." for the top level."""
+    parent = os.path.dirname(path)
+    return parent if parent != "" else "."
+
+
+class MemoryFile(io.StringIO):
+    """File of a MemoryStorage being written, stored when closed."""
+    def __init__(self, storage: MemoryStorage, path: str):
+        super().__init__()
+        self.storage = storage
+        self.path = path
+
+    def close(self):
+        if not self.closed:
+            self.storage.put(self.path, self.getvalue().encode())
+        super().close()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type != None:
+            # a failed write leaves the previous contents
+            super().close()
+            return
+        self.close()
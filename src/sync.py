@@ -0,0 +1,231 @@
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from manifest import file_hash
+from publish import link_forward, rebase
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl request to clone a file's extents on copy-on-write filesystems (btrfs, xfs)
+FICLONE = 0x40049409
+
+
+class SyncStats:
+    def __init__(self):
+        self.methods = {}
+        self.unchanged = 0
+        self.removed = 0
+        self.bytes_moved = 0
+
+    def __repr__(self):
+        return f"SyncStats({self.methods}, {self.unchanged} unchanged, {self.removed} removed, {self.bytes_moved} bytes)"
+
+    def transferred(self) -> int:
+        return sum(self.methods.values())
+
+    def add(self, method: str, size: int):
+        self.methods[method] = self.methods.get(method, 0) + 1
+        if method in ("copy_file_range", "sendfile", "copy"):
+            self.bytes_moved += size
+
+    def summary(self) -> str:
+        methods = ", ".join(f"{n} {m}" for m, n in sorted(self.methods.items()))
+        return (f"synced {self.transferred()} file(s) ({methods or 'none'}), {self.unchanged} unchanged, "
+                f"{self.removed} removed, {self.bytes_moved} bytes moved")
+
+
+def scan_files(src_dir: str, dst_dir: str) -> list[tuple[str, str, os.stat_result]]:
+    """Like collect_files(), with the stat of every source from a single scandir pass."""
+    if not os.path.exists(src_dir):
+        raise Exception(f"path does not exist: '{src_dir}'")
+
+    result = []
+    with os.scandir(src_dir) as it:
+        entries = sorted(it, key=lambda e: e.name)
+    for e in entries:
+        src = os.path.join(src_dir, e.name)
+        dst = os.path.join(dst_dir, e.name)
+        if e.is_file():
+            result.append((src, dst, e.stat()))
+        elif e.is_dir():
+            result.extend(scan_files(src, dst))
+    return result
+
+
+def sync_tree(src_dir: str, dst_dir: str, state: dict, link: bool =False, remove=None, live_dir: str =None) -> SyncStats:
+    """
+    Mirror 'src_dir' into 'dst_dir'. 'state' maps each source to what was
+    synced last time (size, mtime, output) and is updated in place; sources
+    whose size and mtime did not change are skipped. Outputs of sources that
+    disappeared are deleted through 'remove(path)'.
+
+    With 'live_dir', 'dst_dir' is a fresh staging directory that will replace
+    'live_dir': unchanged files are hardlinked over from there and 'state'
+    keeps recording the paths below 'live_dir'.
+    """
+    files = scan_files(src_dir, dst_dir)
+    if live_dir == None:
+        stats = sync_files(files, state, link)
+    else:
+        output_of = lambda dst: rebase(dst, dst_dir, live_dir)
+        changed = []
+        forwarded = 0
+        for src, dst, st in files:
+            if is_unchanged(state.get(src), output_of(dst), st) and link_forward(output_of(dst), dst):
+                forwarded += 1
+            else:
+                changed.append((src, dst, st))
+        stats = sync_files(changed, state, link, output_of)
+        stats.unchanged += forwarded
+
+    seen = {src for src, _, _ in files}
+    for src in [src for src in state if src not in seen]:
+        entry = state.pop(src)
+        if remove != None:
+            remove(entry["output"])
+        elif os.path.exists(entry["output"]):
+            os.remove(entry["output"])
+        stats.removed += 1
+    return stats
+
+
+def sync_files(files: list[tuple[str, str, os.stat_result]], state: dict, link: bool =False,
+               output_of=None) -> SyncStats:
+    """'output_of(dst)' gives the path recorded in 'state' for 'dst', if that differs."""
+    output_of = output_of if output_of != None else lambda dst: dst
+    stats = SyncStats()
+    todo = []
+    for src, dst, st in files:
+        if is_unchanged(state.get(src), output_of(dst), st):
+            stats.unchanged += 1
+        else:
+            todo.append((src, dst, st))
+
+    firsts, duplicates = find_duplicates(todo)
+
+    for d in sorted({os.path.dirname(dst) for _, dst, _ in todo}):
+        os.makedirs(d, exist_ok=True)
+
+    with ThreadPoolExecutor() as pool:
+        futures = [pool.submit(transfer, src, dst, st.st_size, link) for src, dst, st in firsts]
+        for (src, dst, st), future in zip(firsts, futures):
+            method = future.result()
+            print(f"copy '{src}' => '{dst}'")
+            stats.add(method, st.st_size)
+            state[src] = {"size": st.st_size, "mtime": st.st_mtime_ns, "output": output_of(dst)}
+
+    for (src, dst, st), first_dst in duplicates:
+        try:
+            replace_with_link(first_dst, dst)
+            method = "dedupe"
+        except OSError:
+            method = transfer(src, dst, st.st_size, link)
+        print(f"copy '{src}' => '{dst}'")
+        stats.add(method, st.st_size)
+        state[src] = {"size": st.st_size, "mtime": st.st_mtime_ns, "output": output_of(dst)}
+
+    return stats
+
+
+def is_unchanged(entry: dict, dst: str, st: os.stat_result) -> bool:
+    if entry == None:
+        return False
+    return (entry.get("size") == st.st_size
+            and entry.get("mtime") == st.st_mtime_ns
+            and entry.get("output") == dst
+            and os.path.exists(dst))
+
+
+def find_duplicates(files: list) -> tuple[list, list]:
+    """
+    Split 'files' into those that have to be transferred and those with the
+    same content as one of them. Only files sharing a size are hashed.
+    """
+    by_size = {}
+    for f in files:
+        by_size.setdefault(f[2].st_size, []).append(f)
+
+    firsts = []
+    duplicates = []
+    first_by_hash = {}
+    for f in files:
+        if f[2].st_size == 0 or len(by_size[f[2].st_size]) == 1:
+            firsts.append(f)
+            continue
+        digest = file_hash(f[0])
+        if digest in first_by_hash:
+            duplicates.append((f, first_by_hash[digest]))
+        else:
+            first_by_hash[digest] = f[1]
+            firsts.append(f)
+    return firsts, duplicates
+
+
+def replace_with_link(src: str, dst: str):
+    if os.path.lexists(dst):
+        os.remove(dst)
+    os.link(src, dst)
+
+
+def transfer(src: str, dst: str, size: int, link: bool =False) -> str:
+    """Copy 'src' to 'dst' the cheapest way available, returns the method used."""
+    # never write into an existing output, it may be a hardlink to a source
+    if os.path.lexists(dst):
+        os.remove(dst)
+
+    if link:
+        try:
+            os.link(src, dst)
+            return "hardlink"
+        except OSError:
+            pass
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        method = copy_contents(fsrc, fdst, size)
+    shutil.copymode(src, dst)
+    return method
+
+
+def copy_contents(fsrc, fdst, size: int) -> str:
+    src_fd = fsrc.fileno()
+    dst_fd = fdst.fileno()
+
+    if fcntl != None:
+        try:
+            fcntl.ioctl(dst_fd, FICLONE, src_fd)
+            return "reflink"
+        except OSError:
+            pass
+
+    if hasattr(os, "copy_file_range"):
+        try:
+            offset = 0
+            while offset < size:
+                n = os.copy_file_range(src_fd, dst_fd, size - offset, offset, offset)
+                if n == 0:
+                    break
+                offset += n
+            return "copy_file_range"
+        except OSError:
+            fdst.truncate(0)
+
+    if hasattr(os, "sendfile"):
+        try:
+            fdst.seek(0)
+            offset = 0
+            while offset < size:
+                n = os.sendfile(dst_fd, src_fd, offset, size - offset)
+                if n == 0:
+                    break
+                offset += n
+            return "sendfile"
+        except OSError:
+            fdst.truncate(0)
+
+    fsrc.seek(0)
+    fdst.seek(0)
+    shutil.copyfileobj(fsrc, fdst)
+    return "copy"
@@ -0,0 +1,79 @@
+import re
+from typing import Iterable, TextIO
+
+PLACEHOLDER = re.compile(r"\{\{ (\w+) \}\}")
+
+
+# site path of an href or src, up to any query or fragment
+ASSET_REFERENCE = re.compile(r'(href|src)="(/[^"#?]*)')
+
+
+def rewrite_links(html: str, basepath: str, assets: dict[str, str] =None) -> str:
+    """
+    Point the site paths in 'html' below 'basepath', and at the fingerprinted
+    name of any asset in 'assets' ('/index.css' => '/index.0123456789.css').
+    """
+    if assets:
+        html = ASSET_REFERENCE.sub(lambda m: f'{m.group(1)}="{assets.get(m.group(2), m.group(2))}', html)
+    if basepath == "/":
+        return html
+    html = html.replace('href="/', f'href="{basepath}')
+    return html.replace('src="/', f'src="{basepath}')
+
+
+class Template:
+    """
+    A page template split into static segments and named '{{ Name }}' slots.
+    The template's own links are rewritten for 'basepath' once, here,
+    so rendering a page only has to join the parts.
+    """
+    def __init__(self, text: str, basepath: str ="/", path: str =None, assets: dict[str, str] =None):
+        self.basepath = basepath
+        self.path = path
+        self.assets = assets
+        # site paths the template itself links to
+        self.references = {m.group(2) for m in ASSET_REFERENCE.finditer(text)}
+        self.segments = []
+        self.slots = []
+
+        text = rewrite_links(text, basepath, assets)
+        pos = 0
+        for m in PLACEHOLDER.finditer(text):
+            self.segments.append(text[pos:m.start()])
+            self.slots.append(m.group(1))
+            pos = m.end()
+        self.segments.append(text[pos:])
+
+    def __repr__(self):
+        return f"Template({self.path}, {self.basepath}, {self.slots})"
+
+    @staticmethod
+    def load(path: str, basepath: str ="/", assets: dict[str, str] =None) -> "Template":
+        with open(path, "r") as f:
+            return Template(f.read(), basepath, path, assets)
+
+    def render(self, values: dict[str, str]) -> str:
+        parts = []
+        for segment, slot in zip(self.segments, self.slots):
+            if slot not in values:
+                raise Exception(f"no value for placeholder '{slot}'")
+            parts.append(segment)
+            # links in the inserted content still point at '/'
+            parts.append(rewrite_links(values[slot], self.basepath, self.assets))
+        parts.append(self.segments[-1])
+        return "".join(parts)
+
+    def write(self, out: TextIO, values: dict[str, str | Iterable[str]]):
+        """
+        Stream the rendered page into 'out'. A value may be an iterable of
+        chunks, which are written as they are produced.
+        """
+        for segment, slot in zip(self.segments, self.slots):
+            if slot not in values:
+                raise Exception(f"no value for placeholder '{slot}'")
+            out.write(segment)
+            value = values[slot]
+            chunks = [value] if isinstance(value, str) else value
+            for chunk in chunks:
+                out.write(rewrite_links(chunk, self.basepath, self.assets))
+        out.write(self.segments[-1])
@@ -0,0 +1,43 @@
+import os
+import random
+import tempfile
+import unittest
+
+from benchmark import SHAPES, synthetic_page, generate_site, bench_shape
+from markdown_blocks import markdown_to_html_node
+
+
+class TestSyntheticCorpus(unittest.TestCase):
+
+    def test_pages_parse(self):
+        for shape in SHAPES:
+            markdown = synthetic_page(random.Random(1), shape, 2000, 0)
+            self.assertGreaterEqual(len(markdown), 2000)
+            self.assertTrue(markdown.startswith(f"# {shape} page 0"))
+            markdown_to_html_node(markdown).to_html()
+
+    def test_deterministic(self):
+        a = synthetic_page(random.Random(7), "links", 1000, 3)
+        b = synthetic_page(random.Random(7), "links", 1000, 3)
+        self.assertEqual(a, b)
+
+    def test_generate_site_depth(self):
+        with tempfile.TemporaryDirectory() as root:
+            generate_site(root, "deep", 3, 200)
+            self.assertTrue(os.path.isfile(os.path.join(root, "template.html")))
+            self.assertTrue(os.path.isfile(os.path.join(
+                root, "content", "d2", "d0", "d0", "d0", "d0", "d0", "d0", "page2", "index.md")))
+
+
+class TestBenchShape(unittest.TestCase):
+
+    def test_all_stages_reported(self):
+        results = bench_shape("prose", 2, 500, 1, 1)
+        self.assertEqual([r["stage"] for r in results], ["inline", "parse", "to_html", "memory", "build"])
+        for r in results:
+            self.assertGreater(r["bytes"], 0)
+            self.assertGreaterEqual(r["peak_bytes"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import json
+import tempfile
+import unittest
+
+from block_cache import BlockCache, block_key
+from markdown_blocks import BlockType
+
+
+class TestBlockKey(unittest.TestCase):
+
+    def test_type_is_part_of_key(self):
+        self.assertEqual(block_key("text", BlockType.PARAGRAPH), block_key("text", BlockType.PARAGRAPH))
+        self.assertNotEqual(block_key("text", BlockType.PARAGRAPH), block_key("text", BlockType.QUOTE))
+        self.assertNotEqual(block_key("text", BlockType.PARAGRAPH), block_key("text!", BlockType.PARAGRAPH))
+
+
+class TestBlockCache(unittest.TestCase):
+
+    def test_hit_miss(self):
+        cache = BlockCache()
+        self.assertIsNone(cache.get("a"))
+        cache.put("a", "<p>a</p>")
+        self.assertEqual(cache.get("a"), "<p>a</p>")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_lru_eviction(self):
+        cache = BlockCache(max_bytes=10)
+        cache.put("a", "aaaa")
+        cache.put("b", "bbbb")
+        cache.get("a")
+        cache.put("c", "cccc")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "aaaa")
+        self.assertEqual(cache.get("c"), "cccc")
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(cache.size, 8)
+
+    def test_too_large(self):
+        cache = BlockCache(max_bytes=3)
+        cache.put("a", "aaaa")
+        self.assertEqual(len(cache), 0)
+
+    def test_replace(self):
+        cache = BlockCache()
+        cache.put("a", "aaaa")
+        cache.put("a", "aa")
+        self.assertEqual(cache.size, 2)
+
+    def test_take_added(self):
+        cache = BlockCache(record_added=True)
+        cache.put("a", "1")
+        self.assertEqual(cache.take_added(), {"a": "1"})
+        self.assertEqual(cache.take_added(), {})
+
+    def test_bounded_without_take_added(self):
+        # the parent, sequential builds and serve never call take_added()
+        cache = BlockCache(1000)
+        for i in range(10000):
+            cache.put(str(i), "x" * 100)
+        self.assertEqual((len(cache), cache.size), (10, 1000))
+        self.assertEqual(cache.added, {})
+
+    def test_persist(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "cache", "blocks.json")
+            cache = BlockCache()
+            cache.put("a", "1")
+            cache.put("b", "2")
+            cache.get("a")
+            cache.save(path)
+            loaded = BlockCache.load(path)
+            self.assertEqual(list(loaded.entries.items()), [("b", "2"), ("a", "1")])
+            self.assertEqual(loaded.take_added(), {})
+
+    def test_persist_other_version(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "blocks.json")
+            with open(path, "w") as f:
+                json.dump({"version": -1, "entries": [["a", "1"]]}, f)
+            self.assertEqual(len(BlockCache.load(path)), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
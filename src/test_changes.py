@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+
+from changes import diff_outputs
+from testing import write_file
+
+
+class TestDiffOutputs(unittest.TestCase):
+
+    def test_added_changed_removed(self):
+        with tempfile.TemporaryDirectory() as d:
+            write_file(os.path.join(d, "a.html"), "a")
+            write_file(os.path.join(d, "blog", "b.html"), "b")
+            write_file(os.path.join(d, "c.css"), "c")
+            state = {}
+            self.assertEqual(diff_outputs(d, state),
+                             {"added": ["/a.html", "/blog/b.html", "/c.css"], "changed": [], "removed": []})
+            self.assertEqual(diff_outputs(d, state), {"added": [], "changed": [], "removed": []})
+
+            write_file(os.path.join(d, "a.html"), "a2")
+            os.remove(os.path.join(d, "c.css"))
+            self.assertEqual(diff_outputs(d, state), {"added": [], "changed": ["/a.html"], "removed": ["/c.css"]})
+            self.assertEqual(sorted(state), ["/a.html", "/blog/b.html"])
+
+    def test_identical_rewrite_keeps_mtime(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "a.html")
+            write_file(path, "a")
+            os.utime(path, ns=(0, 1000))
+            state = {}
+            diff_outputs(d, state)
+
+            os.remove(path)
+            write_file(path, "a")
+            self.assertEqual(diff_outputs(d, state), {"added": [], "changed": [], "removed": []})
+            self.assertEqual(os.stat(path).st_mtime_ns, 1000)
+
+    def test_identical_hardlink_keeps_source_mtime(self):
+        with tempfile.TemporaryDirectory() as d:
+            out = os.path.join(d, "out")
+            src = os.path.join(d, "static", "a.css")
+            write_file(src, "a")
+            os.makedirs(out)
+            os.link(src, os.path.join(out, "a.css"))
+            state = {}
+            diff_outputs(out, state)
+
+            os.utime(src, ns=(0, 5000))
+            self.assertEqual(diff_outputs(out, state), {"added": [], "changed": [], "removed": []})
+            self.assertEqual(os.stat(src).st_mtime_ns, 5000)
+            self.assertEqual(state["/a.css"]["mtime"], 5000)
+
+    def test_identical_staged_linked_to_live(self):
+        with tempfile.TemporaryDirectory() as d:
+            live = os.path.join(d, "docs")
+            staging = os.path.join(d, "docs.staging")
+            write_file(os.path.join(live, "a.html"), "a")
+            state = {}
+            diff_outputs(live, state)
+
+            write_file(os.path.join(staging, "a.html"), "a")
+            self.assertEqual(diff_outputs(staging, state, live), {"added": [], "changed": [], "removed": []})
+            self.assertEqual(os.stat(os.path.join(staging, "a.html")).st_ino,
+                             os.stat(os.path.join(live, "a.html")).st_ino)
+
+
+if __name__ == "__main__":
+    unittest.main()
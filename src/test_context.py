@@ -0,0 +1,61 @@
+import unittest
+
+from block_cache import BlockCache
+from context import RenderContext
+from highlight import HighlightCache
+from timing import Profiler, NullProfiler
+
+
+class TestRenderContext(unittest.TestCase):
+
+    def test_spec_roundtrip(self):
+        ctx = RenderContext(Profiler(), BlockCache(100))
+        worker = RenderContext.from_spec(ctx.worker_spec())
+        self.assertIsInstance(worker.profiler, Profiler)
+        self.assertNotIsInstance(worker.profiler, NullProfiler)
+        self.assertEqual(worker.block_cache.max_bytes, 100)
+        self.assertIsNot(worker.block_cache, ctx.block_cache)
+
+        plain = RenderContext.from_spec(RenderContext().worker_spec())
+        self.assertIsInstance(plain.profiler, NullProfiler)
+        self.assertIsNone(plain.block_cache)
+
+    def test_merge_worker_result(self):
+        parent = RenderContext(Profiler(), BlockCache(), "blocks.json")
+        worker = RenderContext.from_spec({"profiling": True, "block_cache": 100, "block_cache_path": None})
+        worker.block_cache_path = "blocks.json"
+        with worker.profiler.task("page", "a.md", 1):
+            pass
+        worker.block_cache.get("k")
+        worker.block_cache.put("k", "<p>k</p>")
+
+        parent.merge(worker.worker_result())
+        self.assertEqual(len(parent.profiler.records), 1)
+        self.assertEqual(parent.block_cache.misses, 1)
+        self.assertEqual(parent.block_cache.get("k"), "<p>k</p>")
+
+        # a second result only carries what happened since the first
+        second = worker.worker_result()
+        self.assertEqual(second["records"], [])
+        self.assertEqual(second["blocks"], {})
+        self.assertEqual(second["misses"], 0)
+
+    def test_highlights_from_worker(self):
+        parent = RenderContext(highlights=HighlightCache(), highlights_path="highlight.json")
+        worker = RenderContext.from_spec(dict(parent.worker_spec(), highlights_path=None))
+        self.assertIsInstance(worker.highlights, HighlightCache)
+        worker.highlights_path = "highlight.json"
+        worker.highlights.get("k")
+        worker.highlights.put("k", "<span>k</span>")
+        parent.merge(worker.worker_result())
+        self.assertEqual(parent.highlights.misses, 1)
+        self.assertEqual(parent.highlights.get("k"), "<span>k</span>")
+
+    def test_in_memory_cache_not_sent_back(self):
+        worker = RenderContext(block_cache=BlockCache())
+        worker.block_cache.put("k", "v")
+        self.assertEqual(worker.worker_result()["blocks"], {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+import main
+from dependencies import DependencyGraph, normalize_url, scan_references, new_references
+from testing import write_file, working_directory
+
+
+class TestReferences(unittest.TestCase):
+
+    def test_normalize_url(self):
+        self.assertEqual(normalize_url("/blog/tom/"), "/blog/tom")
+        self.assertEqual(normalize_url("/blog/tom/index.html#top"), "/blog/tom")
+        self.assertEqual(normalize_url("/?q=1"), "/")
+        self.assertEqual(normalize_url("../majesty", "/blog/tom/"), "/blog/majesty")
+        self.assertEqual(normalize_url("tom.png", "/blog/tom/"), "/blog/tom/tom.png")
+        self.assertEqual(normalize_url("https://example.com/x"), None)
+        self.assertEqual(normalize_url("mailto:a@b.c"), None)
+
+    def test_scan(self):
+        refs = new_references()
+        scan_references('<p><a href="/a">x</a> <img src="/i.png" alt="i"></img><code><a></code></p>', refs)
+        self.assertEqual(refs, {"links": ["/a"], "images": ["/i.png"]})
+
+
+class TestDependencyGraph(unittest.TestCase):
+
+    def test_queries(self):
+        graph = DependencyGraph()
+        graph.record("a.md", "/a/", "t.html", "/", {"links": ["/b/", "https://x.org"], "images": ["/i.png"]})
+        graph.record("b.md", "/b/", "t.html", "/", {"links": ["../a"], "images": []})
+        graph.record("c.md", "/c/", "other.html", "/base/", {"links": [], "images": ["i.png"]})
+
+        self.assertEqual(graph.referencing("/i.png"), ["a.md"])
+        self.assertEqual(graph.referencing("/c/i.png"), ["c.md"])
+        self.assertEqual(graph.referencing("/a/index.html"), ["b.md"])
+        self.assertEqual(graph.using_template("t.html"), ["a.md", "b.md"])
+        self.assertEqual(graph.using_basepath("/base/"), ["c.md"])
+        self.assertEqual(graph.page_at("/b/"), "b.md")
+
+        self.assertEqual(graph.remove_missing({"b.md", "c.md"}), 1)
+        self.assertEqual(graph.referencing("/i.png"), [])
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "cache", "dependencies.json")
+            graph = DependencyGraph()
+            graph.record("a.md", "/a/", "t.html", "/", {"links": ["/b"], "images": []})
+            graph.record_template("t.html", {"/index.css"}, True)
+            graph.save(path)
+            self.assertEqual(DependencyGraph.load(path).pages, graph.pages)
+            self.assertEqual(DependencyGraph.load(path).using_asset("/index.css"), ["a.md"])
+            self.assertEqual(DependencyGraph.load(os.path.join(d, "missing.json")).pages, {})
+
+
+class TestBuildGraph(unittest.TestCase):
+
+    def test_build_records_and_queries(self):
+        with tempfile.TemporaryDirectory() as d, working_directory(d), redirect_stdout(StringIO()):
+            write_file("./template.html", "{{ Title }}|{{ Content }}")
+            write_file("./static/images/a.png", "png")
+            write_file("./content/index.md", "# home\n\n[post](/post)")
+            write_file("./content/post/index.md", "# post\n\n![a](/images/a.png)")
+            write_file("./content/other/index.md", "# other")
+            main.build("/", jobs=2)
+
+            graph = DependencyGraph.load(main.dir_path_dependencies)
+            self.assertEqual(len(graph.pages), 3)
+            self.assertEqual(main.affected_pages(graph, "./static/images/a.png"), ["./content/post/index.md"])
+            self.assertEqual(main.affected_pages(graph, "content/post/index.md"),
+                             ["./content/index.md", "./content/post/index.md"])
+            self.assertEqual(len(main.affected_pages(graph, "template.html")), 3)
+            self.assertEqual(main.affected_pages(graph, "./static/index.css"), [])
+
+            os.remove("./content/other/index.md")
+            write_file("./template.html", "{{ Title }}!{{ Content }}")
+            main.build("/", incremental=True)
+            graph = DependencyGraph.load(main.dir_path_dependencies)
+            self.assertEqual(sorted(graph.pages), ["./content/index.md", "./content/post/index.md"])
+            with open("./docs/post/index.html") as f:
+                self.assertTrue(f.read().startswith("post!"))
+
+    def test_fingerprinted_template_asset(self):
+        with tempfile.TemporaryDirectory() as d, working_directory(d), redirect_stdout(StringIO()):
+            write_file("./template.html", '<link href="/index.css">{{ Content }}')
+            write_file("./static/index.css", "css")
+            write_file("./content/index.md", "# home")
+            write_file("./content/other/index.md", "# other")
+            main.build("/")
+            graph = DependencyGraph.load(main.dir_path_dependencies)
+            self.assertEqual(main.affected_pages(graph, "./static/index.css"), [])
+
+            main.build("/", incremental=True, fingerprint=True)
+            graph = DependencyGraph.load(main.dir_path_dependencies)
+            self.assertEqual(main.affected_pages(graph, "./static/index.css"),
+                             ["./content/index.md", "./content/other/index.md"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+import main
+from fingerprint import fingerprinted_name, fingerprint_assets, drop_fingerprints
+from manifest import file_hash
+from testing import write_file, read_file, working_directory
+
+
+class TestFingerprint(unittest.TestCase):
+
+    def test_name(self):
+        self.assertEqual(fingerprinted_name("images/tom.png", "0123456789abcdef"), "images/tom.0123456789.png")
+        self.assertEqual(fingerprinted_name("/a.b/c.min.js", "0123456789abcdef"), "/a.b/c.min.0123456789.js")
+
+    def test_assets(self):
+        with tempfile.TemporaryDirectory() as d:
+            static = os.path.join(d, "static")
+            out = os.path.join(d, "out")
+            for name in ("index.css", "images/a.png", "robots.txt"):
+                write_file(os.path.join(static, name), name)
+                write_file(os.path.join(out, name), name)
+            state = {}
+            assets, changed = fingerprint_assets(static, out, state)
+
+            css = fingerprinted_name("/index.css", file_hash(os.path.join(static, "index.css")))
+            self.assertEqual(sorted(assets), ["/images/a.png", "/index.css"])
+            self.assertEqual(assets["/index.css"], css)
+            self.assertEqual(changed, {"/images/a.png", "/index.css"})
+            self.assertEqual(os.stat(out + css).st_ino, os.stat(os.path.join(out, "index.css")).st_ino)
+
+            # nothing changed
+            self.assertEqual(fingerprint_assets(static, out, state), (assets, set()))
+
+            write_file(os.path.join(static, "index.css"), "new")
+            os.remove(os.path.join(out, "index.css"))
+            write_file(os.path.join(out, "index.css"), "new")
+            os.remove(os.path.join(static, "images", "a.png"))
+            new_assets, changed = fingerprint_assets(static, out, state)
+            self.assertEqual(changed, {"/images/a.png", "/index.css"})
+            self.assertFalse(os.path.exists(out + css))
+            self.assertFalse(os.path.exists(out + assets["/images/a.png"]))
+            self.assertEqual(read_file(out + new_assets["/index.css"]), "new")
+
+            self.assertEqual(drop_fingerprints(static, out, state), {"/index.css"})
+            self.assertEqual(state, {})
+            self.assertFalse(os.path.exists(out + new_assets["/index.css"]))
+
+    def test_build_rebuilds_referencing_pages(self):
+        with tempfile.TemporaryDirectory() as d, working_directory(d):
+            write_file("./template.html", '<link href="/index.css">{{ Title }}|{{ Content }}')
+            write_file("./static/index.css", "css")
+            write_file("./static/a.png", "a")
+            write_file("./content/index.md", "# home\n\n![a](/a.png)")
+            write_file("./content/other/index.md", "# other")
+            with redirect_stdout(StringIO()):
+                main.build("/", fingerprint=True)
+            a = fingerprinted_name("/a.png", file_hash("./static/a.png"))
+            self.assertIn(f'src="{a}"', read_file("./docs/index.html"))
+            self.assertEqual(read_file("./docs" + a), "a")
+
+            write_file("./static/a.png", "a2")
+            log = StringIO()
+            with redirect_stdout(log):
+                main.build("/", incremental=True, fingerprint=True)
+            generated = [l for l in log.getvalue().splitlines() if l.startswith("Generating")]
+            self.assertEqual(len(generated), 1)
+            self.assertIn("./content/index.md", generated[0])
+            a2 = fingerprinted_name("/a.png", file_hash("./static/a.png"))
+            self.assertIn(f'src="{a2}"', read_file("./docs/index.html"))
+
+            write_file("./static/index.css", "css2")
+            log = StringIO()
+            with redirect_stdout(log):
+                main.build("/", incremental=True, fingerprint=True)
+            self.assertEqual(log.getvalue().count("Generating"), 2)
+
+    def test_failed_build_keeps_changes(self):
+        with tempfile.TemporaryDirectory() as d, working_directory(d):
+            write_file("./template.html", "{{ Title }}|{{ Content }}")
+            write_file("./static/a.png", "a")
+            write_file("./content/index.md", "# home\n\n![a](/a.png)")
+            with redirect_stdout(StringIO()):
+                main.build("/", fingerprint=True)
+
+            write_file("./static/a.png", "a2")
+            # rendered first, fails the build before index.md is rendered again
+            write_file("./content/a-broken/index.md", "no title")
+            with redirect_stdout(StringIO()), self.assertRaisesRegex(Exception, "no title"):
+                main.build("/", incremental=True, fingerprint=True)
+            os.remove("./content/a-broken/index.md")
+            with redirect_stdout(StringIO()):
+                main.build("/", incremental=True, fingerprint=True)
+            a2 = fingerprinted_name("/a.png", file_hash("./static/a.png"))
+            self.assertIn(f'src="{a2}"', read_file("./docs/index.html"))
+            self.assertTrue(os.path.exists("./docs" + a2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+import main
+from highlight import HighlightCache, highlight, highlight_key, split_info_string
+from testing import write_file, working_directory
+
+
+class TestHighlight(unittest.TestCase):
+
+    def test_python(self):
+        self.assertEqual(highlight('def f(x):\n    return "<a>"  # done', "python"),
+                         '<span class="k">def</span> <span class="nf">f</span>(x):\n'
+                         '    <span class="k">return</span> <span class="s">"&lt;a&gt;"</span>  <span class="c1"># done</span>')
+        # no keywords inside identifiers
+        self.assertEqual(highlight("format_if = defined1", "py"), "format_if = defined1")
+
+    def test_shell(self):
+        self.assertEqual(highlight('echo "$A" $B # note', "sh"),
+                         '<span class="nb">echo</span> <span class="s2">"$A"</span> <span class="nv">$B</span> '
+                         '<span class="c1"># note</span>')
+        self.assertEqual(highlight("git log --format=done", "bash"), "git log --format=done")
+
+    def test_json(self):
+        self.assertEqual(highlight('{"a": [1, true, "b"]}', "json"),
+                         '{<span class="nt">"a"</span>: [<span class="m">1</span>, <span class="kc">true</span>, '
+                         '<span class="s2">"b"</span>]}')
+
+    def test_html(self):
+        self.assertEqual(highlight('<a href="/x">&amp;</a><!-- c -->', "html"),
+                         '<span class="nt">&lt;a</span> <span class="na">href</span>=<span class="s">"/x"</span>'
+                         '<span class="nt">&gt;</span><span class="ni">&amp;amp;</span><span class="nt">&lt;/a&gt;</span>'
+                         '<span class="c">&lt;!-- c --&gt;</span>')
+
+    def test_unknown_language(self):
+        self.assertIsNone(highlight("fn main() {}", "rust"))
+
+    def test_split_info_string(self):
+        self.assertEqual(split_info_string("Python title=x\nx = 1\n"), ("python", "\nx = 1\n"))
+        self.assertEqual(split_info_string("\ncode\n"), (None, "\ncode\n"))
+        self.assertEqual(split_info_string("inline"), (None, "inline"))
+        self.assertEqual(split_info_string('"x"\ncode\n'), (None, '"x"\ncode\n'))
+
+    def test_cache(self):
+        cache = HighlightCache()
+        first = highlight("x = 1", "python", cache)
+        self.assertEqual(highlight("x = 1", "py", cache), first)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        cache.put(highlight_key("python", "x = 1"), "cached")
+        self.assertEqual(highlight("x = 1", "python", cache), "cached")
+        self.assertNotEqual(highlight_key("python", "x = 1"), highlight_key("json", "x = 1"))
+        # only pool workers hand snippets back, the cache of a build holds no second copy
+        self.assertEqual(cache.added, {})
+
+    def test_build_persists_cache(self):
+        with tempfile.TemporaryDirectory() as d, working_directory(d):
+            write_file("./template.html", "{{ Title }}|{{ Content }}")
+            os.makedirs("./static")
+            write_file("./content/index.md", "# home\n\n```json\n{\"a\": 1}\n```")
+            args = main.parse_args(["/", "--block-cache-size", "0"])
+            with redirect_stdout(StringIO()):
+                main.build("/", ctx=main.context_from_args(args))
+            ctx = main.context_from_args(args)
+            self.assertEqual(len(ctx.highlights), 1)
+            log = StringIO()
+            with redirect_stdout(log):
+                main.build("/", ctx=ctx)
+            self.assertIn("highlight cache: 1 hits, 0 misses", log.getvalue())
+            with open("./docs/index.html") as f:
+                self.assertIn('<span class="nt">"a"</span>', f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -22,6 +22,11 @@ class TestHtmlNode(unittest.TestCase):
             ,"target": "_blank",})
         self.assertEqual(node.props_to_html(), ' href="https://www.google.com" target="_blank"')
 
+    def test_no_instance_dict(self):
+        for node in (HtmlNode(), LeafNode("b", "x"), ParentNode("p", [])):
+            self.assertFalse(hasattr(node, "__dict__"))
+        self.assertIsNone(LeafNode("b", "x", {}).props)
+
 
 class TestLeafNode(unittest.TestCase):
 
@@ -103,6 +108,18 @@ class TestParentNode(unittest.TestCase):
         expected = '<div property1="value1">' + '<span>child</span>' + '</div>'
         self.assertEqual(parent_node.to_html(), expected)
 
+    def test_write_html_appends(self):
+        node = ParentNode("p", [LeafNode("b", "bold"), LeafNode(None, " text")])
+        out = ["<article>"]
+        node.write_html(out)
+        self.assertEqual("".join(out), "<article><p><b>bold</b> text</p>")
+
+    def test_to_html_wide(self):
+        node = ParentNode("ul", [ParentNode("li", [LeafNode(None, str(i))]) for i in range(10000)])
+        html = node.to_html()
+        self.assertTrue(html.startswith("<ul><li>0</li><li>1</li>"))
+        self.assertTrue(html.endswith("<li>9999</li></ul>"))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,142 @@
+import os
+import struct
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+import main
+from images import ImageIndex, parse_size, image_size, annotate_images
+from testing import write_file, write_bytes, working_directory
+
+
+def png(w: int, h: int) -> bytes:
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">II", w, h) + b"\x08\x06\x00\x00\x00"
+
+def gif(w: int, h: int) -> bytes:
+    return b"GIF89a" + struct.pack("<HH", w, h) + b"\x00\x00\x00"
+
+def jpeg(w: int, h: int, padding: int =10) -> bytes:
+    app0 = b"\xff\xe0" + struct.pack(">H", padding + 2) + b"\x00" * padding
+    dht = b"\xff\xc4" + struct.pack(">H", 4) + b"\x00\x00"
+    sof = b"\xff\xc0" + struct.pack(">HBHH", 17, 8, h, w) + b"\x03" + b"\x00" * 9
+    return b"\xff\xd8" + app0 + dht + sof
+
+def webp(chunk: bytes, payload: bytes) -> bytes:
+    return b"RIFF" + struct.pack("<I", 4 + 8 + len(payload)) + b"WEBP" + chunk + struct.pack("<I", len(payload)) + payload
+
+class TestImageSize(unittest.TestCase):
+
+    def test_formats(self):
+        self.assertEqual(parse_size(png(1026, 388)), (1026, 388))
+        self.assertEqual(parse_size(gif(16, 9)), (16, 9))
+        self.assertEqual(parse_size(jpeg(640, 480)), (640, 480))
+        vp8 = b"\x00\x00\x00" + b"\x9d\x01\x2a" + struct.pack("<HH", 300, 200)
+        self.assertEqual(parse_size(webp(b"VP8 ", vp8)), (300, 200))
+        bits = (300 - 1) | ((200 - 1) << 14)
+        self.assertEqual(parse_size(webp(b"VP8L", b"\x2f" + bits.to_bytes(4, "little"))), (300, 200))
+        vp8x = b"\x00" * 4 + (300 - 1).to_bytes(3, "little") + (200 - 1).to_bytes(3, "little")
+        self.assertEqual(parse_size(webp(b"VP8X", vp8x)), (300, 200))
+        self.assertIsNone(parse_size(b"not an image"))
+
+    def test_jpeg_with_large_header(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "a.jpg")
+            data = jpeg(4000, 3000, 0)
+            # frame header beyond the first read, behind several big segments
+            app = b"\xff\xe1" + struct.pack(">H", 65000) + b"\x00" * 64998
+            write_bytes(path, data[:2] + app * 2 + data[2:])
+            self.assertEqual(image_size(path), (4000, 3000))
+
+
+class TestImageIndex(unittest.TestCase):
+
+    def test_incremental(self):
+        with tempfile.TemporaryDirectory() as d:
+            static = os.path.join(d, "static")
+            write_bytes(os.path.join(static, "images", "a.png"), png(10, 20))
+            write_bytes(os.path.join(static, "b.gif"), gif(3, 4))
+            write_bytes(os.path.join(static, "broken.jpg"), b"\xff\xd8nope")
+            write_file(os.path.join(static, "index.css"), "css")
+            index = ImageIndex()
+            dims, changed = index.update(static)
+            self.assertEqual(dims, {"/images/a.png": [10, 20], "/b.gif": [3, 4]})
+            self.assertEqual(changed, {"/images/a.png", "/b.gif", "/broken.jpg"})
+
+            path = os.path.join(d, "images.json")
+            index.save(path)
+            index = ImageIndex.load(path)
+            self.assertEqual(index.update(static), (dims, set()))
+
+            write_bytes(os.path.join(static, "images", "a.png"), png(11, 20))
+            os.remove(os.path.join(static, "b.gif"))
+            dims, changed = index.update(static)
+            self.assertEqual(dims, {"/images/a.png": [11, 20]})
+            self.assertEqual(changed, {"/images/a.png", "/b.gif"})
+            self.assertEqual(len(index.sizes), 2)
+
+    def test_known_content_not_parsed(self):
+        with tempfile.TemporaryDirectory() as d:
+            write_bytes(os.path.join(d, "a.png"), png(10, 20))
+            index = ImageIndex()
+            index.update(d)
+            digest = index.files[os.path.join(d, "a.png")]["hash"]
+            index.sizes[digest] = [1, 2]
+            write_bytes(os.path.join(d, "copy.png"), png(10, 20))
+            dims, _ = index.update(d)
+            self.assertEqual(dims["/copy.png"], [1, 2])
+
+
+class TestAnnotateImages(unittest.TestCase):
+
+    def test_annotate(self):
+        dims = {"/a.png": [10, 20]}
+        chunks = ['<div><p><img src="/a.png" alt="a"></img>', '<img src="/b.png" alt="b"></img>',
+                  '<img src="/a.png" alt="c"></img></p></div>']
+        self.assertEqual("".join(annotate_images(chunks, dims)),
+                         '<div><p><img src="/a.png" alt="a" width="10" height="20"></img>'
+                         '<img src="/b.png" alt="b" loading="lazy" decoding="async"></img>'
+                         '<img src="/a.png" alt="c" width="10" height="20" loading="lazy" decoding="async"></img>'
+                         '</p></div>')
+
+    def test_build(self):
+        with tempfile.TemporaryDirectory() as d, working_directory(d):
+            write_file("./template.html", "{{ Title }}|{{ Content }}")
+            write_bytes("./static/a.png", png(10, 20))
+            write_file("./content/index.md", "# home\n\n![a](/a.png)")
+            write_file("./content/other/index.md", "# other")
+            with redirect_stdout(StringIO()):
+                main.build("/", image_attrs=True)
+            with open("./docs/index.html") as f:
+                self.assertIn('<img src="/a.png" alt="a" width="10" height="20">', f.read())
+
+            write_bytes("./static/a.png", png(30, 20))
+            log = StringIO()
+            with redirect_stdout(log):
+                main.build("/", incremental=True, image_attrs=True)
+            self.assertEqual(log.getvalue().count("Generating"), 1)
+            with open("./docs/index.html") as f:
+                self.assertIn('width="30"', f.read())
+
+    def test_failed_build_keeps_changes(self):
+        with tempfile.TemporaryDirectory() as d, working_directory(d):
+            write_file("./template.html", "{{ Title }}|{{ Content }}")
+            write_bytes("./static/a.png", png(10, 20))
+            write_file("./content/index.md", "# home\n\n![a](/a.png)")
+            with redirect_stdout(StringIO()):
+                main.build("/", image_attrs=True)
+
+            write_bytes("./static/a.png", png(30, 20))
+            # rendered first, fails the build before index.md is rendered again
+            write_file("./content/a-broken/index.md", "no title")
+            with redirect_stdout(StringIO()), self.assertRaisesRegex(Exception, "no title"):
+                main.build("/", incremental=True, image_attrs=True)
+            os.remove("./content/a-broken/index.md")
+            with redirect_stdout(StringIO()):
+                main.build("/", incremental=True, image_attrs=True)
+            with open("./docs/index.html") as f:
+                self.assertIn('width="30"', f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+import main
+from main import collect_pages, generate_pages
+from template import Template
+from testing import write_file, read_file, working_directory
+
+
+class TestCollectPages(unittest.TestCase):
+
+    def test_nested(self):
+        with tempfile.TemporaryDirectory() as d:
+            content = os.path.join(d, "content")
+            write_file(os.path.join(content, "index.md"), "# a")
+            write_file(os.path.join(content, "blog", "post", "index.md"), "# b")
+            write_file(os.path.join(content, "blog", "image.png"), "")
+            write_file(os.path.join(content, "command.md"), "# c")
+            actual = collect_pages(content, "out")
+            expected = [
+                (os.path.join(content, "blog", "post", "index.md"), os.path.join("out", "blog", "post", "index.html")),
+                (os.path.join(content, "command.md"), os.path.join("out", "command.html")),
+                (os.path.join(content, "index.md"), os.path.join("out", "index.html")),
+            ]
+            self.assertEqual(actual, expected)
+
+
+class TestGeneratePages(unittest.TestCase):
+
+    def test_parallel_matches_sequential(self):
+        with tempfile.TemporaryDirectory() as d:
+            template = os.path.join(d, "template.html")
+            write_file(template, '<title>{{ Title }}</title><a href="/x">{{ Content }}</a>')
+            for i in range(8):
+                write_file(os.path.join(d, "content", f"dir{i}", "index.md"), f"# page {i}\n\n[link](/p{i})")
+
+            outputs = {}
+            for jobs in (1, 3):
+                out = os.path.join(d, f"out{jobs}")
+                pages = collect_pages(os.path.join(d, "content"), out)
+                log = StringIO()
+                with redirect_stdout(log):
+                    generate_pages(pages, Template.load(template, "/base/"), jobs)
+                outputs[jobs] = (
+                    [read_file(dst) for _, dst in pages],
+                    log.getvalue().replace(out, "OUT"),
+                )
+
+            self.assertEqual(outputs[1], outputs[3])
+            self.assertEqual(
+                outputs[1][0][0],
+                '<title>page 0</title><a href="/base/x"><div><h1>page 0</h1><p><a href="/base/p0">link</a></p></div></a>',
+            )
+
+
+class TestBuild(unittest.TestCase):
+
+    def test_atomic_incremental(self):
+        with tempfile.TemporaryDirectory() as d, working_directory(d), redirect_stdout(StringIO()):
+            write_file("./template.html", "{{ Title }}|{{ Content }}")
+            write_file("./static/index.css", "css")
+            write_file("./content/index.md", "# home")
+            write_file("./content/post/index.md", "# post")
+            write_file("./content/gone/index.md", "# gone")
+            main.build("/", atomic=True)
+            self.assertEqual(read_file("./docs/index.html"), "home|<div><h1>home</h1></div>")
+            inode = os.stat("./docs/index.html").st_ino
+
+            write_file("./content/post/index.md", "# post 2")
+            os.remove("./content/gone/index.md")
+            manifest = main.build("/", incremental=True, atomic=True)
+
+            # unchanged outputs are carried forward, not rewritten
+            self.assertEqual(os.stat("./docs/index.html").st_ino, inode)
+            self.assertEqual(os.stat("./docs.previous/index.html").st_ino, inode)
+            self.assertEqual(read_file("./docs/post/index.html"), "post 2|<div><h1>post 2</h1></div>")
+            self.assertEqual(read_file("./docs.previous/post/index.html"), "post|<div><h1>post</h1></div>")
+            self.assertEqual(read_file("./docs/index.css"), "css")
+            self.assertFalse(os.path.exists("./docs/gone"))
+            self.assertFalse(os.path.exists("./docs.staging"))
+            self.assertEqual(manifest.pages["./content/post/index.md"]["output"], "./docs/post/index.html")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+
+from manifest import Manifest, file_hash
+
+
+class TestFileHash(unittest.TestCase):
+
+    def test_same_content_same_hash(self):
+        with tempfile.TemporaryDirectory() as d:
+            a = os.path.join(d, "a.md")
+            b = os.path.join(d, "b.md")
+            for p in (a, b):
+                with open(p, "w") as f:
+                    f.write("# title")
+            self.assertEqual(file_hash(a), file_hash(b))
+
+    def test_different_content_different_hash(self):
+        with tempfile.TemporaryDirectory() as d:
+            a = os.path.join(d, "a.md")
+            with open(a, "w") as f:
+                f.write("# title")
+            before = file_hash(a)
+            with open(a, "w") as f:
+                f.write("# title!")
+            self.assertNotEqual(before, file_hash(a))
+
+
+class TestManifest(unittest.TestCase):
+
+    def test_load_missing(self):
+        m = Manifest.load("/does/not/exist/manifest.json")
+        self.assertEqual(m.pages, {})
+        self.assertEqual(m.static, {})
+        self.assertIsNone(m.template)
+
+    def test_save_load_roundtrip(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "cache", "manifest.json")
+            m = Manifest("/", "abc", pages={"a.md": {"hash": "1", "output": "a.html"}})
+            m.save(path)
+            loaded = Manifest.load(path)
+            self.assertEqual(loaded.basepath, "/")
+            self.assertEqual(loaded.template, "abc")
+            self.assertEqual(loaded.pages, m.pages)
+            self.assertEqual(loaded.static, {})
+
+    def test_is_current(self):
+        with tempfile.TemporaryDirectory() as d:
+            out = os.path.join(d, "a.html")
+            m = Manifest(pages={"a.md": {"hash": "1", "output": out}})
+            # output missing
+            self.assertFalse(m.is_current("pages", "a.md", "1"))
+            with open(out, "w") as f:
+                f.write("")
+            self.assertTrue(m.is_current("pages", "a.md", "1"))
+            self.assertFalse(m.is_current("pages", "a.md", "2"))
+            self.assertFalse(m.is_current("pages", "b.md", "1"))
+
+    def test_removed(self):
+        old = Manifest(pages={
+            "a.md": {"hash": "1", "output": "a.html"},
+            "b.md": {"hash": "2", "output": "b.html"},
+        })
+        new = Manifest(pages={"a.md": {"hash": "1", "output": "a.html"}})
+        self.assertEqual(old.removed("pages", new), ["b.html"])
+        self.assertEqual(old.removed("static", new), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
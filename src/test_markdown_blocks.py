@@ -1,6 +1,9 @@
 import unittest
 
-from markdown_blocks import BlockType, markdown_to_blocks, block_to_blocktype, markdown_to_html_node
+import io
+
+from block_cache import BlockCache
+from markdown_blocks import BlockType, markdown_to_blocks, block_to_blocktype, markdown_to_html_node, iter_blocks, iter_typed_blocks, markdown_to_html_chunks
 
 
 class TestMarkdownToBlock(unittest.TestCase):
@@ -23,6 +26,30 @@ This is the same paragraph on a new line
         ]
         self.assertEqual(actual,expected)
 
+    def test_extra_blank_lines(self):
+        md = "first\n\n\n\nsecond\n  \nstill second\n\n\n"
+        self.assertEqual(markdown_to_blocks(md), ["first", "second\n  \nstill second"])
+
+
+class TestIterBlocks(unittest.TestCase):
+
+    def test_reads_lazily(self):
+        consumed = []
+        def lines():
+            for line in ["# title\n", "\n", "- a\n", "- b\n", "\n", "never read\n"]:
+                consumed.append(line)
+                yield line
+
+        blocks = iter_typed_blocks(lines())
+        self.assertEqual(next(blocks), ("# title", BlockType.HEADING))
+        self.assertEqual(len(consumed), 2)
+        self.assertEqual(next(blocks), ("- a\n- b", BlockType.UNORDERED_LIST))
+        self.assertEqual(len(consumed), 5)
+
+    def test_file_object(self):
+        f = io.StringIO("para one\nline two\n\n> quote")
+        self.assertEqual(list(iter_blocks(f)), ["para one\nline two", "> quote"])
+
 
 class TestBlockToBlockType(unittest.TestCase):
 
@@ -234,6 +261,40 @@ the **same** even with inline stuff
         )
 
 
+    def test_chunks_match_node(self):
+        md = """
+# heading
+
+para with [link](/x) and **bold**
+
+- one
+- two
+
+```
+code
+```
+"""
+        chunks = list(markdown_to_html_chunks(io.StringIO(md)))
+        self.assertEqual(len(chunks), 6)
+        self.assertEqual("".join(chunks), markdown_to_html_node(md).to_html())
+
+    def test_chunks_with_block_cache(self):
+        md = "# title\n\nsame **paragraph**\n\nother\n\nsame **paragraph**\n"
+        cache = BlockCache()
+        first = "".join(markdown_to_html_chunks(io.StringIO(md), cache=cache))
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+        second = "".join(markdown_to_html_chunks(io.StringIO(md), cache=cache))
+        self.assertEqual((cache.hits, cache.misses), (5, 3))
+        self.assertEqual(first, second)
+        self.assertEqual(first, markdown_to_html_node(md).to_html())
+
+    def test_code_language(self):
+        md = "```python\nx = None\n```\n\n```rust\nfn main() {}\n```\n\n```\nplain\n```"
+        self.assertEqual(markdown_to_html_node(md).to_html(),
+                         '<div><pre class="highlight"><code class="language-python">\nx = <span class="kc">None</span>\n</code></pre>'
+                         '<pre><code class="language-rust">\nfn main() {}\n</code></pre>'
+                         '<pre><code>\nplain\n</code></pre></div>')
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,137 @@
+import os
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+from contextlib import redirect_stdout
+from io import StringIO
+
+import main
+from main import generate_page
+from metadata import (MetadataIndex, parse_front_matter, read_page_header, read_metadata, page_url,
+                      write_sitemap, write_feed)
+from template import Template
+from testing import write_file, read_file, working_directory
+
+
+POST = """---
+title: "Rings: a history"
+date: 2024-05-01
+tags: [elves, rings]
+# a comment
+---
+# Heading
+
+Text
+"""
+
+
+class TestFrontMatter(unittest.TestCase):
+
+    def test_parse(self):
+        f = StringIO(POST)
+        meta = parse_front_matter(f)
+        self.assertEqual(meta, {"title": "Rings: a history", "date": "2024-05-01", "tags": ["elves", "rings"]})
+        self.assertEqual(f.readline(), "# Heading\n")
+
+    def test_none(self):
+        f = StringIO("# Heading\n\nText")
+        self.assertEqual(parse_front_matter(f), {})
+        self.assertEqual(f.readline(), "# Heading\n")
+
+    def test_not_closed(self):
+        with self.assertRaisesRegex(Exception, "not closed"):
+            parse_front_matter(StringIO("---\ntitle: a\n# Heading\n"))
+
+    def test_header_title_from_heading(self):
+        f = StringIO("---\ndate: 2024-01-01\n---\nintro\n\n# Heading\n\nText")
+        meta = read_page_header(f)
+        self.assertEqual(meta, {"date": "2024-01-01", "title": "Heading"})
+        self.assertEqual(f.read(), "intro\n\n# Heading\n\nText")
+
+    def test_invalid_date(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "post.md")
+            write_file(path, "---\ndate: yesterday\n---\n# a")
+            with self.assertRaisesRegex(Exception, "invalid date"):
+                read_metadata(path)
+
+    def test_page_rendered_without_front_matter(self):
+        with tempfile.TemporaryDirectory() as d:
+            src = os.path.join(d, "post.md")
+            dst = os.path.join(d, "post.html")
+            write_file(src, POST)
+            with redirect_stdout(StringIO()):
+                generate_page(src, Template("{{ Title }}|{{ Content }}"), dst)
+            self.assertEqual(read_file(dst), "Rings: a history|<div><h1>Heading</h1><p>Text</p></div>")
+
+
+class TestMetadataIndex(unittest.TestCase):
+
+    def test_page_url(self):
+        self.assertEqual(page_url("docs/index.html", "docs", "/base/"), "/base/")
+        self.assertEqual(page_url("docs/blog/tom/index.html", "docs", "/"), "/blog/tom/")
+        self.assertEqual(page_url("docs/about.html", "docs", "/"), "/about.html")
+
+    def test_incremental(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "cache", "metadata.sqlite")
+            index = MetadataIndex(path)
+            index.update("a.md", "/a/", "h1", {"title": "A", "date": "2024-01-01", "tags": ["x"]})
+            index.update("b.md", "/b/", "h2", {"title": "B", "date": "2024-02-01", "tags": ["x", "y"]})
+            index.update("c.md", "/", "h3", {"title": "Home", "tags": []})
+            index.close()
+
+            index = MetadataIndex(path)
+            self.assertEqual(len(index), 3)
+            self.assertTrue(index.is_current("a.md", "h1", "/a/"))
+            self.assertFalse(index.is_current("a.md", "h2", "/a/"))
+            self.assertFalse(index.is_current("a.md", "h1", "/base/a/"))
+            self.assertEqual([p["title"] for p in index.pages()], ["Home", "A", "B"])
+            self.assertEqual([p["title"] for p in index.pages(limit=10)], ["B", "A"])
+            self.assertEqual([p["title"] for p in index.pages(tag="y")], ["B"])
+
+            index.update("b.md", "/b/", "h4", {"title": "B2", "date": "2024-02-01", "tags": ["z"]})
+            self.assertEqual(index.pages(tag="y"), [])
+            self.assertEqual(index.remove_missing({"b.md", "c.md"}), 1)
+            self.assertEqual(index.pages(tag="x"), [])
+            self.assertEqual(index.title_of("/"), "Home")
+            index.close()
+
+    def test_sitemap_and_feed(self):
+        with tempfile.TemporaryDirectory() as d:
+            index = MetadataIndex()
+            index.update("index.md", "/base/", "h0", {"title": "Home & co", "tags": []})
+            index.update("a.md", "/base/a/", "h1", {"title": "A", "date": "2024-01-01", "tags": ["x"]})
+            index.update("b.md", "/base/b/", "h2", {"title": "B", "date": "2024-02-01", "tags": [],
+                                                    "summary": "<b>"})
+            write_sitemap(index, os.path.join(d, "sitemap.xml"), "https://example.com/")
+            write_feed(index, os.path.join(d, "feed.xml"), "https://example.com/", "/base/")
+
+            ns = {"s": "http://www.sitemaps.org/schemas/sitemap/0.9", "a": "http://www.w3.org/2005/Atom"}
+            sitemap = ET.parse(os.path.join(d, "sitemap.xml")).getroot()
+            self.assertEqual([e.text for e in sitemap.findall("s:url/s:loc", ns)],
+                             ["https://example.com/base/", "https://example.com/base/a/", "https://example.com/base/b/"])
+            self.assertEqual([e.text for e in sitemap.findall("s:url/s:lastmod", ns)], ["2024-01-01", "2024-02-01"])
+
+            feed = ET.parse(os.path.join(d, "feed.xml")).getroot()
+            self.assertEqual(feed.find("a:title", ns).text, "Home & co")
+            self.assertEqual(feed.find("a:updated", ns).text, "2024-02-01T00:00:00Z")
+            self.assertEqual([e.text for e in feed.findall("a:entry/a:id", ns)],
+                             ["https://example.com/base/b/", "https://example.com/base/a/"])
+            self.assertEqual(feed.find("a:entry/a:summary", ns).text, "<b>")
+            self.assertEqual(feed.findall("a:entry/a:category", ns)[0].get("term"), "x")
+
+
+    def test_sitemap_and_feed_removed_without_site_url(self):
+        with tempfile.TemporaryDirectory() as d, working_directory(d), redirect_stdout(StringIO()):
+            write_file("./template.html", "{{ Content }}")
+            write_file("./content/index.md", "# Home")
+            os.makedirs("./static")
+            main.build("/", site_url="https://example.com")
+            self.assertTrue(os.path.exists("./docs/sitemap.xml"))
+            main.build("/", incremental=True)
+            self.assertEqual(os.listdir("./docs"), ["index.html"])
+
+
+if __name__ == "__main__":
+    unittest.main()
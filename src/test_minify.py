@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+from context import RenderContext
+from main import collect_pages, generate_pages
+from minify import Minifier, MinifyStats
+from template import Template
+from testing import write_file, read_file
+
+
+def minify(*chunks: str, stats: MinifyStats =None) -> str:
+    out = StringIO()
+    minifier = Minifier(out, stats)
+    for chunk in chunks:
+        minifier.write(chunk)
+    minifier.close()
+    return out.getvalue()
+
+class TestMinifier(unittest.TestCase):
+
+    def test_whitespace(self):
+        self.assertEqual(minify("<p>a   b\n\n  c</p>"), "<p>a b\nc</p>")
+        self.assertEqual(minify("<span>a</span> <b>b</b>"), "<span>a</span> <b>b</b>")
+        self.assertEqual(minify("a  b"), "a  b")
+
+    def test_whitespace_around_blocks(self):
+        html = "<!doctype html>\n<html>\n  <head>\n    <title>t</title>\n  </head>\n  <body>\n    <p> a </p>\n  </body>\n</html>\n"
+        self.assertEqual(minify(html), "<!doctype html><html><head><title>t</title></head><body><p> a </p></body></html>")
+
+    def test_raw_elements(self):
+        html = "<div>\n<pre>  a\n\n  b  </pre>\n<code>x  y</code> <script>if (a  <  b) {}</script><textarea>  </textarea></div>"
+        self.assertEqual(minify(html), "<div><pre>  a\n\n  b  </pre>\n<code>x  y</code> <script>if (a  <  b) {}</script><textarea>  </textarea></div>")
+
+    def test_comments(self):
+        self.assertEqual(minify("<p>a<!-- note -->b</p>"), "<p>ab</p>")
+        self.assertEqual(minify("<!--[if IE]><p>old</p><![endif]-->"), "<!--[if IE]><p>old</p><![endif]-->")
+        self.assertEqual(minify("<pre><!-- kept --></pre>"), "<pre><!-- kept --></pre>")
+
+    def test_chunk_boundaries(self):
+        html = "<div>\n  <p>a  b<!-- c --></p>\n<pre>  x\n  y  </pre><code>  z  </code>\n</div>"
+        expected = minify(html)
+        for size in (1, 2, 3, 5, 7):
+            chunks = [html[i:i + size] for i in range(0, len(html), size)]
+            self.assertEqual(minify(*chunks), expected, size)
+
+    def test_text_before_inline_tag(self):
+        # the space after text ending a chunk is kept whatever tag came before the text
+        for html in ("<p>hello <b>world</b></p>", "<h1>Hello <small>my site</small></h1>"):
+            expected = minify(html)
+            self.assertIn("o <", expected)
+            for i in range(1, len(html)):
+                self.assertEqual(minify(html[:i], html[i:]), expected, i)
+        self.assertEqual(minify("<p>", "hello", " <b>world</b></p>"), "<p>hello <b>world</b></p>")
+
+    def test_stats(self):
+        stats = MinifyStats()
+        minify("<p>a   b</p>", stats=stats)
+        minify("<p>a<!--x-->b</p>\n", stats=stats)
+        self.assertEqual((stats.pages, stats.bytes_in, stats.saved), (2, 30, 11))
+        self.assertEqual(stats.take(), [2, 30, 11])
+        self.assertEqual(stats.pages, 0)
+        stats.add(1, 200, 50)
+        self.assertEqual(stats.summary(), "minify: 1 pages, 50 of 200 bytes saved (25.0%)")
+
+
+class TestMinifyBuild(unittest.TestCase):
+
+    def test_jobs_match(self):
+        with tempfile.TemporaryDirectory() as d:
+            template = Template("<html>\n  <body>\n    {{ Content }}\n  </body>\n</html>\n<!-- {{ Title }} -->", "/", "template.html")
+            for i in range(6):
+                write_file(os.path.join(d, "content", f"p{i}.md"), f"# page {i}\n\ntext   with  spaces\n\n```\na   b\n```")
+            results = []
+            for jobs in (1, 2):
+                pages = collect_pages(os.path.join(d, "content"), os.path.join(d, f"out{jobs}"))
+                ctx = RenderContext(minify=MinifyStats())
+                with redirect_stdout(StringIO()):
+                    generate_pages(pages, template, jobs, ctx)
+                self.assertEqual(ctx.minify.pages, 6)
+                results.append(([read_file(dst) for _, dst in pages], ctx.minify.saved))
+            self.assertEqual(results[0], results[1])
+            self.assertIn("<pre><code>\na   b\n</code></pre>", results[0][0][0])
+            self.assertNotIn("<!--", results[0][0][0])
+
+
+if __name__ == "__main__":
+    unittest.main()
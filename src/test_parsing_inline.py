@@ -267,6 +267,31 @@ class TestParseText(unittest.TestCase):
         ]
         self.assertEqual(expected, actual)
 
+    def test_plain(self):
+        self.assertEqual([TextNode("just text", TextType.TEXT)], text_to_text_nodes("just text"))
+        self.assertEqual([], text_to_text_nodes(""))
+
+    def test_delimiters_inside_code(self):
+        actual = text_to_text_nodes("run `a_b **c**` now")
+        expected = [
+            TextNode("run ", TextType.TEXT),
+            TextNode("a_b **c**", TextType.CODE),
+            TextNode(" now", TextType.TEXT),
+        ]
+        self.assertEqual(expected, actual)
+
+    def test_brackets_without_link(self):
+        actual = text_to_text_nodes("[not a link] and ![no image] and [a](b)")
+        expected = [
+            TextNode("[not a link] and ![no image] and ", TextType.TEXT),
+            TextNode("a", TextType.LINK, "b"),
+        ]
+        self.assertEqual(expected, actual)
+
+    def test_no_closing_delimiter(self):
+        with self.assertRaises(Exception):
+            text_to_text_nodes("**bold** and **unclosed")
+
 
 if __name__ == "__main__":
     unittest.main()
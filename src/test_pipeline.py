@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+from main import collect_pages, generate_pages
+from pipeline import generate_pages_pipelined
+from template import Template
+from testing import write_file, read_file
+
+
+class TestPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        d = self.dir.name
+        self.template = Template('<title>{{ Title }}</title><a href="/x">{{ Content }}</a>', "/base/", "template.html")
+        for i in range(20):
+            write_file(os.path.join(d, "content", f"dir{i % 3}", f"p{i}.md"),
+                       f"# page {i}\n\n[link](/p{i})\n\n```\ncode\n```\n\n- a\n- b\r\n")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def render(self, out: str, pipeline: bool, depth: int =2) -> tuple[list[str], str]:
+        pages = collect_pages(os.path.join(self.dir.name, "content"), out)
+        log = StringIO()
+        with redirect_stdout(log):
+            if pipeline:
+                stats = generate_pages_pipelined(pages, self.template, depth=depth)
+                self.assertEqual(stats.pages, len(pages))
+            else:
+                generate_pages(pages, self.template)
+        lines = [l for l in log.getvalue().replace(out, "OUT").splitlines() if not l.startswith("pipeline:")]
+        return [read_file(dst) for _, dst in pages], lines
+
+    def test_matches_sequential(self):
+        expected = self.render(os.path.join(self.dir.name, "seq"), False)
+        for depth in (1, 2, 16):
+            self.assertEqual(self.render(os.path.join(self.dir.name, f"pipe{depth}"), True, depth), expected)
+
+    def test_stats(self):
+        pages = collect_pages(os.path.join(self.dir.name, "content"), os.path.join(self.dir.name, "out"))
+        with redirect_stdout(StringIO()):
+            stats = generate_pages_pipelined(pages, self.template, depth=3)
+        self.assertEqual(stats.read_queue.puts, len(pages))
+        self.assertLessEqual(stats.read_queue.depth_max, 3)
+        self.assertLessEqual(stats.write_queue.depth_max, 3)
+        self.assertEqual(set(stats.utilisation()), {"read", "render", "write"})
+        self.assertEqual(stats.to_dict()["queues"]["write"]["maxsize"], 3)
+        self.assertTrue(stats.summary().startswith(f"pipeline: {len(pages)} pages"))
+
+    def test_render_error(self):
+        write_file(os.path.join(self.dir.name, "content", "dir1", "p3.md"), "no title")
+        pages = collect_pages(os.path.join(self.dir.name, "content"), os.path.join(self.dir.name, "out"))
+        with redirect_stdout(StringIO()):
+            with self.assertRaisesRegex(Exception, "no title found"):
+                generate_pages_pipelined(pages, self.template, depth=1)
+
+    def test_read_error(self):
+        pages = [(os.path.join(self.dir.name, "missing.md"), os.path.join(self.dir.name, "out", "missing.html"))]
+        with redirect_stdout(StringIO()):
+            with self.assertRaises(FileNotFoundError):
+                generate_pages_pipelined(pages, self.template)
+
+
+if __name__ == "__main__":
+    unittest.main()
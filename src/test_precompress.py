@@ -0,0 +1,92 @@
+import io
+import os
+import gzip
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from precompress import precompress_tree, load_encodings, etag, drop_precompressed
+from testing import write_bytes, read_bytes
+
+
+def precompress(root: str, min_size: int =100, previous_root: str =None):
+    with redirect_stdout(io.StringIO()):
+        return precompress_tree(root, min_size, previous_root)
+
+
+class TestPrecompress(unittest.TestCase):
+
+    def test_variants_and_encodings(self):
+        with tempfile.TemporaryDirectory() as d:
+            page = b"<p>hello</p>" * 100
+            write_bytes(os.path.join(d, "blog", "index.html"), page)
+            write_bytes(os.path.join(d, "small.css"), b"p{}")
+            write_bytes(os.path.join(d, "image.png"), os.urandom(2000))
+            stats = precompress(d)
+
+            self.assertEqual(stats.compressed, 1)
+            self.assertEqual(gzip.decompress(read_bytes(os.path.join(d, "blog", "index.html.gz"))), page)
+            self.assertFalse(os.path.exists(os.path.join(d, "small.css.gz")))
+            self.assertFalse(os.path.exists(os.path.join(d, "image.png.gz")))
+
+            entry = load_encodings(d)["/blog/index.html"]
+            self.assertEqual(entry["etag"], etag(page))
+            self.assertEqual(entry["size"], len(page))
+            self.assertEqual(entry["encodings"]["gzip"]["path"], "blog/index.html.gz")
+            self.assertLess(entry["encodings"]["gzip"]["size"], len(page))
+
+    def test_deterministic(self):
+        with tempfile.TemporaryDirectory() as d:
+            write_bytes(os.path.join(d, "a.html"), b"<p>a</p>" * 100)
+            write_bytes(os.path.join(d, "b.html"), b"<p>a</p>" * 100)
+            precompress(d)
+            self.assertEqual(read_bytes(os.path.join(d, "a.html.gz")), read_bytes(os.path.join(d, "b.html.gz")))
+
+    def test_only_changed_recompressed(self):
+        with tempfile.TemporaryDirectory() as d:
+            write_bytes(os.path.join(d, "a.html"), b"<p>a</p>" * 100)
+            write_bytes(os.path.join(d, "b.html"), b"<p>b</p>" * 100)
+            precompress(d)
+            inode = os.stat(os.path.join(d, "a.html.gz")).st_ino
+
+            write_bytes(os.path.join(d, "b.html"), b"<p>c</p>" * 100)
+            stats = precompress(d)
+            self.assertEqual((stats.compressed, stats.unchanged), (1, 1))
+            self.assertEqual(os.stat(os.path.join(d, "a.html.gz")).st_ino, inode)
+            self.assertEqual(gzip.decompress(read_bytes(os.path.join(d, "b.html.gz"))), b"<p>c</p>" * 100)
+
+    def test_stale_variants_removed(self):
+        with tempfile.TemporaryDirectory() as d:
+            write_bytes(os.path.join(d, "a.html"), b"<p>a</p>" * 100)
+            write_bytes(os.path.join(d, "user.gz"), b"not ours")
+            precompress(d)
+            os.remove(os.path.join(d, "a.html"))
+            stats = precompress(d)
+            self.assertEqual(stats.removed, 1)
+            self.assertFalse(os.path.exists(os.path.join(d, "a.html.gz")))
+            self.assertTrue(os.path.exists(os.path.join(d, "user.gz")))
+            self.assertEqual(load_encodings(d), {})
+
+    def test_drop_precompressed(self):
+        with tempfile.TemporaryDirectory() as d:
+            write_bytes(os.path.join(d, "a.html"), b"<p>a</p>" * 100)
+            write_bytes(os.path.join(d, "user.gz"), b"not ours")
+            precompress(d)
+            self.assertGreater(drop_precompressed(d, os.remove), 0)
+            self.assertEqual(sorted(os.listdir(d)), ["a.html", "user.gz"])
+
+    def test_previous_root(self):
+        with tempfile.TemporaryDirectory() as d:
+            live = os.path.join(d, "docs")
+            staging = os.path.join(d, "docs.staging")
+            write_bytes(os.path.join(live, "a.html"), b"<p>a</p>" * 100)
+            precompress(live)
+            write_bytes(os.path.join(staging, "a.html"), b"<p>a</p>" * 100)
+            stats = precompress(staging, previous_root=live)
+            self.assertEqual(stats.unchanged, 1)
+            self.assertEqual(os.stat(os.path.join(staging, "a.html.gz")).st_ino,
+                             os.stat(os.path.join(live, "a.html.gz")).st_ino)
+
+
+if __name__ == "__main__":
+    unittest.main()
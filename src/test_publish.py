@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+from publish import staging_path, previous_path, swap_in, link_forward, rebase, replace_if_changed
+from testing import write_file, read_file
+
+
+class TestPaths(unittest.TestCase):
+
+    def test_next_to_output(self):
+        self.assertEqual(staging_path("./docs/"), "./docs.staging/")
+        self.assertEqual(previous_path("./docs"), "./docs.previous/")
+
+    def test_rebase(self):
+        self.assertEqual(rebase("./docs.staging/blog/a.html", "./docs.staging/", "./docs/"), "./docs/blog/a.html")
+
+
+class TestSwapIn(unittest.TestCase):
+
+    def test_first_build(self):
+        with tempfile.TemporaryDirectory() as d:
+            out = os.path.join(d, "docs/")
+            write_file(os.path.join(staging_path(out), "index.html"), "new")
+            swap_in(staging_path(out), out)
+            self.assertEqual(read_file(os.path.join(out, "index.html")), "new")
+            self.assertFalse(os.path.exists(staging_path(out)))
+
+    def test_keeps_previous(self):
+        with tempfile.TemporaryDirectory() as d, redirect_stdout(StringIO()):
+            out = os.path.join(d, "docs/")
+            write_file(os.path.join(out, "index.html"), "old")
+            write_file(os.path.join(previous_path(out), "index.html"), "older")
+            write_file(os.path.join(staging_path(out), "index.html"), "new")
+            swap_in(staging_path(out), out)
+            self.assertEqual(read_file(os.path.join(out, "index.html")), "new")
+            self.assertEqual(read_file(os.path.join(previous_path(out), "index.html")), "old")
+            self.assertFalse(os.path.exists(staging_path(out)))
+
+
+class TestLinkForward(unittest.TestCase):
+
+    def test_link(self):
+        with tempfile.TemporaryDirectory() as d:
+            live = os.path.join(d, "docs", "a.html")
+            staged = os.path.join(d, "staging", "sub", "a.html")
+            write_file(live, "a")
+            self.assertTrue(link_forward(live, staged))
+            self.assertEqual(os.stat(live).st_ino, os.stat(staged).st_ino)
+            self.assertFalse(link_forward(os.path.join(d, "missing"), staged))
+
+
+class TestReplaceIfChanged(unittest.TestCase):
+
+    def test_identical_left_alone(self):
+        with tempfile.TemporaryDirectory() as d:
+            dst = os.path.join(d, "a.html")
+            write_file(dst, "same")
+            os.utime(dst, ns=(0, 1000))
+            write_file(dst + ".tmp", "same")
+            self.assertFalse(replace_if_changed(dst + ".tmp", dst))
+            self.assertEqual(os.stat(dst).st_mtime_ns, 1000)
+            self.assertFalse(os.path.exists(dst + ".tmp"))
+
+    def test_changed_replaced(self):
+        with tempfile.TemporaryDirectory() as d:
+            dst = os.path.join(d, "a.html")
+            write_file(dst + ".tmp", "new")
+            self.assertTrue(replace_if_changed(dst + ".tmp", dst))
+            write_file(dst + ".tmp", "newer")
+            self.assertTrue(replace_if_changed(dst + ".tmp", dst))
+            self.assertEqual(read_file(dst), "newer")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+import main
+from context import RenderContext
+from search import SearchIndex, collect_terms, shard_name, encode_postings, decode_postings
+from testing import write_file, read_json, working_directory
+
+
+class TestTerms(unittest.TestCase):
+
+    def test_collect_terms(self):
+        terms = {}
+        chunks = ["<div>", "<h1>Tolkien</h1>", '<p>The <a href="/tolkien">Tolkien</a> &amp; Über-fans x</p>', "</div>"]
+        self.assertEqual(list(collect_terms(chunks, terms)), chunks)
+        self.assertEqual(terms, {"tolkien": 4, "über": 1, "fans": 1})
+
+    def test_shard_name(self):
+        self.assertEqual(shard_name("tolkien"), "to")
+        self.assertEqual(shard_name("x"), "x")
+        self.assertEqual(shard_name("über"), "_c3bc62")
+
+    def test_postings(self):
+        postings = {7: 1, 2: 3, 1000: 2}
+        self.assertEqual(encode_postings(postings), [2, 3, 5, 1, 993, 2])
+        self.assertEqual(decode_postings(encode_postings(postings)), postings)
+
+
+class TestSearchIndex(unittest.TestCase):
+
+    def test_incremental(self):
+        with tempfile.TemporaryDirectory() as d:
+            cache, out = os.path.join(d, "cache"), os.path.join(d, "out")
+            index = SearchIndex(cache)
+            index.update("a.md", "/a/", "A", {"ring": 2, "tom": 1})
+            index.update("b.md", "/b/", "B", {"ring": 1, "zebra": 1})
+            index.save()
+            self.assertEqual(index.publish(out), 5)
+            self.assertEqual(read_json(os.path.join(out, "terms", "ri.json")), {"ring": [0, 2, 1, 1]})
+            self.assertEqual(read_json(os.path.join(out, "pages", "0.json")), {"0": ["/a/", "A"], "1": ["/b/", "B"]})
+            self.assertEqual(read_json(os.path.join(out, "index.json"))["shards"], ["ri", "to", "ze"])
+
+            index = SearchIndex(cache)
+            self.assertIn("a.md", index)
+            index.update("a.md", "/a/", "A", {"ring": 5})
+            index.remove_missing({"a.md"})
+            index.save()
+            # "ri" and "to" for a.md, "ze" emptied with b.md
+            self.assertEqual(index.written, 3)
+            self.assertEqual(index.publish(out), 3)
+            self.assertEqual(read_json(os.path.join(out, "terms", "ri.json")), {"ring": [0, 5]})
+            self.assertEqual(read_json(os.path.join(out, "index.json"))["shards"], ["ri"])
+            self.assertEqual(sorted(os.listdir(os.path.join(out, "terms"))), ["ri.json"])
+
+            # same words again: nothing to write or link
+            index.update("a.md", "/a/", "A", {"ring": 5})
+            index.save()
+            self.assertEqual(index.written, 3)
+            self.assertEqual(index.publish(out), 0)
+
+
+class TestSearchBuild(unittest.TestCase):
+
+    def build(self, incremental: bool, search: bool =True) -> str:
+        log = StringIO()
+        with redirect_stdout(log):
+            main.build("/", incremental=incremental, ctx=RenderContext(search=search), jobs=2)
+        return log.getvalue()
+
+    def test_build(self):
+        with tempfile.TemporaryDirectory() as d, working_directory(d):
+            write_file("./template.html", "{{ Title }}|{{ Content }}")
+            os.makedirs("./static")
+            write_file("./content/index.md", "# Home\n\nwelcome hobbits")
+            write_file("./content/blog/index.md", "# Blog\n\nhobbits again")
+            self.build(False)
+            pages = read_json("./docs/search/pages/0.json")
+            self.assertEqual(sorted(pages.values()), [["/", "Home"], ["/blog/", "Blog"]])
+            self.assertEqual(len(read_json("./docs/search/terms/ho.json")["hobbits"]), 4)
+
+            write_file("./content/blog/index.md", "# Blog\n\nelves now")
+            log = self.build(True)
+            self.assertEqual(log.count("Generating"), 1)
+            self.assertEqual(len(read_json("./docs/search/terms/ho.json")["hobbits"]), 2)
+            self.assertIn("elves", read_json("./docs/search/terms/el.json"))
+
+            self.build(True, search=False)
+            self.assertFalse(os.path.exists("./docs/search"))
+            # switched on again, pages without terms are rendered for them
+            log = self.build(True)
+            self.assertEqual(log.count("Generating"), 2)
+            self.assertTrue(os.path.exists("./docs/search/terms/el.json"))
+
+
+if __name__ == "__main__":
+    unittest.main()
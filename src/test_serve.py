@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+import main
+from serve import Watcher, scan_tree, diff_snapshots
+from testing import write_file, read_file, working_directory
+
+
+class TestSnapshots(unittest.TestCase):
+
+    def test_diff(self):
+        old = {"a": (1, 1), "b": (1, 1), "c": (1, 1)}
+        new = {"a": (1, 1), "b": (2, 1), "d": (1, 1)}
+        changed, removed = diff_snapshots(old, new)
+        self.assertEqual(sorted(changed), ["b", "d"])
+        self.assertEqual(removed, ["c"])
+
+    def test_scan_tree(self):
+        with tempfile.TemporaryDirectory() as d:
+            write_file(os.path.join(d, "x", "y.md"), "abc")
+            snapshot = scan_tree(d)
+            self.assertEqual(list(snapshot), [os.path.join(d, "x", "y.md")])
+            self.assertEqual(snapshot[os.path.join(d, "x", "y.md")][1], 3)
+        self.assertEqual(scan_tree("/does/not/exist"), {})
+
+
+class TestWatcher(unittest.TestCase):
+
+    def test_targeted_rebuilds(self):
+        with tempfile.TemporaryDirectory() as d, working_directory(d), redirect_stdout(StringIO()):
+            write_file("template.html", "<title>{{ Title }}</title>{{ Content }}")
+            write_file("static/index.css", "a")
+            write_file("content/index.md", "# home")
+            write_file("content/blog/post/index.md", "# post")
+            watcher = Watcher("/", main.build("/"))
+            self.assertEqual(watcher.poll(), 0)
+
+            write_file("content/blog/post/index.md", "# post edited")
+            write_file("content/new/index.md", "# new")
+            os.remove("static/index.css")
+            self.assertEqual(watcher.poll(), 3)
+            self.assertEqual(read_file("docs/blog/post/index.html"), "<title>post edited</title><div><h1>post edited</h1></div>")
+            self.assertEqual(read_file("docs/new/index.html"), "<title>new</title><div><h1>new</h1></div>")
+            self.assertFalse(os.path.exists("docs/index.css"))
+
+            write_file("template.html", "<h1>{{ Title }}</h1>")
+            self.assertEqual(watcher.poll(), 3)
+            self.assertEqual(read_file("docs/index.html"), "<h1>home</h1>")
+
+            os.remove("content/new/index.md")
+            self.assertEqual(watcher.poll(), 1)
+            self.assertFalse(os.path.exists("docs/new"))
+            # the manifest on disk follows, so a later --incremental build has nothing to do
+            self.assertEqual(set(main.Manifest.load(main.dir_path_manifest).pages),
+                             {"./content/index.md", "./content/blog/post/index.md"})
+
+
+    def test_failed_page_retried(self):
+        with tempfile.TemporaryDirectory() as d, working_directory(d), redirect_stdout(StringIO()):
+            write_file("template.html", "{{ Content }}")
+            os.makedirs("static")
+            write_file("content/index.md", "# home")
+            write_file("content/blog/post/index.md", "# post")
+            watcher = Watcher("/", main.build("/"))
+
+            # a broken page does not keep the other change of the same poll from its output
+            write_file("content/blog/post/index.md", "# post\n\n_unclosed")
+            write_file("content/index.md", "# home edited")
+            with self.assertRaisesRegex(Exception, "blog/post/index.md"):
+                watcher.poll()
+            self.assertIn("home edited", read_file("docs/index.html"))
+            with self.assertRaisesRegex(Exception, "blog/post/index.md"):
+                watcher.poll()
+
+            # nor does it stop the template reaching the other pages
+            write_file("template.html", "<main>{{ Content }}</main>")
+            with self.assertRaisesRegex(Exception, "1 input\\(s\\) failed, 1 output\\(s\\) updated"):
+                watcher.poll()
+            self.assertTrue(read_file("docs/index.html").startswith("<main>"))
+            self.assertNotEqual(watcher.manifest.template, main.file_hash("template.html"))
+
+            write_file("content/blog/post/index.md", "# post\n\n_fixed_")
+            self.assertEqual(watcher.poll(), 1)
+            self.assertEqual(read_file("docs/blog/post/index.html"), "<main><div><h1>post</h1><p><i>fixed</i></p></div></main>")
+            self.assertEqual(watcher.manifest.template, main.file_hash("template.html"))
+            self.assertEqual(watcher.poll(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
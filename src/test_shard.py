@@ -0,0 +1,119 @@
+import os
+import argparse
+import filecmp
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+import main
+from manifest import Manifest
+from shard import parse_shard, page_shard, shard_name, shard_path, merge_shards
+from changes import walk_files
+from testing import write_file, working_directory
+
+
+def tree(root: str) -> dict[str, bytes]:
+    result = {}
+    for path in walk_files(root):
+        with open(path, "rb") as f:
+            result[os.path.relpath(path, root)] = f.read()
+    return result
+
+
+class TestPartition(unittest.TestCase):
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("2/4"), (2, 4))
+        for text in ("0/4", "5/4", "2", "a/b", "1/0"):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                parse_shard(text)
+
+    def test_page_shard(self):
+        paths = [f"blog/post-{i}/index.md" for i in range(200)]
+        shards = [page_shard(p, 4) for p in paths]
+        self.assertEqual(shards, [page_shard(p, 4) for p in paths])
+        self.assertEqual(set(shards), {1, 2, 3, 4})
+        self.assertTrue(all(shards.count(i) > 25 for i in range(1, 5)))
+        self.assertEqual({page_shard(p, 1) for p in paths}, {1})
+
+    def test_shard_path(self):
+        self.assertEqual(shard_path("./docs/", 1, 4), "./docs.shard-1-of-4/")
+
+
+class TestShardedBuild(unittest.TestCase):
+
+    def tearDown(self):
+        main.set_output_paths("./docs/", "./.cache/")
+
+    def build(self, shard: tuple[int, int] =None):
+        if shard != None:
+            main.set_output_paths(shard_path("./docs/", *shard), os.path.join("./.cache/", shard_name(*shard)))
+        else:
+            main.set_output_paths("./docs/", "./.cache/")
+        with redirect_stdout(StringIO()):
+            main.build("/", incremental=True, site_url="https://example.com", shard=shard)
+
+    def merge(self, count: int) -> Manifest:
+        pages = {src for src, _ in main.collect_pages("./content/", "./docs/")}
+        with redirect_stdout(StringIO()):
+            return merge_shards(count, "./content/", pages, "./docs/", "./.cache/")
+
+    def test_merge_equals_full_build(self):
+        with tempfile.TemporaryDirectory() as d, working_directory(d):
+            write_file("./template.html", "{{ Title }}|{{ Content }}")
+            write_file("./static/index.css", "body {}")
+            for i in range(12):
+                write_file(f"./content/post-{i}/index.md", f"# Post {i}\n\ntext {i}")
+            self.build()
+            expected = tree("./docs")
+
+            for i in (1, 2, 3):
+                self.build((i, 3))
+            self.assertLess(len(tree("./docs.shard-1-of-3")), len(expected))
+            merged = self.merge(3)
+            self.assertEqual(tree("./docs"), expected)
+            self.assertEqual(len(merged.pages), 12)
+            self.assertTrue(all(e["output"].startswith("./docs/") for e in merged.pages.values()))
+
+            # a page gone from its shard's output
+            src = "./content/post-0/index.md"
+            owner = page_shard(os.path.relpath(src, "./content/"), 3)
+            os.remove(os.path.join(shard_path("./docs/", owner, 3), "post-0", "index.html"))
+            with self.assertRaisesRegex(Exception, "post-0/index.html' is missing"):
+                self.merge(3)
+            self.assertEqual(tree("./docs"), expected)
+
+            # a page edited since its shard was built
+            self.build((owner, 3))
+            write_file(src, "# Post 0\n\nedited")
+            with self.assertRaisesRegex(Exception, f"post-0/index.md' changed since shard {owner}/3"):
+                self.merge(3)
+            self.build((owner, 3))
+            self.assertEqual(len(self.merge(3).pages), 12)
+
+            # a page added since the shards were built
+            write_file("./content/new/index.md", "# New")
+            with self.assertRaisesRegex(Exception, "new/index.md' was not rendered by any shard"):
+                self.merge(3)
+
+            os.remove("./.cache/shard-3-of-3/manifest.json")
+            with self.assertRaisesRegex(Exception, "shard 3/3 has not been built"):
+                self.merge(3)
+
+    def test_differing_static_files(self):
+        with tempfile.TemporaryDirectory() as d, working_directory(d):
+            write_file("./template.html", "{{ Content }}")
+            write_file("./static/index.css", "body {}")
+            write_file("./content/index.md", "# Home")
+            self.build((1, 2))
+            write_file("./static/index.css", "body { margin: 0 }")
+            self.build((2, 2))
+            with self.assertRaisesRegex(Exception, "index.css' differs"):
+                self.merge(2)
+            self.assertFalse(os.path.exists("./docs"))
+            self.assertTrue(filecmp.cmp("./static/index.css", "./docs.shard-2-of-2/index.css", shallow=False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+import main
+from context import RenderContext
+from storage import LocalStorage, MemoryStorage
+from template import Template
+from testing import write_file
+
+
+class TestMemoryStorage(unittest.TestCase):
+
+    def test_files(self):
+        storage = MemoryStorage()
+        storage.write("./a/b/c.txt", "c")
+        storage.write("a/d.txt", "d")
+        self.assertEqual(storage.read("a/b/c.txt"), "c")
+        self.assertEqual(storage.list("./a"), ["b", "d.txt"])
+        self.assertEqual(storage.list("."), ["a"])
+        self.assertTrue(storage.stat("a/b").is_dir)
+        self.assertEqual(storage.stat("a/d.txt").size, 1)
+        storage.copy("a/d.txt", "e/d.txt")
+        self.assertEqual(storage.read("e/d.txt"), "d")
+        with self.assertRaises(FileNotFoundError):
+            storage.read("a/missing.txt")
+        self.assertFalse(storage.exists("a/missing.txt"))
+
+        storage.remove_tree("a")
+        self.assertEqual(storage.list("."), ["e"])
+        self.assertFalse(storage.exists("a/b/c.txt"))
+
+    def test_list_after_changes(self):
+        storage = MemoryStorage()
+        for i in range(20):
+            storage.put(f"content/d{i % 5}/p{i}.md", b"x")
+        storage.makedirs("content/empty")
+        self.assertEqual(storage.list("content"), ["d0", "d1", "d2", "d3", "d4", "empty"])
+        self.assertEqual(storage.list("content/d1"), ["p1.md", "p11.md", "p16.md", "p6.md"])
+        storage.remove_tree("content/d1")
+        storage.put("content/d1/new.md", b"y")
+        self.assertEqual(storage.list("content/d1"), ["new.md"])
+        storage.remove_tree("content")
+        self.assertEqual(storage.list("."), [])
+
+    def test_failed_write_keeps_old_contents(self):
+        for storage in (MemoryStorage(), LocalStorage()):
+            with tempfile.TemporaryDirectory() as d:
+                path = os.path.join(d, "a.html")
+                storage.write(path, "old")
+                with self.assertRaises(ValueError):
+                    with storage.open(path, "w") as f:
+                        f.write("half")
+                        raise ValueError()
+                self.assertEqual(storage.read(path), "old")
+                self.assertFalse(storage.exists(path + ".tmp"))
+
+    def test_load(self):
+        with tempfile.TemporaryDirectory() as d:
+            write_file(os.path.join(d, "content", "index.md"), "# home")
+            with open(os.path.join(d, "logo.png"), "wb") as f:
+                f.write(b"\x89PNG")
+            storage = MemoryStorage.load(d, "site")
+            self.assertEqual(storage.read("site/content/index.md"), "# home")
+            self.assertEqual(storage.get("site/logo.png"), b"\x89PNG")
+
+
+class TestBuildInMemory(unittest.TestCase):
+
+    def test_same_output_as_disk(self):
+        pages = {"index.md": "# home\n\n[a](/blog)", "blog/index.md": "# blog\n\n```python\nx = 1\n```"}
+        template = Template("<title>{{ Title }}</title>{{ Content }}", "/base/", "template.html")
+        with tempfile.TemporaryDirectory() as d:
+            for path, text in pages.items():
+                write_file(os.path.join(d, "content", path), text)
+            write_file(os.path.join(d, "static", "index.css"), "body {}")
+            with redirect_stdout(StringIO()):
+                main.copy_tree(os.path.join(d, "static"), os.path.join(d, "docs"))
+                main.generate_pages_rec(os.path.join(d, "content"), template, os.path.join(d, "docs"))
+            expected = MemoryStorage.load(os.path.join(d, "docs"), "docs")
+
+        storage = MemoryStorage()
+        for path, text in pages.items():
+            storage.write(os.path.join("content", path), text)
+        storage.write("static/index.css", "body {}")
+        storage.write("docs/stale.html", "x")
+        log = StringIO()
+        with redirect_stdout(log):
+            main.clear_directory("docs", storage)
+            main.copy_tree("static", "docs", storage)
+            main.generate_pages_rec("content", template, "docs", RenderContext(storage=storage))
+        self.assertIn("Generating page from content/blog/index.md to docs/blog/index.html", log.getvalue())
+        docs = {p: data for p, data in storage.files.items() if p.startswith("docs")}
+        self.assertEqual(docs, expected.files)
+
+    def test_generate_pages_stays_in_process(self):
+        storage = MemoryStorage()
+        storage.write("content/a.md", "# a")
+        storage.write("content/b.md", "# b")
+        pages = main.collect_pages("content", "docs", storage)
+        with redirect_stdout(StringIO()):
+            main.generate_pages(pages, Template("{{ Title }}"), 2, RenderContext(storage=storage))
+        self.assertEqual([storage.read(dst) for _, dst in pages], ["a", "b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import io
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from sync import sync_tree, transfer, find_duplicates, scan_files
+from testing import write_bytes, read_bytes
+
+
+class TestTransfer(unittest.TestCase):
+
+    def test_copy(self):
+        with tempfile.TemporaryDirectory() as d:
+            src = os.path.join(d, "a.bin")
+            dst = os.path.join(d, "b.bin")
+            write_bytes(src, os.urandom(300000))
+            method = transfer(src, dst, os.path.getsize(src))
+            self.assertIn(method, ("reflink", "copy_file_range", "sendfile", "copy"))
+            self.assertEqual(read_bytes(src), read_bytes(dst))
+            self.assertNotEqual(os.stat(src).st_ino, os.stat(dst).st_ino)
+
+    def test_hardlink(self):
+        with tempfile.TemporaryDirectory() as d:
+            src = os.path.join(d, "a.bin")
+            dst = os.path.join(d, "b.bin")
+            write_bytes(src, b"abc")
+            write_bytes(dst, b"old")
+            self.assertEqual(transfer(src, dst, 3, link=True), "hardlink")
+            self.assertEqual(os.stat(src).st_ino, os.stat(dst).st_ino)
+
+    def test_does_not_write_through_links(self):
+        with tempfile.TemporaryDirectory() as d:
+            src = os.path.join(d, "a.bin")
+            other = os.path.join(d, "other.bin")
+            dst = os.path.join(d, "b.bin")
+            write_bytes(src, b"new")
+            write_bytes(other, b"keep me")
+            os.link(other, dst)
+            transfer(src, dst, 3)
+            self.assertEqual(read_bytes(other), b"keep me")
+            self.assertEqual(read_bytes(dst), b"new")
+
+
+class TestFindDuplicates(unittest.TestCase):
+
+    def test_same_content(self):
+        with tempfile.TemporaryDirectory() as d:
+            for name, data in (("a", b"same"), ("b", b"same"), ("c", b"diff"), ("d", b"x")):
+                write_bytes(os.path.join(d, "src", name), data)
+            files = scan_files(os.path.join(d, "src"), os.path.join(d, "dst"))
+            firsts, duplicates = find_duplicates(files)
+            self.assertEqual([os.path.basename(f[0]) for f in firsts], ["a", "c", "d"])
+            self.assertEqual(len(duplicates), 1)
+            self.assertEqual(os.path.basename(duplicates[0][0][0]), "b")
+            self.assertEqual(duplicates[0][1], os.path.join(d, "dst", "a"))
+
+
+class TestSyncTree(unittest.TestCase):
+
+    def test_sync(self):
+        with tempfile.TemporaryDirectory() as d, redirect_stdout(io.StringIO()):
+            src = os.path.join(d, "static")
+            dst = os.path.join(d, "docs")
+            write_bytes(os.path.join(src, "index.css"), b"body {}")
+            write_bytes(os.path.join(src, "images", "a.png"), b"png data")
+            write_bytes(os.path.join(src, "images", "b.png"), b"png data")
+            state = {}
+
+            stats = sync_tree(src, dst, state)
+            self.assertEqual(stats.transferred(), 3)
+            self.assertEqual(stats.methods.get("dedupe"), 1)
+            self.assertEqual(stats.bytes_moved, len(b"body {}") + len(b"png data"))
+            self.assertEqual(read_bytes(os.path.join(dst, "images", "b.png")), b"png data")
+
+            stats = sync_tree(src, dst, state)
+            self.assertEqual(stats.transferred(), 0)
+            self.assertEqual(stats.unchanged, 3)
+            self.assertEqual(stats.bytes_moved, 0)
+
+            write_bytes(os.path.join(src, "images", "b.png"), b"new png data")
+            os.remove(os.path.join(src, "index.css"))
+            stats = sync_tree(src, dst, state)
+            self.assertEqual(stats.transferred(), 1)
+            self.assertEqual(stats.removed, 1)
+            self.assertFalse(os.path.exists(os.path.join(dst, "index.css")))
+            self.assertEqual(read_bytes(os.path.join(dst, "images", "b.png")), b"new png data")
+            # b.png was linked to a.png's output, rewriting it must leave a.png alone
+            self.assertEqual(read_bytes(os.path.join(dst, "images", "a.png")), b"png data")
+
+    def test_missing_output_is_restored(self):
+        with tempfile.TemporaryDirectory() as d, redirect_stdout(io.StringIO()):
+            src = os.path.join(d, "static")
+            dst = os.path.join(d, "docs")
+            write_bytes(os.path.join(src, "a.txt"), b"a")
+            state = {}
+            sync_tree(src, dst, state)
+            os.remove(os.path.join(dst, "a.txt"))
+            self.assertEqual(sync_tree(src, dst, state).transferred(), 1)
+            self.assertTrue(os.path.exists(os.path.join(dst, "a.txt")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import io
+import unittest
+
+from template import Template, rewrite_links
+
+
+class TestRewriteLinks(unittest.TestCase):
+
+    def test_root_basepath(self):
+        html = '<a href="/x"><img src="/y.png"></a>'
+        self.assertEqual(rewrite_links(html, "/"), html)
+
+    def test_basepath(self):
+        html = '<a href="/x"><img src="/y.png"></a><a href="https://boot.dev">'
+        self.assertEqual(
+            rewrite_links(html, "/base/"),
+            '<a href="/base/x"><img src="/base/y.png"></a><a href="https://boot.dev">',
+        )
+
+    def test_assets(self):
+        html = '<a href="/x"><img src="/y.png"><img src="/z.png?v=1"></a><a href="/y.png#top">'
+        assets = {"/y.png": "/y.0123456789.png", "/z.png": "/z.abcdef0123.png"}
+        self.assertEqual(
+            rewrite_links(html, "/base/", assets),
+            '<a href="/base/x"><img src="/base/y.0123456789.png"><img src="/base/z.abcdef0123.png?v=1"></a>'
+            '<a href="/base/y.0123456789.png#top">',
+        )
+
+
+class TestTemplate(unittest.TestCase):
+
+    def test_compile(self):
+        t = Template("<title>{{ Title }}</title><body>{{ Content }}</body>")
+        self.assertEqual(t.segments, ["<title>", "</title><body>", "</body>"])
+        self.assertEqual(t.slots, ["Title", "Content"])
+
+    def test_assets_in_template_and_content(self):
+        t = Template('<link href="/index.css">{{ Content }}', "/", assets={"/index.css": "/index.1.css", "/a.png": "/a.2.png"})
+        self.assertEqual(t.references, {"/index.css"})
+        self.assertEqual(t.render({"Content": '<img src="/a.png">'}), '<link href="/index.1.css"><img src="/a.2.png">')
+
+    def test_compile_rewrites_links(self):
+        t = Template('<link href="/index.css">{{ Content }}', "/base/")
+        self.assertEqual(t.segments, ['<link href="/base/index.css">', ""])
+
+    def test_render(self):
+        t = Template('<title>{{ Title }}</title><link href="/index.css"><body>{{ Content }}</body>', "/base/")
+        actual = t.render({"Title": "Hello", "Content": '<a href="/blog">blog</a>'})
+        expected = '<title>Hello</title><link href="/base/index.css"><body><a href="/base/blog">blog</a></body>'
+        self.assertEqual(actual, expected)
+
+    def test_render_repeated_slot(self):
+        t = Template("{{ Title }} - {{ Title }}")
+        self.assertEqual(t.render({"Title": "x"}), "x - x")
+
+    def test_render_missing_value(self):
+        t = Template("{{ Title }}")
+        with self.assertRaises(Exception):
+            t.render({})
+
+    def test_no_placeholders(self):
+        t = Template("static")
+        self.assertEqual(t.render({}), "static")
+
+    def test_write_streams_chunks(self):
+        t = Template('<title>{{ Title }}</title><link href="/index.css">{{ Content }}', "/base/")
+        out = io.StringIO()
+        t.write(out, {"Title": "Hello", "Content": iter(["<div>", '<a href="/x">x</a>', "</div>"])})
+        expected = '<title>Hello</title><link href="/base/index.css"><div><a href="/base/x">x</a></div>'
+        self.assertEqual(out.getvalue(), expected)
+        self.assertEqual(out.getvalue(), t.render({"Title": "Hello", "Content": '<div><a href="/x">x</a></div>'}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -29,6 +29,9 @@ class TestTextNode(unittest.TestCase):
         node2 = TextNode("This is a text node", TextType.LINK, "http://hello.sailor")
         self.assertNotEqual(node1, node2)
 
+    def test_no_instance_dict(self):
+        self.assertFalse(hasattr(TextNode("text", TextType.TEXT), "__dict__"))
+
 
 class TestTextNodeConversion(unittest.TestCase):
 
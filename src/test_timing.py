@@ -0,0 +1,95 @@
+import io
+import os
+import json
+import tempfile
+import unittest
+
+from timing import Profiler, NullProfiler, percentile
+
+
+class TestPercentile(unittest.TestCase):
+
+    def test_empty(self):
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_values(self):
+        samples = [float(i) for i in range(1, 101)]
+        self.assertEqual(percentile(samples, 50), 51.0)
+        self.assertEqual(percentile(samples, 95), 95.0)
+        self.assertEqual(percentile(samples, 100), 100.0)
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_nested_stages_are_exclusive(self):
+        p = Profiler()
+        with p.task("page", "a.md", 10):
+            with p.stage("outer"):
+                with p.stage("inner"):
+                    pass
+        self.assertEqual(len(p.records), 1)
+        r = p.records[0]
+        self.assertEqual(set(r["stages"]), {"other", "outer", "inner"})
+        self.assertAlmostEqual(sum(r["stages"].values()), r["seconds"], delta=1e-3)
+
+    def test_timed_iter_and_writer(self):
+        p = Profiler()
+        out = io.StringIO()
+        with p.task("page", "a.md", 10):
+            w = p.timed_writer("write", out)
+            for chunk in p.timed_iter("produce", ["a", "b"]):
+                w.write(chunk)
+        self.assertEqual(out.getvalue(), "ab")
+        self.assertIn("produce", p.records[0]["stages"])
+        self.assertIn("write", p.records[0]["stages"])
+
+    def test_stage_outside_task_not_recorded(self):
+        p = Profiler()
+        with p.stage("loose"):
+            pass
+        self.assertEqual(p.records, [])
+
+    def test_summary_and_report(self):
+        p = Profiler()
+        for i in range(3):
+            with p.task("page", f"{i}.md", i):
+                with p.stage("parse"):
+                    pass
+        with p.task("static", "x.png", 5):
+            with p.stage("copy"):
+                pass
+        summary = p.summary()
+        self.assertEqual(summary["parse"]["count"], 3)
+        self.assertEqual(summary["copy"]["count"], 1)
+        self.assertEqual(len(p.slowest(2)), 2)
+        self.assertEqual(len(p.slowest(10)), 3)
+        self.assertIn("slowest 3 pages", p.report())
+
+    def test_dump(self):
+        p = Profiler()
+        with p.task("page", "a.md", 1):
+            pass
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "trace.json")
+            p.dump(path)
+            with open(path) as f:
+                data = json.load(f)
+        self.assertEqual(data["records"][0]["path"], "a.md")
+        self.assertIn("other", data["summary"])
+
+
+class TestNullProfiler(unittest.TestCase):
+
+    def test_passthrough(self):
+        p = NullProfiler()
+        out = io.StringIO()
+        with p.task("page", "a.md", 1):
+            with p.stage("parse"):
+                pass
+        self.assertIs(p.timed_writer("write", out), out)
+        self.assertEqual(list(p.timed_iter("x", [1, 2])), [1, 2])
+        self.assertEqual(p.records, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+"""Helpers shared by the tests and the benchmarks for building sites in temporary directories."""
+import os
+import json
+from contextlib import contextmanager
+
+
+def write_file(path: str, text: str):
+    if os.path.dirname(path) != "":
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+def write_bytes(path: str, data: bytes):
+    if os.path.dirname(path) != "":
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+def read_file(path: str) -> str:
+    with open(path, "r") as f:
+        return f.read()
+
+def read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def read_json(path: str):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+@contextmanager
+def working_directory(path: str):
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
@@ -0,0 +1,150 @@
+import json
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator, TextIO
+
+
+class Profiler:
+    """
+    Collects wall time per build stage. Stages nest: time spent in an inner
+    stage is not counted for the outer one, so the stage times of a task add
+    up to the task's total. Each task (a page or a copied file) is one record.
+    """
+    def __init__(self):
+        self.records = []
+        self._stack = []
+        self._record = None
+
+    @contextmanager
+    def task(self, kind: str, path: str, size: int):
+        self._record = {"kind": kind, "path": path, "bytes": size, "seconds": 0.0, "stages": {}}
+        start = time.perf_counter()
+        try:
+            # time that no stage accounts for
+            with self.stage("other"):
+                yield
+        finally:
+            self._record["seconds"] = time.perf_counter() - start
+            self.records.append(self._record)
+            self._record = None
+
+    @contextmanager
+    def stage(self, name: str):
+        self._push(name)
+        try:
+            yield
+        finally:
+            self._pop()
+
+    def timed_iter(self, name: str, iterable: Iterable) -> Iterator:
+        """Iterate 'iterable', counting the time spent producing each item as 'name'."""
+        it = iter(iterable)
+        while True:
+            self._push(name)
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            finally:
+                self._pop()
+            yield item
+
+    def timed_writer(self, name: str, f: TextIO) -> TextIO:
+        return _TimedWriter(self, name, f)
+
+    def _push(self, name: str):
+        now = time.perf_counter()
+        if len(self._stack) > 0:
+            top = self._stack[-1]
+            self._add(top[0], now - top[1])
+        self._stack.append([name, now])
+
+    def _pop(self):
+        now = time.perf_counter()
+        name, start = self._stack.pop()
+        self._add(name, now - start)
+        if len(self._stack) > 0:
+            self._stack[-1][1] = now
+
+    def _add(self, name: str, seconds: float):
+        if self._record == None:
+            return
+        stages = self._record["stages"]
+        stages[name] = stages.get(name, 0.0) + seconds
+
+    def summary(self) -> dict:
+        stages = {}
+        for r in self.records:
+            for name, seconds in r["stages"].items():
+                stages.setdefault(name, []).append(seconds)
+
+        result = {}
+        for name, samples in stages.items():
+            samples.sort()
+            result[name] = {
+                "count": len(samples),
+                "total": sum(samples),
+                "p50": percentile(samples, 50),
+                "p95": percentile(samples, 95),
+                "max": samples[-1],
+            }
+        return result
+
+    def slowest(self, n: int, kind: str ="page") -> list[dict]:
+        records = [r for r in self.records if r["kind"] == kind]
+        return sorted(records, key=lambda r: r["seconds"], reverse=True)[:n]
+
+    def report(self, top: int =10) -> str:
+        lines = [f"{'stage':<10}{'count':>8}{'total s':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"]
+        summary = self.summary()
+        for name in sorted(summary, key=lambda name: summary[name]["total"], reverse=True):
+            s = summary[name]
+            lines.append(f"{name:<10}{s['count']:>8}{s['total']:>10.3f}{s['p50'] * 1e3:>10.2f}"
+                         f"{s['p95'] * 1e3:>10.2f}{s['max'] * 1e3:>10.2f}")
+        slowest = self.slowest(top)
+        if len(slowest) > 0:
+            lines.append("")
+            lines.append(f"slowest {len(slowest)} pages:")
+            for r in slowest:
+                lines.append(f"{r['seconds'] * 1e3:>10.2f} ms {r['bytes']:>10} bytes  {r['path']}")
+        return "\n".join(lines)
+
+    def dump(self, path: str):
+        with open(path, "w") as f:
+            json.dump({"summary": self.summary(), "records": self.records}, f, indent=1)
+
+
+class NullProfiler(Profiler):
+    """Stands in when profiling is off, so the instrumented code has no branches."""
+
+    @contextmanager
+    def task(self, kind: str, path: str, size: int):
+        yield
+
+    @contextmanager
+    def stage(self, name: str):
+        yield
+
+    def timed_iter(self, name: str, iterable: Iterable) -> Iterator:
+        return iter(iterable)
+
+    def timed_writer(self, name: str, f: TextIO) -> TextIO:
+        return f
+
+
+class _TimedWriter:
+    def __init__(self, profiler: Profiler, name: str, f: TextIO):
+        self.profiler = profiler
+        self.name = name
+        self.f = f
+
+    def write(self, s: str) -> int:
+        with self.profiler.stage(self.name):
+            return self.f.write(s)
+
+
+def percentile(sorted_samples: list[float], p: float) -> float:
+    if len(sorted_samples) == 0:
+        return 0.0
+    i = min(len(sorted_samples) - 1, int(round(p / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[i]